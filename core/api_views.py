@@ -3,18 +3,23 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from .models import User, Product, Availability, Order, CustomerEvent
+from .models import User, Product, Availability, Order, CustomerEvent, PaymentUpload
 from .serializers import UserSerializer, ProductSerializer, AvailabilitySerializer, OrderSerializer, CustomerEventSerializer
-from .permissions import IsSales, IsHatchery, IsCustomer, IsCustomerOrSales
+from .permissions import IsSales, IsHatchery, IsCustomer, IsCustomerOrSales, IsHatcheryOrSales
 from .payment import PaymentAdapter
+from .instrumentation import timed
+from .week_calendar import filter_ship_dates
+from .customer_summary import get_customer_summary
+from .pipeline_rollups import pipeline_report
+from .forecasting import demand_forecast
+from . import payment_uploads
+from .payment_uploads import UploadError
+from .views import notify_sales_payment_uploaded
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.core.mail import send_mail
 from django.conf import settings
 from django.shortcuts import get_object_or_404
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 from io import BytesIO
 from django.core.files import File
 from rest_framework.exceptions import PermissionDenied
@@ -41,8 +46,14 @@ class AvailabilityListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
+        ship_from = parse_date(self.request.query_params.get('ship_from', ''))
+        ship_to = parse_date(self.request.query_params.get('ship_to', ''))
+        if ship_from or ship_to:
+            # Ship date windows can span years, so filter through the week calendar table
+            availabilities = filter_ship_dates(Availability.objects.select_related('product'), ship_from, ship_to)
+            return availabilities.order_by('year', 'week_number')
         year = self.request.query_params.get('year', 2025)
-        return Availability.objects.filter(year=year).order_by('week_number')
+        return Availability.objects.filter(year=year).select_related('product').order_by('week_number')
 
     def perform_create(self, serializer):
         if self.request.user.role != 'hatchery':
@@ -107,7 +118,7 @@ class OrderVerifyDownPaymentView(APIView):
             payment_result = payment_adapter.request_full_payment(order)
             if payment_result['success']:
                 order.fullpayment_transaction_id = payment_result['transaction_id']
-                order.fullpayment_amount = order.calculate_total() - order.downpayment_amount
+                order.fullpayment_amount = order.balance
                 order.save()
                 full_invoice = generate_invoice(order)
                 order.invoice.save(f"invoice_{order.id}.pdf", full_invoice)
@@ -158,6 +169,39 @@ class OrderShipView(APIView):
         )
         return Response({"detail": "Order shipped."}, status=status.HTTP_200_OK)
 
+class CustomerSummaryView(APIView):
+    permission_classes = [IsCustomerOrSales]
+
+    def get(self, request, customer_id):
+        customer = get_object_or_404(User, id=customer_id, role='customer')
+        self.check_object_permissions(request, customer)
+        return Response(get_customer_summary(customer.id))
+
+class PipelineAnalyticsView(APIView):
+    permission_classes = [IsSales]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            year = int(params.get('year', timezone.now().year))
+            week_from = int(params['week_from']) if params.get('week_from') else None
+            week_to = int(params['week_to']) if params.get('week_to') else None
+        except ValueError:
+            return Response({"detail": "year, week_from and week_to must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(pipeline_report(year, params.get('strain'), week_from, week_to))
+
+class DemandForecastView(APIView):
+    permission_classes = [IsHatcheryOrSales]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            year = int(params.get('year', timezone.now().year))
+            product_id = int(params['product']) if params.get('product') else None
+        except ValueError:
+            return Response({"detail": "year and product must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(demand_forecast(year, product_id))
+
 class CustomerEventListView(generics.ListAPIView):
     queryset = CustomerEvent.objects.all()
     serializer_class = CustomerEventSerializer
@@ -166,10 +210,91 @@ class CustomerEventListView(generics.ListAPIView):
     def get_queryset(self):
         return CustomerEvent.objects.filter(user__role='customer')
 
+def payment_upload_payload(upload):
+    return {
+        "id": str(upload.id),
+        "order": upload.order_id,
+        "kind": upload.kind,
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.received,
+        "chunk_size": payment_uploads.chunk_size(),
+        "completed": upload.completed_at is not None,
+    }
+
+class PaymentUploadCreateView(APIView):
+    permission_classes = [IsCustomer]
+
+    def post(self, request, order_id):
+        order = get_object_or_404(Order, id=order_id, customer=request.user)
+        try:
+            upload = payment_uploads.start_upload(
+                order,
+                request.data.get('kind'),
+                str(request.data.get('filename', '')),
+                int(request.data.get('size', 0)),
+                str(request.data.get('sha256', '')).lower(),
+            )
+        except (TypeError, ValueError):
+            return Response({"detail": "size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=e.status)
+        return Response(payment_upload_payload(upload), status=status.HTTP_201_CREATED)
+
+class PaymentUploadView(APIView):
+    """GET reports the offset to resume from; PUT stores one chunk, sent raw with a Content-Range header."""
+    permission_classes = [IsCustomer]
+
+    def get_upload(self, request, upload_id):
+        return get_object_or_404(PaymentUpload, id=upload_id, order__customer=request.user)
+
+    def get(self, request, upload_id):
+        return Response(payment_upload_payload(self.get_upload(request, upload_id)))
+
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        try:
+            start, end, total = payment_uploads.parse_content_range(request.headers.get('Content-Range'))
+            # Read from the raw stream: request.data would parse (and buffer) the body
+            stream = request.stream
+            if stream is None:
+                raise UploadError('Empty chunk.')
+            payment_uploads.append_chunk(upload, stream, start, end, total, request.headers.get('X-Chunk-SHA256'))
+        except UploadError as e:
+            return Response({"detail": str(e), "offset": upload.received}, status=e.status)
+        return Response(payment_upload_payload(upload))
+
+class PaymentUploadCompleteView(APIView):
+    permission_classes = [IsCustomer]
+
+    def post(self, request, upload_id):
+        upload = get_object_or_404(PaymentUpload, id=upload_id, order__customer=request.user)
+        try:
+            order = payment_uploads.finalize(upload)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=e.status)
+        _, _, event_type, payment_type, transaction_field = payment_uploads.KINDS[upload.kind]
+        notify_sales_payment_uploaded(order, payment_type)
+        CustomerEvent.objects.create(
+            user=order.customer,
+            event_type=event_type,
+            order=order,
+            metadata={'transaction_id': getattr(order, transaction_field)}
+        )
+        return Response({"detail": "Payment proof uploaded."}, status=status.HTTP_200_OK)
+
 # Reused utility functions from views.py
+@timed('invoice_render')
 def generate_downpayment_invoice(order):
+    # ReportLab is imported on first render so workers that never build a PDF don't load it
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    # invariant: no timestamps or random IDs, so an unchanged invoice renders to the same stored blob
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=True)
     elements = []
     styles = getSampleStyleSheet()
     elements.append(Paragraph("Troutlodge Down Payment Invoice", styles['Title']))
@@ -186,20 +311,17 @@ def generate_downpayment_invoice(order):
         ['VAT Number:', order.customer.vat_number or 'N/A'],
         ['Address:', order.customer.address or 'N/A'],
     ]
-    product = order.availability.product
     order_details = [
-        ['Product Type:', product.type],
-        ['Ploidy:', product.ploidy],
-        ['Diameter:', f"{product.diameter}mm"],
-        ['Week Number:', str(order.availability.week_number)],
-        ['Ship Date:', order.availability.expected_ship_date.strftime("%Y-%m-%d")],
+        ['Product:', order.product_label],
+        ['Week Number:', str(order.ship_week)],
+        ['Ship Date:', order.ship_date.strftime("%Y-%m-%d")],
         ['Quantity:', f"{order.quantity:,}"],
-        ['Unit Price:', f"${product.price:.2f}"],
-        ['Subtotal:', f"${order.quantity * product.price:.2f}"],
+        ['Unit Price:', f"${order.unit_price:.2f}"],
+        ['Subtotal:', f"${order.subtotal_amount:.2f}"],
         ['Transport Cost:', f"${order.transport_cost:.2f}"],
-        ['Total Amount:', f"${order.calculate_total():.2f}"],
+        ['Total Amount:', f"${order.total_amount:.2f}"],
         ['Down Payment (15%):', f"${order.downpayment_amount:.2f}"],
-        ['Remaining Balance:', f"${order.calculate_total() - order.downpayment_amount:.2f}"],
+        ['Remaining Balance:', f"${order.balance_amount:.2f}"],
     ]
     invoice_table = Table(invoice_data, colWidths=[100, 300])
     customer_table = Table(customer_info, colWidths=[100, 300])
@@ -228,9 +350,15 @@ def generate_downpayment_invoice(order):
     buffer.seek(0)
     return File(buffer, name=f"downpayment_invoice_{order.id}.pdf")
 
+@timed('invoice_render')
 def generate_invoice(order):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=True)
     elements = []
     styles = getSampleStyleSheet()
     elements.append(Paragraph("Troutlodge Full Payment Invoice", styles['Title']))
@@ -247,20 +375,17 @@ def generate_invoice(order):
         ['VAT Number:', order.customer.vat_number or 'N/A'],
         ['Address:', order.customer.address or 'N/A'],
     ]
-    product = order.availability.product
     order_details = [
-        ['Product Type:', product.type],
-        ['Ploidy:', product.ploidy],
-        ['Diameter:', f"{product.diameter}mm"],
-        ['Week Number:', str(order.availability.week_number)],
-        ['Ship Date:', order.availability.expected_ship_date.strftime("%Y-%m-%d")],
+        ['Product:', order.product_label],
+        ['Week Number:', str(order.ship_week)],
+        ['Ship Date:', order.ship_date.strftime("%Y-%m-%d")],
         ['Quantity:', f"{order.quantity:,}"],
-        ['Unit Price:', f"${product.price:.2f}"],
-        ['Subtotal:', f"${order.quantity * product.price:.2f}"],
+        ['Unit Price:', f"${order.unit_price:.2f}"],
+        ['Subtotal:', f"${order.subtotal_amount:.2f}"],
         ['Transport Cost:', f"${order.transport_cost:.2f}"],
-        ['Total Amount:', f"${order.calculate_total():.2f}"],
+        ['Total Amount:', f"${order.total_amount:.2f}"],
         ['Down Payment Paid:', f"${order.downpayment_amount:.2f}"],
-        ['Remaining Balance:', f"${order.calculate_total() - order.downpayment_amount:.2f}"],
+        ['Remaining Balance:', f"${order.balance_amount:.2f}"],
     ]
     invoice_table = Table(invoice_data, colWidths=[120, 300])
     customer_table = Table(customer_info, colWidths=[120, 300])
@@ -287,6 +412,7 @@ def generate_invoice(order):
     buffer.seek(0)
     return File(buffer, name=f"invoice_{order.id}.pdf")
 
+@timed('email_send')
 def send_order_confirmation_email(order):
     subject = f"Order #{order.id} Confirmed"
     message = f"Dear {order.customer.username},\n\nYour order #{order.id} has been confirmed. Thank you for your purchase!\n\nTransaction ID: {order.fullpayment_transaction_id}"
@@ -298,6 +424,7 @@ def send_order_confirmation_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_downpayment_request_email(order):
     subject = f"Troutlodge Down Payment Request for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
@@ -313,10 +440,11 @@ def send_downpayment_request_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_fullpayment_request_email(order):
     subject = f"Troutlodge Full Payment Request for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
-    message += f"Thank you for your down payment. Your order #{order.id} is now ready for full payment of ${order.calculate_total() - order.downpayment_amount:.2f}.\n\n"
+    message += f"Thank you for your down payment. Your order #{order.id} is now ready for full payment of ${order.balance:.2f}.\n\n"
     message += f"Transaction ID: {order.fullpayment_transaction_id}\n\n"
     message += "Please complete the payment within 14 days to avoid cancellation.\n\n"
     message += "You can download the full invoice via the API.\n\n"
@@ -329,10 +457,11 @@ def send_fullpayment_request_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_shipment_confirmation_email(order):
     subject = f"Troutlodge Shipment Confirmation for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
-    message += f"Your order #{order.id} has been shipped and is expected to arrive on {order.availability.expected_ship_date.strftime('%Y-%m-%d')}.\n\n"
+    message += f"Your order #{order.id} has been shipped and is expected to arrive on {order.ship_date.strftime('%Y-%m-%d')}.\n\n"
     message += "Thank you for your business!\nTroutlodge Team"
     send_mail(
         subject,
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import metrics  # noqa: F401  registers transition and event signal receivers
+        from . import customer_summary  # noqa: F401  invalidates cached summaries on order changes
+        from . import online_scoring  # noqa: F401  maintains reliability features and rescores on events
+        from . import live_updates  # noqa: F401  publishes order, availability and event changes to SSE streams
+        from . import dashboard_cache  # noqa: F401  bumps dashboard versions on order and stock changes
+        from . import storage  # noqa: F401  counts references to content-addressed documents
@@ -0,0 +1,272 @@
+# core/async_views.py
+"""
+Async (ASGI-native) versions of the order workflow API and the sales and customer dashboards.
+
+Under an ASGI server (uvicorn troutlodge.asgi:application) these views wait on the
+database through Django's async ORM and push the blocking side effects, i.e. the
+payment gateway, ReportLab rendering plus the invoice write, and SMTP, onto small
+dedicated thread pools. A slow gateway or mail server then parks a coroutine
+instead of a whole worker, so one process keeps serving other requests.
+
+Work sent to the pools must not touch the database: orders are loaded with
+everything the invoices and emails read. FSM transitions run their signal
+receivers (which schedule on_commit hooks), so they go through sync_to_async
+like any other sync ORM code. Under WSGI the sync views in views.py and
+api_views.py remain the ones to use.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import render
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import api_views
+from .customer_summary import get_customer_summary
+from .live_updates import audience, broker
+from .models import Availability, CustomerEvent, Order
+from .payment import PaymentAdapter
+from .views import (
+    customer_dashboard_scopes, customer_required, dashboard_cache_context, sales_dashboard_scopes, sales_required,
+)
+
+POOL_SETTINGS = {
+    'payment': 'ASYNC_PAYMENT_WORKERS',
+    'pdf': 'ASYNC_PDF_WORKERS',
+    'email': 'ASYNC_EMAIL_WORKERS',
+}
+
+_pools_lock = threading.Lock()
+_pools = {}
+
+
+def get_pool(name):
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(
+                max_workers=getattr(settings, POOL_SETTINGS[name], 4), thread_name_prefix=f'async-{name}',
+            )
+        return _pools[name]
+
+
+async def offload(pool, func, *args, **kwargs):
+    """Run a blocking call on one of the named pools without holding the event loop."""
+    return await sync_to_async(func, thread_sensitive=False, executor=get_pool(pool))(*args, **kwargs)
+
+
+def _detail(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+class _CSRFCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        return reason
+
+
+async def _api_user(request):
+    """
+    The same authentication as the DRF views (REST_FRAMEWORK settings): HTTP Basic, or the
+    session with a CSRF check. Returns (user or None, error response or None).
+    """
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if auth and auth[0].lower() == 'basic':
+        try:
+            username, _, password = base64.b64decode(auth[1]).decode('utf-8').partition(':')
+        except (IndexError, binascii.Error, UnicodeDecodeError):
+            return None, _detail('Invalid basic header.', 401)
+        user = await aauthenticate(request, username=username, password=password)
+        if user is None or not user.is_active:
+            return None, _detail('Invalid username/password.', 401)
+        return user, None
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None, None
+    check = _CSRFCheck(lambda request: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        return None, _detail(f'CSRF Failed: {reason}', 403)
+    return user, None
+
+
+def api_role_required(role):
+    """Async counterpart of the IsSales-style permission classes for plain async views."""
+    def decorator(view_func):
+        @csrf_exempt
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            user, error = await _api_user(request)
+            if error:
+                return error
+            if user is None:
+                return _detail('Authentication credentials were not provided.', 403)
+            if user.role != role:
+                return _detail('You do not have permission to perform this action.', 403)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _get_order(order_id, status):
+    # Invoices and emails read the customer and product, so load them up front
+    try:
+        return await Order.objects.select_related('customer', 'availability__product').aget(id=order_id, status=status)
+    except Order.DoesNotExist:
+        return None
+
+
+def _attach_invoice(order, field, render_invoice):
+    """Render an invoice and write it to storage; the caller saves the field."""
+    invoice = render_invoice(order)
+    getattr(order, field).save(invoice.name, invoice, save=False)
+
+
+async def _record_event(order, event_type, metadata):
+    await CustomerEvent.objects.acreate(user=order.customer, event_type=event_type, order=order, metadata=metadata)
+
+
+@require_POST
+@api_role_required('sales')
+async def order_approve(request, order_id):
+    order = await _get_order(order_id, 'pending')
+    if order is None:
+        return _detail('Not found.', 404)
+    payment_result = await offload('payment', PaymentAdapter().request_downpayment, order)
+    if not payment_result['success']:
+        return _detail('Payment initiation failed.', 400)
+    await sync_to_async(order.approve)()
+    order.downpayment_transaction_id = payment_result['transaction_id']
+    await order.asave()
+    await offload('pdf', _attach_invoice, order, 'downpayment_invoice', api_views.generate_downpayment_invoice)
+    await order.asave(update_fields=['downpayment_invoice'])
+    await offload('email', api_views.send_downpayment_request_email, order)
+    await _record_event(order, 'ORDER_APPROVED', {'transaction_id': order.downpayment_transaction_id})
+    return _detail('Order approved.', 200)
+
+
+@require_POST
+@api_role_required('sales')
+async def order_verify_down_payment(request, order_id):
+    order = await _get_order(order_id, 'approved')
+    if order is None:
+        return _detail('Not found.', 404)
+    payment_adapter = PaymentAdapter()
+    if not await offload('payment', payment_adapter.verify_payment, order.downpayment_transaction_id):
+        return _detail('Down payment verification failed.', 400)
+    # Locks and decrements the availability row inside the transition
+    await sync_to_async(order.confirm_downpayment)()
+    await order.asave()
+    payment_result = await offload('payment', payment_adapter.request_full_payment, order)
+    if not payment_result['success']:
+        return _detail('Full payment initiation failed.', 400)
+    order.fullpayment_transaction_id = payment_result['transaction_id']
+    order.fullpayment_amount = order.balance
+    await offload('pdf', _attach_invoice, order, 'invoice', api_views.generate_invoice)
+    await order.asave(update_fields=['fullpayment_transaction_id', 'fullpayment_amount', 'invoice'])
+    await offload('email', api_views.send_fullpayment_request_email, order)
+    await _record_event(order, 'DOWN_PAYMENT_VERIFIED', {'transaction_id': order.downpayment_transaction_id})
+    return _detail('Down payment verified.', 200)
+
+
+@require_POST
+@api_role_required('sales')
+async def order_verify_full_payment(request, order_id):
+    order = await _get_order(order_id, 'down_paid')
+    if order is None:
+        return _detail('Not found.', 404)
+    if not await offload('payment', PaymentAdapter().verify_payment, order.fullpayment_transaction_id):
+        return _detail('Full payment verification failed.', 400)
+    await sync_to_async(order.confirm_full_payment)()
+    await order.asave()
+    await offload('email', api_views.send_order_confirmation_email, order)
+    await _record_event(order, 'FULL_PAYMENT_VERIFIED', {'transaction_id': order.fullpayment_transaction_id})
+    return _detail('Full payment verified.', 200)
+
+
+@require_POST
+@api_role_required('sales')
+async def order_ship(request, order_id):
+    order = await _get_order(order_id, 'confirmed')
+    if order is None:
+        return _detail('Not found.', 404)
+    await sync_to_async(order.ship)()
+    await order.asave()
+    await offload('email', api_views.send_shipment_confirmation_email, order)
+    await _record_event(order, 'ORDER_SHIPPED', {})
+    return _detail('Order shipped.', 200)
+
+
+@sales_required
+async def sales_dashboard(request):
+    context = {
+        # Left lazy: they only run, in the render thread, when their fragment is not cached
+        'pending_orders': Order.objects.filter(status='pending').select_related('customer', 'availability__product'),
+        'confirmed_orders': Order.objects.filter(status='confirmed').select_related('customer').order_by('-confirmed_at')[:10],
+        'shipped_orders': Order.objects.filter(status='shipped').select_related('customer')[:5],
+        **await sync_to_async(dashboard_cache_context)(request, sales_dashboard_scopes),
+    }
+    # The template reads request.user and messages, which are lazy sync lookups
+    return await sync_to_async(render)(request, 'sales_dashboard.html', context)
+
+
+@customer_required
+async def customer_dashboard(request):
+    user = await request.auser()
+    orders = Order.objects.filter(customer=user)
+    context = {
+        'available_batches': Availability.objects.filter(available_quantity__gt=0).select_related('product'),
+        'reservations': orders.filter(status__in=['approved', 'down_paid']),
+        'confirmed_orders': orders.filter(status='confirmed'),
+        'shipped_orders': orders.filter(status='shipped'),
+        'summary': SimpleLazyObject(partial(get_customer_summary, user.id)),
+        **await sync_to_async(dashboard_cache_context)(request, customer_dashboard_scopes),
+    }
+    return await sync_to_async(render)(request, 'customer_dashboard.html', context)
+
+
+async def _event_stream(accepts):
+    heartbeat = getattr(settings, 'LIVE_UPDATES_HEARTBEAT_SECONDS', 15)
+    # Subscribed once the server starts sending, so an unsent response cannot leak a subscription
+    subscription = broker.subscribe(accepts)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Fell too far behind; the page reloads rather than miss updates
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            yield f"event: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@login_required
+async def live_updates(request):
+    """Server-sent events for the dashboards (core/live_updates.py). Streams need the ASGI server."""
+    if not isinstance(request, ASGIRequest):
+        return _detail('Live updates are only served through ASGI.', 501)
+    accepts = audience(await request.auser())
+    response = StreamingHttpResponse(_event_stream(accepts), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,77 @@
+# core/benchmarking.py
+import json
+import platform
+import threading
+from collections import defaultdict
+
+import django
+from django.db import connection
+from django.utils import timezone
+
+from .instrumentation import percentile
+
+
+class LatencyRecorder:
+    """Thread-safe collector of (latency, query count, error) samples per endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, endpoint, seconds, queries=0, error=False):
+        with self.lock:
+            self.samples[endpoint].append((seconds, queries, error))
+
+    def summarize(self, wall_time):
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(sample[0] for sample in samples)
+            queries = [sample[1] for sample in samples]
+            report[endpoint] = {
+                'requests': len(samples),
+                'errors': sum(1 for sample in samples if sample[2]),
+                'throughput_rps': round(len(samples) / wall_time, 2) if wall_time else 0.0,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                'mean_queries': round(sum(queries) / len(queries), 2),
+                'max_queries': max(queries),
+            }
+        return report
+
+
+def environment_metadata(**params):
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'params': params,
+    }
+
+
+def write_report(path, report):
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(results, baseline_path, tolerance, metric='p95_ms'):
+    """
+    Return human-readable regressions of `results` against a saved report:
+    `metric` or queries per request worse than baseline * (1 + tolerance).
+    """
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)['results']
+    regressions = []
+    if results and not set(results) & set(baseline):
+        # Nothing to compare (e.g. a report from another command or with other modes) is not a pass
+        return [f'no endpoint in common with the baseline ({", ".join(sorted(baseline)) or "empty"})']
+    for endpoint, current in results.items():
+        previous = baseline.get(endpoint)
+        if previous is None:
+            continue
+        if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+            regressions.append(f'{endpoint}: {metric} {previous[metric]} -> {current[metric]}')
+        if 'mean_queries' in current and current['mean_queries'] > previous.get('mean_queries', 0) * (1 + tolerance):
+            regressions.append(f"{endpoint}: mean_queries {previous['mean_queries']} -> {current['mean_queries']}")
+    return regressions
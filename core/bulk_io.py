@@ -0,0 +1,219 @@
+# core/bulk_io.py
+"""
+Bulk data movement built on Django's connection.
+
+On PostgreSQL rows are streamed through COPY FROM STDIN / COPY TO STDOUT;
+other backends fall back to chunked bulk_create and queryset iteration so the
+same calls work in development on SQLite.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connections, transaction
+
+DEFAULT_CHUNK_SIZE = 5000
+EVENT_FIELDS = ('user', 'event_type', 'timestamp', 'order', 'metadata')
+AVAILABILITY_FIELDS = ('product', 'year', 'week_number', 'available_quantity')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep supplied values for auto_now_add fields."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+def is_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def _encode(value):
+    if value is None:
+        return ''  # unquoted empty = NULL in CSV COPY
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class RowStream(io.TextIOBase):
+    """Read-only file object producing CSV lines from an iterable of tuples, on demand."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.pending = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = [self.pending]
+        length = len(self.pending)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = ','.join(_encode(value) for value in row) + '\n'
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(parts)
+        if size < 0 or len(data) <= size:
+            self.pending = ''
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+def _columns(model, fields):
+    return [model._meta.get_field(name).column for name in fields]
+
+
+def copy_rows(model, fields, rows, using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insert an iterable of tuples (values ordered as `fields`, foreign keys as
+    ids) into `model`'s table. Returns the number of rows written.
+    """
+    if not is_postgres(using):
+        return _bulk_create_rows(model, fields, rows, using, chunk_size)
+    table = connections[using].ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connections[using].ops.quote_name(column) for column in _columns(model, fields))
+    stream = RowStream(rows)
+    with connections[using].cursor() as cursor:
+        _copy_in(cursor, f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', stream)
+    return stream.count
+
+
+def _bulk_create_rows(model, fields, rows, using, chunk_size):
+    attnames = [model._meta.get_field(name).attname for name in fields]
+    auto_now_add = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now_add', False) and f.name in fields]
+    count = 0
+    with explicit_timestamps(*auto_now_add):
+        for chunk in chunked(rows, chunk_size):
+            model._default_manager.using(using).bulk_create(
+                [model(**dict(zip(attnames, row))) for row in chunk]
+            )
+            count += len(chunk)
+    return count
+
+
+def ingest_events(rows, using='default'):
+    """Rows of (user_id, event_type, timestamp, order_id, metadata)."""
+    from .metrics import CUSTOMER_EVENTS
+    from .models import CustomerEvent
+    event_types = Counter()
+
+    def counted():
+        # COPY and bulk_create send no post_save, so count the inserts for /metrics here
+        for row in rows:
+            event_types[row[1]] += 1
+            yield row
+
+    count = copy_rows(CustomerEvent, EVENT_FIELDS, counted(), using=using)
+    for event_type, inserted in event_types.items():
+        CUSTOMER_EVENTS.inc(inserted, event_type=event_type)
+    return count
+
+
+def import_availability(rows, using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Upsert rows of (product_id, year, week_number, available_quantity), replacing
+    the quantity of existing (product, year, week) entries. All or nothing: an
+    exception raised while `rows` is consumed leaves the table unchanged.
+    """
+    from .models import Availability
+    if not is_postgres(using):
+        count = 0
+        with transaction.atomic(using=using):
+            for chunk in chunked(rows, chunk_size):
+                Availability.objects.using(using).bulk_create(
+                    [Availability(product_id=p, year=y, week_number=w, available_quantity=q) for p, y, w, q in chunk],
+                    update_conflicts=True,
+                    unique_fields=['product', 'year', 'week_number'],
+                    update_fields=['available_quantity'],
+                )
+                count += len(chunk)
+        return count
+
+    table = Availability._meta.db_table
+    columns = ', '.join(_columns(Availability, AVAILABILITY_FIELDS))
+    stream = RowStream(rows)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE availability_import ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        _copy_in(cursor, f'COPY availability_import ({columns}) FROM STDIN WITH (FORMAT csv)', stream)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM availability_import '
+            f'ON CONFLICT (product_id, year, week_number) '
+            f'DO UPDATE SET available_quantity = EXCLUDED.available_quantity'
+        )
+    return stream.count
+
+
+def export_csv(queryset, fields, out, using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write `queryset` restricted to `fields` (values() lookups, e.g.
+    'customer__username') as CSV with a header row to the text file `out`.
+    """
+    queryset = queryset.using(using).values_list(*fields)
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    if not is_postgres(using):
+        writer.writerows(
+            [json.dumps(value) if isinstance(value, (dict, list)) else value for value in row]
+            for row in queryset.iterator(chunk_size=chunk_size)
+        )
+        return
+    with connections[using].cursor() as cursor:
+        sql, params = queryset.query.sql_with_params()
+        query = cursor.mogrify(sql, params)
+        if isinstance(query, bytes):
+            query = query.decode()
+        _copy_out(cursor, f'COPY ({query}) TO STDOUT WITH (FORMAT csv)', out)
+
+
+def _copy_in(cursor, sql, stream):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, stream, size=1 << 16)
+        return
+    with raw.copy(sql) as copy:  # psycopg 3
+        while data := stream.read(1 << 16):
+            copy.write(data)
+
+
+def _copy_out(cursor, sql, out):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2 decodes for text files
+        raw.copy_expert(sql, out, size=1 << 16)
+        return
+    with raw.copy(sql) as copy:  # psycopg 3
+        for data in copy:
+            out.write(bytes(data).decode())
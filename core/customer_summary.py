@@ -0,0 +1,81 @@
+# core/customer_summary.py
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django_fsm.signals import post_transition
+
+from .models import Order
+
+CACHE_KEY = 'customer_summary:{}'
+PAID_STATUSES = ['confirmed', 'shipped']
+COUNTERS = ('orders', 'cancelled', 'volume', 'spend', 'paid', 'paid_on_time')
+
+
+def _on_time_ratio(row):
+    return round(row['paid_on_time'] / row['paid'], 3) if row['paid'] else None
+
+
+def compute_customer_summary(customer_id, using=None):
+    """Lifetime and per-season (availability year) order statistics, from one grouped query."""
+    seasons = list(
+        Order.objects.using(using).filter(customer_id=customer_id)
+        .values(season=F('availability__year'))
+        .annotate(
+            orders=Count('id'),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            volume=Coalesce(Sum('quantity', filter=~Q(status='cancelled')), 0),
+            # Spend uses the totals snapshotted at approval
+            spend=Coalesce(Sum('total_amount', filter=Q(status__in=PAID_STATUSES)), Value(Decimal('0')),
+                           output_field=DecimalField(max_digits=14, decimal_places=2)),
+            paid=Count('id', filter=Q(confirmed_at__isnull=False)),
+            paid_on_time=Count('id', filter=Q(confirmed_at__lte=F('fullpayment_deadline'))),
+        )
+        .order_by('season')
+    )
+    lifetime = {name: sum(row[name] for row in seasons) for name in COUNTERS}
+    lifetime['spend'] = Decimal(lifetime['spend'])
+    lifetime['on_time_ratio'] = _on_time_ratio(lifetime)
+    for row in seasons:
+        row['on_time_ratio'] = _on_time_ratio(row)
+    return {
+        'customer_id': customer_id,
+        'lifetime': lifetime,
+        'seasons': seasons,
+        'generated_at': timezone.now(),
+    }
+
+
+def get_customer_summary(customer_id):
+    key = CACHE_KEY.format(customer_id)
+    summary = cache.get(key)
+    if summary is None:
+        # Recomputed after an invalidation, so a lagging replica would be cached as the fresh summary
+        summary = compute_customer_summary(customer_id, using=DEFAULT_DB_ALIAS)
+        cache.set(key, summary, getattr(settings, 'CUSTOMER_SUMMARY_CACHE_SECONDS', 3600))
+    return summary
+
+
+def invalidate_customer_summaries(customer_ids):
+    """Drop cached summaries once the current transaction commits; call after bulk updates that skip transitions."""
+    keys = [CACHE_KEY.format(customer_id) for customer_id in set(customer_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_transition)
+def _order_transitioned(sender, instance, **kwargs):
+    if sender._meta.label == 'core.Order':
+        invalidate_customer_summaries([instance.customer_id])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def _order_changed(sender, instance, **kwargs):
+    invalidate_customer_summaries([instance.customer_id])
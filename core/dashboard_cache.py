@@ -0,0 +1,152 @@
+# core/dashboard_cache.py
+"""
+Version counters for dashboard fragment caching and conditional GET.
+
+Each scope ('orders', 'availability', and 'orders:<customer id>' for one
+customer's orders) has a version in the cache: the time of its last change,
+bumped after commit by order, availability and product writes. Dashboard
+templates key their {% cache %} fragments on the versions they render, and
+conditional_dashboard() derives ETag/Last-Modified from the same versions, so an
+unchanged dashboard answers 304 from a couple of cache reads, before the view
+(or any dashboard query) runs. A lost or evicted version reads as "changed now".
+
+Versions live in the default cache, so several workers need the shared cache
+(CACHE_REDIS_URL) to see each other's bumps. Without it, bumps from other
+processes (other workers, cron commands) never arrive, so versions expire after
+DASHBOARD_FRAGMENT_SECONDS: an expired version reads as changed, which moves the
+ETag and the fragment keys and bounds how long a 304 or a fragment can be stale.
+Writers that skip signals and transitions (bulk imports, data generation) call
+bump_all().
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django_fsm.signals import post_transition
+
+from .db_routers import pin_to_primary
+
+CACHE_KEY = 'dashboard_version:{}'
+ALL = 'all'
+# Transitions that move stock: confirm_downpayment reserves it, cancel may release it (bulk paths use F() updates)
+STOCK_TRANSITIONS = ('confirm_downpayment', 'cancel')
+
+
+def customer_scope(customer_id):
+    return f'orders:{customer_id}'
+
+
+def version_seconds():
+    return settings.DASHBOARD_FRAGMENT_SECONDS
+
+
+def versions(**scopes):
+    """{alias: version} for the given {alias: scope}; every version also moves with bump_all()."""
+    keys = {alias: CACHE_KEY.format(scope) for alias, scope in scopes.items()}
+    found = cache.get_many([*keys.values(), CACHE_KEY.format(ALL)])
+    missing = {key: time.time() for key in [*keys.values(), CACHE_KEY.format(ALL)] if key not in found}
+    if missing:
+        cache.set_many(missing, version_seconds())
+        found.update(missing)
+    floor = found[CACHE_KEY.format(ALL)]
+    return {alias: max(found[key], floor) for alias, key in keys.items()}
+
+
+def bump(*scopes):
+    """Mark scopes changed once the current transaction commits."""
+    keys = [CACHE_KEY.format(scope) for scope in set(scopes)]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time()), version_seconds()))
+
+
+def bump_all():
+    bump(ALL)
+
+
+def request_versions(request, **scopes):
+    """
+    The versions conditional_dashboard() read for this request, or fresh ones. Within
+    REPLICA_PIN_SECONDS of a bump the request reads from the primary: the fragments it
+    rebuilds are cached under the new version, so a lagging replica must not fill them.
+    """
+    current = getattr(request, 'dashboard_versions', None) or versions(**scopes)
+    if max(current.values(), default=0) > time.time() - getattr(settings, 'REPLICA_PIN_SECONDS', 5):
+        pin_to_primary()
+    return current
+
+
+def conditional_dashboard(scopes):
+    """
+    ETag/Last-Modified for a dashboard view from the versions scopes(request, *args, **kwargs)
+    ({alias: scope}) returns. The versions are kept on request.dashboard_versions for the
+    template's fragment keys. Responses are private and revalidated on every view.
+    """
+    def read_versions(request, *args, **kwargs):
+        if request.COOKIES.get(CookieStorage.cookie_name):
+            # A pending flash message must be rendered, not answered with 304
+            return None
+        if not hasattr(request, 'dashboard_versions'):
+            request.dashboard_versions = versions(**scopes(request, *args, **kwargs))
+        return request.dashboard_versions
+
+    def etag(request, *args, **kwargs):
+        current = read_versions(request, *args, **kwargs)
+        if current is None:
+            return None
+        # The CSRF cookie is part of the key so a cached page never carries a stale form token
+        parts = [
+            request.get_full_path(), request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            *sorted(current.items()),
+        ]
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        current = read_versions(request, *args, **kwargs)
+        if current is None:
+            return None
+        return datetime.fromtimestamp(max(current.values()), tz=dt_timezone.utc)
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+@receiver(post_transition)
+def _order_transitioned(sender, instance, name, **kwargs):
+    # Bulk paths (reconcile_payments, sweep_expired_orders) send no post_save, but their transitions run here
+    if sender._meta.label == 'core.Order':
+        scopes = ['orders', customer_scope(instance.customer_id)]
+        if name in STOCK_TRANSITIONS:
+            scopes.append('availability')
+        bump(*scopes)
+
+
+@receiver(post_save, sender='core.Order')
+@receiver(post_delete, sender='core.Order')
+def _order_changed(sender, instance, **kwargs):
+    bump('orders', customer_scope(instance.customer_id))
+
+
+@receiver(post_save, sender='core.Availability')
+@receiver(post_delete, sender='core.Availability')
+@receiver(post_save, sender='core.Product')
+@receiver(post_delete, sender='core.Product')
+def _stock_changed(sender, instance, **kwargs):
+    bump('availability')
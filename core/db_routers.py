@@ -0,0 +1,132 @@
+# core/db_routers.py
+"""
+Primary/replica routing.
+
+Reads go to the replica alias (settings.REPLICA_DATABASE_ALIAS) when it is
+configured; writes, select_for_update and anything inside an atomic block go
+to the primary. After a write the current request (or command) stays on the
+primary, and ReplicaRoutingMiddleware keeps the user's next requests there for
+REPLICA_PIN_SECONDS so they read their own writes despite replication lag.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'replica_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = ContextVar('replica_routing_state', default=None)
+
+
+class _RoutingState:
+    __slots__ = ('pinned', 'wrote', 'stale_ok')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.stale_ok = False
+
+
+def _current_state():
+    state = _state.get()
+    if state is None:
+        # Outside a request (management commands, threads): one state per context
+        state = _RoutingState()
+        _state.set(state)
+    return state
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_to_primary():
+    _current_state().pinned = True
+
+
+@contextmanager
+def replica_reads():
+    """Send reads in the block to the replica even after a write, for data where lag is acceptable."""
+    state = _current_state()
+    previous, state.stale_ok = state.stale_ok, True
+    try:
+        yield
+    finally:
+        state.stale_ok = previous
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = replica_alias()
+        if replica is None:
+            return None
+        state = _current_state()
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.pinned and not state.stale_ok:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state = _current_state()
+        state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pins unsafe requests, and requests carrying the pin cookie, to the primary;
+    sets the cookie on responses to requests that wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replica_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        # The state object is shared with the sync_to_async threads that run the queries,
+        # which copy this context, so their writes still set state.wrote
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        return _RoutingState(pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,123 @@
+# core/file_serving.py
+"""
+Serving invoices and payment proofs after a permission check.
+
+serve_document() answers conditional requests itself (ETag from the blob's
+content hash, see core/storage.py, or size and mtime for other files), so a
+repeated view costs a stat() and a 304. Otherwise, with
+FILE_SERVING_BACKEND='nginx' it returns an empty response carrying
+X-Accel-Redirect under FILE_SERVING_ACCEL_PREFIX, and with 'sendfile'
+(Apache mod_xsendfile, lighttpd) an X-Sendfile path; the front server then
+sends the bytes and handles Range. The default 'python' backend streams the
+file itself: whole files through FileResponse (which WSGI servers hand to
+sendfile via wsgi.file_wrapper), single byte ranges as 206 responses.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .storage import blob_digest
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def document_etag(name, stat):
+    digest = blob_digest(name)
+    if digest:
+        return quote_etag(digest)
+    return 'W/' + quote_etag(hashlib.md5(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest())
+
+
+def parse_range(header, size):
+    """(start, end inclusive) for a single satisfiable byte range, None to send the whole file, or 'invalid'."""
+    match = BYTE_RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Malformed and multi-range requests get the whole file
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            block = fh.read(min(BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+def serve_document(request, fieldfile, filename, content_type=None, as_attachment=False):
+    """Respond with a stored document; the caller has already checked that the user may see it."""
+    if not fieldfile:
+        raise Http404('No such document.')
+    try:
+        path = fieldfile.path
+        stat = os.stat(path)
+    except NotImplementedError:
+        # Storage without local paths: no validators or hand-off, just stream it
+        return FileResponse(fieldfile.open('rb'), as_attachment=as_attachment, filename=filename)
+    except FileNotFoundError:
+        raise Http404('No such document.')
+
+    etag = document_etag(fieldfile.name, stat)
+    last_modified = http_date(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _document_response(request, path, fieldfile.name, stat.st_size, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Content-Type'] = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    # Documents can change behind the same URL (a re-rendered invoice), so browsers revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _document_response(request, path, name, size, etag):
+    backend = getattr(settings, 'FILE_SERVING_BACKEND', 'python')
+    if backend == 'nginx':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = quote(settings.FILE_SERVING_ACCEL_PREFIX.rstrip('/') + '/' + name)
+        return response
+    if backend == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+
+    byte_range = None
+    if request.method == 'GET' and 'HTTP_RANGE' in request.META:
+        if_range = request.headers.get('If-Range')
+        # A Range with a stale If-Range validator gets the whole, current file
+        if not if_range or if_range == etag:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range == 'invalid':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, 'rb'))
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,262 @@
+# core/forecasting.py
+"""
+Weekly demand forecasts for availability planning.
+
+Historical demand is the quantity ordered per product and ship week, read with
+one grouped query into a weeks x products matrix. One multi-output ridge
+regression over trend and seasonal (Fourier) features of the ship week is
+solved for the whole matrix in closed form, so all products train in a single
+vectorized pass.
+The last fit is cached with a stamp of the newest order id and the last closed
+ship week. Requests never train: when the stamp is out of date (new orders, or
+another week's order book closed) they serve the previous fit and hand a refit
+to a background thread, one at a time across workers sharing the cache.
+forecast_demand refits synchronously. Training and forecasting use NumPy only,
+so neither requests nor background refits load pandas, scikit-learn or scipy.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from . import week_calendar
+from .db_routers import replica_reads
+from .instrumentation import span, timed
+from .models import Availability, Order, Product
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'demand_forecast:latest'
+REFIT_LOCK_KEY = 'demand_forecast:refitting'
+# A refit that dies without releasing the lock blocks others for at most this long
+REFIT_LOCK_SECONDS = 600
+HARMONICS = 3
+RIDGE_ALPHA = 1.0
+# ~80% band around the point forecast, assuming normally distributed residuals
+INTERVAL_Z = 1.2816
+
+
+def period_features(years, weeks, base_year):
+    """Design matrix for (year, ISO week) pairs: a linear trend plus HARMONICS sine/cosine pairs."""
+    years = np.asarray(years, dtype=float)
+    weeks = np.asarray(weeks, dtype=float)
+    phase = 2 * np.pi * (weeks - 1) / 52.0
+    columns = [years - base_year + (weeks - 1) / 52.0]
+    for k in range(1, HARMONICS + 1):
+        columns.append(np.sin(k * phase))
+        columns.append(np.cos(k * phase))
+    return np.column_stack(columns)
+
+
+def closed_week(today=None):
+    """Last ship week whose order book has closed: the ISO week before the current one."""
+    year, week, _ = ((today or timezone.localdate()) - timedelta(days=7)).isocalendar()
+    return year, week
+
+
+def demand_matrix(until):
+    """
+    (periods, product_ids, quantities): the ordered quantity per ship week and product, as a
+    len(periods) x len(product_ids) array over the (year, week_number) periods from the first
+    ordered week through `until`, zero-filled.
+    """
+    rows = (
+        Order.objects.filter(
+            Q(availability__year__lt=until[0])
+            | Q(availability__year=until[0], availability__week_number__lte=until[1])
+        )
+        .values_list('availability__product_id', 'availability__year', 'availability__week_number')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    rows = list(rows)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    if not rows:
+        return [], product_ids, np.zeros((0, len(product_ids)))
+
+    first = min((year, week) for _, year, week, _ in rows)
+    periods = [
+        (year, week)
+        for year in range(first[0], until[0] + 1)
+        for week in range(1, week_calendar.weeks_in_year(year) + 1)
+        if first <= (year, week) <= tuple(until)
+    ]
+    period_rows = {period: row for row, period in enumerate(periods)}
+    product_columns = {product_id: column for column, product_id in enumerate(product_ids)}
+    quantities = np.zeros((len(periods), len(product_ids)))
+    for product_id, year, week, quantity in rows:
+        quantities[period_rows[(year, week)], product_columns[product_id]] += quantity
+    return periods, product_ids, quantities
+
+
+def fit_ridge(X, Y, alpha=RIDGE_ALPHA):
+    """
+    (coef, intercept) of a ridge regression with an unpenalised intercept, solved in closed form
+    for every column of Y at once; coef is (columns of Y) x (features), as scikit-learn's Ridge.
+    """
+    x_mean, y_mean = X.mean(axis=0), Y.mean(axis=0)
+    centered = X - x_mean
+    coef = np.linalg.solve(centered.T @ centered + alpha * np.eye(X.shape[1]), centered.T @ (Y - y_mean)).T
+    return coef, y_mean - coef @ x_mean
+
+
+@timed('forecast_training')
+def train(until=None):
+    """Fit every product's weekly demand at once. Returns the fitted parameters, or None without enough history."""
+    until = until or closed_week()
+    with span('forecast_history'):
+        periods, product_ids, Y = demand_matrix(until)
+    features = 2 * HARMONICS + 1
+    # The residual spread needs at least one degree of freedom left after the features and intercept
+    if len(periods) <= features + 1 or not product_ids:
+        return None
+    years, weeks = np.array(periods).T
+    base_year = int(years.min())
+    X = period_features(years, weeks, base_year)
+    coef, intercept = fit_ridge(X, Y)
+    residuals = Y - (X @ coef.T + intercept)
+    return {
+        'product_ids': product_ids,
+        'base_year': base_year,
+        'coef': coef,
+        'intercept': intercept,
+        'residual_std': np.sqrt((residuals ** 2).sum(axis=0) / (len(periods) - features - 1)),
+        'history': {'from': list(periods[0]), 'until': list(until), 'weeks': len(periods)},
+        'trained_at': timezone.now(),
+    }
+
+
+def cache_stamp(until=None):
+    """Changes whenever an order is placed or another ship week closes."""
+    until = until or closed_week()
+    last_order = Order.objects.aggregate(last=Max('id'))['last'] or 0
+    return f'{last_order}:{until[0]}-{until[1]}'
+
+
+_executor_lock = threading.Lock()
+_executor = None
+
+
+@replica_reads()
+def refit():
+    """Train on the current history and serve the result from now on. Returns it (None without enough history)."""
+    until = closed_week()
+    # Stamped before training, so orders placed meanwhile make the new fit stale again
+    stamp = cache_stamp(until)
+    fitted = train(until)
+    cache.set(CACHE_KEY, {'stamp': stamp, 'fitted': fitted},
+              getattr(settings, 'DEMAND_FORECAST_CACHE_SECONDS', 7 * 24 * 3600))
+    return fitted
+
+
+@replica_reads()
+def get_model(refresh=False):
+    """
+    The last fit, or None before the first one. A fit older than the order history is still
+    returned while schedule_refit() replaces it; refresh=True refits here instead.
+    """
+    if refresh:
+        return refit()
+    latest = cache.get(CACHE_KEY)
+    if latest is None or latest['stamp'] != cache_stamp():
+        schedule_refit()
+    return latest['fitted'] if latest else None
+
+
+def _refit_in_background():
+    close_old_connections()
+    try:
+        refit()
+    except Exception:
+        logger.exception('Demand forecast refit failed')
+    finally:
+        cache.delete(REFIT_LOCK_KEY)
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='demand-forecast')
+        return _executor
+
+
+def schedule_refit():
+    """Refit on this process's background thread (DEMAND_FORECAST_REFIT='background') unless one is running."""
+    if getattr(settings, 'DEMAND_FORECAST_REFIT', 'background') == 'off':
+        return
+    if cache.add(REFIT_LOCK_KEY, True, REFIT_LOCK_SECONDS):
+        _get_executor().submit(_refit_in_background)
+
+
+def predict(fitted, year, weeks):
+    """Point forecasts and interval bounds, each a len(weeks) x products array clipped at zero."""
+    X = period_features([year] * len(weeks), weeks, fitted['base_year'])
+    point = X @ fitted['coef'].T + fitted['intercept']
+    spread = INTERVAL_Z * fitted['residual_std']
+    return np.clip(point, 0, None), np.clip(point - spread, 0, None), np.clip(point + spread, 0, None)
+
+
+def forecast_weeks(year, fitted):
+    """(weeks, forecast, low, high) for every ISO week of `year`: rounded len(weeks) x products integer arrays."""
+    weeks = np.arange(1, week_calendar.weeks_in_year(year) + 1)
+    return (weeks, *(np.rint(values).astype(int) for values in predict(fitted, year, weeks)))
+
+
+def forecast_lookup(year):
+    """{(product_id, week_number): forecast quantity} for the hatchery dashboard."""
+    fitted = get_model()
+    if fitted is None:
+        return {}
+    weeks, point, _, _ = forecast_weeks(year, fitted)
+    return {
+        (product_id, int(week)): int(point[row, column])
+        for column, product_id in enumerate(fitted['product_ids'])
+        for row, week in enumerate(weeks)
+    }
+
+
+def demand_forecast(year, product_id=None):
+    """Per-product weekly forecasts for `year` next to the planned availability, for the API."""
+    fitted = get_model()
+    results = []
+    if fitted is not None:
+        weeks, point, low, high = forecast_weeks(year, fitted)
+        columns = [
+            (column, pk) for column, pk in enumerate(fitted['product_ids']) if product_id in (None, pk)
+        ]
+        available = dict(
+            ((row[0], row[1]), row[2]) for row in
+            Availability.objects.filter(year=year).values_list('product_id', 'week_number', 'available_quantity')
+        )
+        products = Product.objects.in_bulk([pk for _, pk in columns])
+        for column, pk in columns:
+            results.append({
+                'product_id': pk,
+                'product': str(products[pk]),
+                'weeks': [
+                    {
+                        'week_number': int(week),
+                        'ship_date': week_calendar.week_start(year, int(week)),
+                        'forecast': int(point[row, column]),
+                        'low': int(low[row, column]),
+                        'high': int(high[row, column]),
+                        'available': available.get((pk, int(week))),
+                    }
+                    for row, week in enumerate(weeks)
+                ],
+            })
+    return {
+        'year': year,
+        'trained_at': fitted['trained_at'] if fitted else None,
+        'history': fitted['history'] if fitted else None,
+        'products': results,
+    }
@@ -3,6 +3,7 @@ from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Order, Availability, User, Product
+from .week_calendar import is_valid_week, weeks_in_year
 from decimal import Decimal
 
 class AvailabilityForm(forms.ModelForm):
@@ -10,7 +11,7 @@ class AvailabilityForm(forms.ModelForm):
     ploidy = forms.ChoiceField(choices=Product.PLOIDY_CHOICES)
     diameter = forms.ChoiceField(choices=Product.DIAMETER_CHOICES)
     year = forms.IntegerField(min_value=2020, max_value=2030, initial=2025)
-    week_number = forms.IntegerField(min_value=1, max_value=52)
+    week_number = forms.IntegerField(min_value=1, max_value=53)
     available_quantity = forms.IntegerField(min_value=0)
 
     class Meta:
@@ -26,6 +27,9 @@ class AvailabilityForm(forms.ModelForm):
         week_number = cleaned_data.get('week_number')
         quantity = cleaned_data.get('available_quantity')
 
+        if year and week_number is not None and not is_valid_week(year, week_number):
+            raise ValidationError(f"{year} has only {weeks_in_year(year)} ISO weeks.")
+
         if strain and ploidy and diameter and year and week_number:
             product, created = Product.objects.get_or_create(
                 type=strain,
@@ -43,7 +47,7 @@ class AvailabilityForm(forms.ModelForm):
         else:
             raise ValidationError("All product details, year, and week number are required.")
 
-        if quantity < 0:
+        if quantity is not None and quantity < 0:
             raise ValidationError("Available quantity cannot be negative.")
 
         return cleaned_data
@@ -59,7 +63,7 @@ class OrderRequestForm(forms.ModelForm):
     strain = forms.ChoiceField(choices=Product.TYPE_CHOICES)
     ploidy = forms.ChoiceField(choices=Product.PLOIDY_CHOICES)
     year = forms.IntegerField(min_value=2020, max_value=2030, initial=2025)
-    week_number = forms.IntegerField(min_value=1, max_value=52)
+    week_number = forms.IntegerField(min_value=1, max_value=53)
     quantity = forms.IntegerField(min_value=1)
 
     class Meta:
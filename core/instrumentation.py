@@ -0,0 +1,208 @@
+# core/instrumentation.py
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import OPERATION_DURATION, OPERATIONS_IN_PROGRESS
+
+# Timings of the request being handled on this thread/task; None when instrumentation is off
+_current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Per-request accumulator for DB queries and named spans."""
+    __slots__ = ('db_queries', 'db_time', 'spans')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.spans = defaultdict(float)
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block of code as a named operation. Exported to /metrics when
+    OPERATION_METRICS is on; also attached to the current request when
+    PerformanceMiddleware is active. With both off it only reads a setting.
+    """
+    timings = _current_timings.get()
+    exported = getattr(settings, 'OPERATION_METRICS', True)
+    if timings is None and not exported:
+        yield
+        return
+    if exported:
+        OPERATIONS_IN_PROGRESS.inc(operation=name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        if exported:
+            OPERATIONS_IN_PROGRESS.dec(operation=name)
+            OPERATION_DURATION.observe(duration, operation=name)
+        if timings is not None:
+            timings.spans[name] += duration
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_timings.get() is None and not getattr(settings, 'OPERATION_METRICS', True):
+                # Skip the context manager entirely when nothing would be recorded
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of an already sorted sequence."""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class MetricsStore:
+    """Keeps a bounded window of samples per view and summarises them on demand."""
+
+    def __init__(self, sample_size=1000):
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = defaultdict(int)
+            self.samples = defaultdict(lambda: defaultdict(lambda: deque(maxlen=self.sample_size)))
+
+    def record(self, view_name, wall_time, timings):
+        with self.lock:
+            self.counts[view_name] += 1
+            samples = self.samples[view_name]
+            samples['wall'].append(wall_time)
+            samples['db'].append(timings.db_time)
+            samples['db_queries'].append(timings.db_queries)
+            for name, duration in timings.spans.items():
+                samples[f'span:{name}'].append(duration)
+
+    def snapshot(self):
+        with self.lock:
+            data = {view: {name: sorted(values) for name, values in samples.items()}
+                    for view, samples in self.samples.items()}
+            counts = dict(self.counts)
+        report = {}
+        for view, samples in data.items():
+            report[view] = {'requests': counts[view], 'metrics': {}}
+            for name, values in samples.items():
+                scale = 1 if name == 'db_queries' else 1000  # seconds -> ms
+                report[view]['metrics'][name] = {
+                    'samples': len(values),
+                    'mean': round(sum(values) / len(values) * scale, 3),
+                    'p50': round(percentile(values, 50) * scale, 3),
+                    'p95': round(percentile(values, 95) * scale, 3),
+                    'p99': round(percentile(values, 99) * scale, 3),
+                    'max': round(values[-1] * scale, 3),
+                }
+        return report
+
+
+metrics_store = MetricsStore(getattr(settings, 'PERF_INSTRUMENTATION_SAMPLE_SIZE', 1000))
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.db_wrapper(execute, sql, params, many, context)
+
+
+def _install_query_timer(connection, **kwargs):
+    # Once per connection object; it stays installed across reconnects and consults the current request's timings
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, DB query count/time and named spans for every request,
+    exposes them as a Server-Timing header and feeds metrics_store. Runs natively
+    under WSGI and ASGI, like MetricsMiddleware. The timings live in a context
+    variable, which sync_to_async carries into the thread running an async view's
+    ORM calls, and every connection gets a query timer that adds to them.
+    Removed from the middleware chain entirely when PERF_INSTRUMENTATION is off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Connections are per thread; ones opened from now on (ASGI request threads included) get the timer here
+        connection_created.connect(_install_query_timer, dispatch_uid='core.instrumentation.query_timer')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections this thread opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, start, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, start, timings)
+
+    def finish(self, request, response, start, timings):
+        wall_time = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        metrics_store.record(view_name, wall_time, timings)
+
+        entries = [
+            f'total;dur={wall_time * 1000:.1f}',
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+        ]
+        entries += [f'{name};dur={duration * 1000:.1f}' for name, duration in timings.spans.items()]
+        response['Server-Timing'] = ', '.join(entries)
+        return response
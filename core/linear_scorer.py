@@ -0,0 +1,50 @@
+# core/linear_scorer.py
+"""
+Pickle-free artifact format for linear reliability models.
+
+A fitted StandardScaler + LinearRegression pair is four arrays: scaler mean and
+scale, coefficients and intercept. They are stored with the feature names in a
+small .npz file, read back with allow_pickle=False and scored with plain NumPy,
+so scoring processes never import scikit-learn (or scipy, or pandas).
+"""
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class LinearScorer:
+    def __init__(self, features, mean, scale, coef, intercept):
+        self.features = [str(name) for name in features]
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.coef = np.asarray(coef, dtype=float).ravel()
+        self.intercept = float(intercept)
+        if not len(self.features) == len(self.mean) == len(self.scale) == len(self.coef):
+            raise ValueError('Feature names, scaler and coefficient shapes do not match')
+        # Fold the scaler into the coefficients: score = X @ weights + bias
+        self.weights = self.coef / self.scale
+        self.bias = self.intercept - float(self.mean @ self.weights)
+
+    @classmethod
+    def from_estimators(cls, model, scaler, features):
+        """Read the fitted attributes of a LinearRegression and StandardScaler (no sklearn import needed)."""
+        return cls(features, scaler.mean_, scaler.scale_, model.coef_, np.ravel(model.intercept_)[0])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) > FORMAT_VERSION:
+                raise ValueError(f'{path}: unsupported model format {int(data["format_version"])}')
+            return cls(data['features'], data['mean'], data['scale'], data['coef'], data['intercept'])
+
+    def save(self, path):
+        # Write through a file object so numpy does not append .npz to the name
+        with open(path, 'wb') as fh:
+            np.savez(
+                fh, format_version=np.array(FORMAT_VERSION), features=np.array(self.features),
+                mean=self.mean, scale=self.scale, coef=self.coef, intercept=np.array(self.intercept),
+            )
+
+    def score(self, X):
+        """Raw predictions for rows of X in `features` order (unclipped)."""
+        return np.atleast_2d(np.asarray(X, dtype=float)) @ self.weights + self.bias
@@ -0,0 +1,221 @@
+# core/live_updates.py
+"""
+Live dashboard updates over server-sent events.
+
+Order saves that follow a transition (or create an order), availability changes
+and new CustomerEvents are published once their transaction commits. On
+PostgreSQL they go out through NOTIFY, so every worker process receives them:
+each ASGI event loop that has SSE clients runs one LISTEN connection and fans
+the notifications out to its streams. On other databases (or with
+LIVE_UPDATES_BACKEND='local') events only reach streams in the publishing
+process, which is enough for a single-worker deployment.
+
+Bulk writers (bulk_update/bulk_create skip post_save, and F() updates carry no
+values) call publish_orders(), publish_availability() and
+publish_customer_events() themselves.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django_fsm.signals import post_transition
+
+from .models import Availability, CustomerEvent, Order
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'troutlodge_live'
+# Events a stream may fall behind by before it is told to reload instead
+QUEUE_SIZE = 256
+RECONNECT_SECONDS = 5
+
+
+def _use_notify():
+    backend = getattr(settings, 'LIVE_UPDATES_BACKEND', 'auto')
+    if backend == 'auto':
+        return connections['default'].vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+class Subscription:
+    def __init__(self, loop, accepts):
+        self.loop = loop
+        self.accepts = accepts
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class Broker:
+    """Fans events out to the SSE streams of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.listeners = {}
+
+    def subscribe(self, accepts):
+        """Register a stream on the running loop; accepts(event) filters what it receives."""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(loop, accepts)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if _use_notify() and (loop not in self.listeners or self.listeners[loop].done()):
+                self.listeners[loop] = loop.create_task(self.listen())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def deliver(self, event):
+        """Hand an event to every matching stream; callable from any thread."""
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.accepts(event) and not subscription.loop.is_closed():
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    async def listen(self):
+        """LISTEN on the primary for the lifetime of the loop, reconnecting after errors."""
+        import psycopg
+
+        params = connections['default'].get_connection_params()
+        # Django's cursor class and adapters are for its own sync connections
+        params.pop('cursor_factory', None)
+        params.pop('context', None)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(**params, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {CHANNEL}')
+                    async for notify in conn.notifies():
+                        self.deliver(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Live updates listener failed; reconnecting in %ss', RECONNECT_SECONDS)
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+broker = Broker()
+
+
+def _send(event):
+    if _use_notify():
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps(event, default=str)])
+    else:
+        broker.deliver(event)
+
+
+def publish(kind, data):
+    """Publish an event once the current transaction commits (immediately outside one)."""
+    event = {'kind': kind, 'data': data, 'at': timezone.now().isoformat()}
+    transaction.on_commit(lambda: _send(event))
+
+
+def order_data(order, previous=None):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'previous': previous,
+        'customer_id': order.customer_id,
+        'customer': order.customer.username,
+        'product': order.product_display,
+        'quantity': order.quantity,
+        'week': order.ship_week or order.availability.week_number,
+        'created_at': order.created_at.date().isoformat(),
+    }
+
+
+def publish_orders(orders, previous):
+    for order in orders:
+        publish('order', order_data(order, previous))
+
+
+def publish_availability(availability_ids):
+    """Publish the committed quantities of these availability rows (read after commit, so F() updates count)."""
+    availability_ids = list(availability_ids)
+
+    def send():
+        rows = Availability.objects.filter(pk__in=availability_ids).select_related('product')
+        for availability in rows:
+            _send({'kind': 'availability', 'at': timezone.now().isoformat(), 'data': {
+                'id': availability.id,
+                'product': str(availability.product),
+                'year': availability.year,
+                'week': availability.week_number,
+                'ship_date': availability.expected_ship_date.isoformat(),
+                'available_quantity': availability.available_quantity,
+            }})
+
+    if availability_ids:
+        transaction.on_commit(send)
+
+
+def publish_customer_events(events):
+    for event in events:
+        publish('customer_event', {
+            'id': event.id,
+            'type': event.event_type,
+            'label': event.get_event_type_display(),
+            'user_id': event.user_id,
+            'order_id': event.order_id,
+        })
+
+
+def audience(user):
+    """Which events a user's stream receives: sales everything, hatchery orders and stock, customers their own."""
+    if user.role == 'sales':
+        return lambda event: True
+    if user.role == 'hatchery':
+        return lambda event: event['kind'] in ('order', 'availability')
+    return lambda event: (
+        event['kind'] == 'availability'
+        or event['kind'] == 'order' and event['data']['customer_id'] == user.id
+        or event['kind'] == 'customer_event' and event['data']['user_id'] == user.id
+    )
+
+
+@receiver(post_transition)
+def _order_transitioned(sender, instance, name, source, target, **kwargs):
+    if sender is Order:
+        # Published by the save that persists the transition
+        instance._live_previous_status = source
+
+
+@receiver(post_save, sender=Order)
+def _order_saved(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_live_previous_status', None)
+    if created or previous is not None:
+        publish('order', order_data(instance, previous))
+    if previous == 'down_paid' and instance.status == 'cancelled':
+        # cancel() releases the stock with an F() update, which sends no post_save
+        publish_availability([instance.availability_id])
+
+
+@receiver(post_save, sender=Availability)
+def _availability_saved(sender, instance, **kwargs):
+    publish_availability([instance.pk])
+
+
+@receiver(post_save, sender=CustomerEvent)
+def _customer_event_saved(sender, instance, created, **kwargs):
+    if created:
+        publish_customer_events([instance])
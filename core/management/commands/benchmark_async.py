@@ -0,0 +1,250 @@
+# core/management/commands/benchmark_async.py
+import asyncio
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from core.benchmarking import LatencyRecorder, compare_to_baseline, environment_metadata, write_report
+from core.models import User, Product, Availability, Order
+from core.payment import PaymentAdapter
+
+BENCH_PREFIX = 'bench_async_'
+BENCH_YEAR = 2031
+GATEWAY_CALLS = ('request_downpayment', 'request_full_payment', 'verify_payment')
+
+
+class LatencyEmailBackend(EmailBackend):
+    """locmem backend that waits like a slow SMTP server before accepting each batch."""
+    latency = 0.0
+
+    def send_messages(self, messages):
+        time.sleep(self.latency)
+        return super().send_messages(messages)
+
+
+@contextmanager
+def gateway_latency(seconds):
+    """Make every PaymentAdapter call wait like a remote payment gateway."""
+    originals = {name: getattr(PaymentAdapter, name) for name in GATEWAY_CALLS}
+
+    def delayed(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(PaymentAdapter, name, delayed(func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(PaymentAdapter, name, func)
+
+
+class InFlight:
+    """Counts requests in progress and remembers the peak."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+class Command(BaseCommand):
+    help = ('Compare the concurrent request capacity of one worker running the sync views under WSGI (a thread '
+            'pool of --wsgi-threads, like gunicorn sync/gthread workers) and the async views under ASGI (one event '
+            'loop, like a uvicorn worker, with --concurrency requests in flight). Payment gateway and SMTP latency '
+            'are simulated. The ASGI application is driven in-process. Run against a disposable database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100, help='Orders approved per mode')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight against the ASGI worker')
+        parser.add_argument('--wsgi-threads', type=int, default=4, help='Request threads of the WSGI worker')
+        parser.add_argument('--latency-ms', type=float, default=200.0,
+                            help='Simulated latency of each payment gateway call and SMTP send')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--output', help='Write the JSON report to this path (e.g. a new baseline)')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline')
+        parser.add_argument('--keep-data', action='store_true', help='Do not delete the seeded benchmark data')
+
+    def handle(self, *args, **options):
+        latency = options['latency_ms'] / 1000
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        LatencyEmailBackend.latency = latency
+        recorder = LatencyRecorder()
+        summary = {}
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND=f'{__name__}.LatencyEmailBackend',
+            MEDIA_ROOT=tempfile.mkdtemp(prefix='troutlodge-bench-'),
+        ), gateway_latency(latency), self.connection_per_request():
+            sales, customers, availability = self.seed()
+            try:
+                session = self.session_cookie(sales)
+                for mode in modes:
+                    orders = self.seed_orders(customers, availability, options['orders'])
+                    in_flight = InFlight()
+                    start = time.perf_counter()
+                    if mode == 'wsgi':
+                        self.run_wsgi(recorder, in_flight, session, orders, options['wsgi_threads'])
+                    else:
+                        asyncio.run(self.run_asgi(recorder, in_flight, session, orders, options['concurrency']))
+                    wall_time = time.perf_counter() - start
+                    summary[mode] = {
+                        'wall_time_s': round(wall_time, 3),
+                        'requests_per_s': round(2 * len(orders) / wall_time, 2),
+                        'peak_in_flight': in_flight.peak,
+                    }
+            finally:
+                if not options['keep_data']:
+                    self.cleanup()
+
+        # Throughput of every endpoint is relative to the whole run of its mode
+        results = {}
+        for mode, row in summary.items():
+            results.update({
+                endpoint: stats for endpoint, stats in recorder.summarize(row['wall_time_s']).items()
+                if endpoint.startswith(f'{mode}:')
+            })
+        report = {
+            'meta': environment_metadata(
+                orders=options['orders'], concurrency=options['concurrency'], wsgi_threads=options['wsgi_threads'],
+                latency_ms=options['latency_ms'], modes=modes,
+                async_pools={name: getattr(settings, name) for name in (
+                    'ASYNC_PAYMENT_WORKERS', 'ASYNC_PDF_WORKERS', 'ASYNC_EMAIL_WORKERS')},
+            ),
+            'workers': summary,
+            'results': results,
+        }
+        self.print_report(report)
+        if options['output']:
+            write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options['baseline']:
+            regressions = compare_to_baseline(report['results'], options['baseline'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    @contextmanager
+    def connection_per_request(self):
+        # Every ASGI request runs its sync code on a fresh thread, so persistent connections would
+        # leak (deploy ASGI with DB_POOL=True). Both modes connect per request to stay comparable.
+        db = connections.settings['default']
+        previous = db['CONN_MAX_AGE']
+        db['CONN_MAX_AGE'] = 0
+        try:
+            yield
+        finally:
+            db['CONN_MAX_AGE'] = previous
+
+    def seed(self):
+        call_command('populate_test_data', stdout=self.stdout)
+        sales = User.objects.get(username='sales1')
+        password = make_password('testpass123')
+        User.objects.bulk_create([
+            User(username=f'{BENCH_PREFIX}{i}', email=f'{BENCH_PREFIX}{i}@test.com', role='customer', password=password)
+            for i in range(20)
+        ], ignore_conflicts=True)
+        customers = list(User.objects.filter(username__startswith=BENCH_PREFIX))
+        availability, _ = Availability.objects.get_or_create(
+            product=Product.objects.order_by('id').first(), year=BENCH_YEAR, week_number=30,
+            defaults={'available_quantity': 10 ** 9},
+        )
+        return sales, customers, availability
+
+    def seed_orders(self, customers, availability, count):
+        orders = [
+            Order(customer=customers[i % len(customers)], availability=availability, quantity=20000)
+            for i in range(count)
+        ]
+        # bulk_create skips save(), so take the shipment snapshot here
+        for order in orders:
+            order.snapshot_shipment()
+        orders = Order.objects.bulk_create(orders)
+        return [order.id for order in orders]
+
+    def cleanup(self):
+        Order.objects.filter(customer__username__startswith=BENCH_PREFIX).delete()
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        Availability.objects.filter(year=BENCH_YEAR, order__isnull=True).delete()
+
+    def session_cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def run_wsgi(self, recorder, in_flight, session, order_ids, threads):
+        def request(endpoint, method, path):
+            client = Client(raise_request_exception=False)
+            client.cookies[settings.SESSION_COOKIE_NAME] = session
+            with in_flight:
+                started = time.perf_counter()
+                response = getattr(client, method)(path)
+            recorder.record(f'wsgi:{endpoint}', time.perf_counter() - started, error=response.status_code != 200)
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = []
+            for order_id in order_ids:
+                futures.append(executor.submit(request, 'order_approve', 'post', f'/api/orders/{order_id}/approve/'))
+                futures.append(executor.submit(request, 'sales_dashboard', 'get', '/sales/'))
+            for future in futures:
+                future.result()
+
+    async def run_asgi(self, recorder, in_flight, session, order_ids, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(endpoint, method, path):
+            async with semaphore:
+                client = AsyncClient(raise_request_exception=False)
+                client.cookies[settings.SESSION_COOKIE_NAME] = session
+                with in_flight:
+                    started = time.perf_counter()
+                    response = await getattr(client, method)(path)
+                recorder.record(f'asgi:{endpoint}', time.perf_counter() - started, error=response.status_code != 200)
+
+        await asyncio.gather(*(
+            coroutine
+            for order_id in order_ids
+            for coroutine in (
+                request('order_approve', 'post', f'/api/async/orders/{order_id}/approve/'),
+                request('sales_dashboard', 'get', '/async/sales/'),
+            )
+        ))
+
+    def print_report(self, report):
+        for mode, row in report['workers'].items():
+            self.stdout.write(
+                f"{mode.upper()} worker: {row['requests_per_s']} req/s, peak {row['peak_in_flight']} requests in flight, "
+                f"{row['wall_time_s']} s"
+            )
+        header = f"{'endpoint':<28}{'reqs':>6}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint, row in report['results'].items():
+            self.stdout.write(
+                f"{endpoint:<28}{row['requests']:>6}{row['errors']:>6}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+            )
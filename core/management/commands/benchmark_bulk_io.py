@@ -0,0 +1,76 @@
+# core/management/commands/benchmark_bulk_io.py
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from core.benchmarking import environment_metadata, write_report
+from core.bulk_io import EVENT_FIELDS, copy_rows, explicit_timestamps, export_csv, is_postgres
+from core.models import User, CustomerEvent
+
+
+class Command(BaseCommand):
+    help = 'Compare COPY-based ingestion/export against bulk_create and queryset iteration (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size')
+        parser.add_argument('--output', help='Write the JSON report to this path')
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            self.stdout.write(self.style.WARNING(
+                f'{connection.vendor} has no COPY; the copy_* paths fall back to bulk_create here.'
+            ))
+        rows = options['rows']
+        results = {}
+        with transaction.atomic():
+            customer = User.objects.create_user(username='bench_bulk_io', role='customer')
+            now = timezone.now()
+
+            def events():
+                for i in range(rows):
+                    yield customer.id, 'LOGIN', now, None, {'ip_address': '10.0.0.1', 'n': i}
+
+            start = time.perf_counter()
+            with explicit_timestamps(CustomerEvent._meta.get_field('timestamp')):
+                batch = []
+                for user_id, event_type, timestamp, order_id, metadata in events():
+                    batch.append(CustomerEvent(user_id=user_id, event_type=event_type, timestamp=timestamp,
+                                               order_id=order_id, metadata=metadata))
+                    if len(batch) == options['batch_size']:
+                        CustomerEvent.objects.bulk_create(batch)
+                        batch = []
+                CustomerEvent.objects.bulk_create(batch)
+            results['insert_bulk_create'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            copy_rows(CustomerEvent, EVENT_FIELDS, events())
+            results['insert_copy'] = time.perf_counter() - start
+
+            queryset = CustomerEvent.objects.filter(user=customer)
+            fields = ('id', 'user__username', 'event_type', 'timestamp', 'metadata')
+            start = time.perf_counter()
+            out = io.StringIO()
+            for row in queryset.values_list(*fields).iterator(chunk_size=options['batch_size']):
+                out.write(','.join(map(str, row)) + '\n')
+            results['export_iterator'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            export_csv(queryset, fields, io.StringIO())
+            results['export_copy'] = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        report = {
+            'meta': environment_metadata(rows=rows, batch_size=options['batch_size']),
+            'results': {
+                name: {'seconds': round(seconds, 3), 'rows_per_s': round(rows * (2 if 'export' in name else 1) / seconds)}
+                for name, seconds in results.items()
+            },
+        }
+        for name, row in report['results'].items():
+            self.stdout.write(f"{name:<22}{row['seconds']:>10} s{row['rows_per_s']:>14} rows/s")
+        if options['output']:
+            write_report(options['output'], report)
@@ -0,0 +1,148 @@
+# core/management/commands/benchmark_connections.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.utils import timezone
+from core.benchmarking import LatencyRecorder, compare_to_baseline, environment_metadata, write_report
+from core.models import User
+
+BENCH_USERNAME = 'bench_connections_customer'
+ENDPOINTS = {
+    'availability_list': '/api/availabilities/?year={year}',
+    'customer_dashboard': '/customer/',
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare request latency with a new database connection per request (CONN_MAX_AGE=0), persistent '
+            'connections and, on PostgreSQL with psycopg_pool installed, the native pool, in one report.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--max-age', type=int, default=600, help='CONN_MAX_AGE used for the persistent mode')
+        parser.add_argument('--output', help='Write the JSON report to this path')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        db_options = settings_dict.setdefault('OPTIONS', {})
+        original_pool = db_options.get('pool')
+        # mode -> (CONN_MAX_AGE, pool options); the pool requires CONN_MAX_AGE=0, and closing a
+        # connection returns it to the pool. DB_POOL's sizes are used when it is enabled.
+        modes = {'per_request': (0, None), 'persistent': (options['max_age'], None)}
+        if self.pool_available():
+            modes['pooled'] = (0, original_pool or True)
+        else:
+            self.stdout.write(self.style.WARNING('Skipping the pooled mode: needs PostgreSQL and psycopg_pool.'))
+
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'role': 'customer'})
+        self.opened = 0
+        self.lock = threading.Lock()
+        connection_created.connect(self.count_connection)
+        original_max_age = settings_dict['CONN_MAX_AGE']
+        summary, results = {}, {}
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                for mode, (max_age, pool) in modes.items():
+                    connection.close()
+                    self.close_pool()
+                    settings_dict['CONN_MAX_AGE'] = max_age
+                    db_options.pop('pool', None)
+                    if pool:
+                        db_options['pool'] = pool
+                    self.opened = 0
+                    recorder = LatencyRecorder()
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                        for future in [
+                            executor.submit(self.worker, recorder, mode, user, count)
+                            for count in self.split(options['requests'], options['concurrency'])
+                        ]:
+                            future.result()
+                    wall_time = time.perf_counter() - start
+                    summary[mode] = {'wall_time_s': round(wall_time, 3), 'connects': self.opened}
+                    results.update(recorder.summarize(wall_time))
+        finally:
+            connection.close()
+            self.close_pool()
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+            db_options.pop('pool', None)
+            if original_pool:
+                db_options['pool'] = original_pool
+            connection_created.disconnect(self.count_connection)
+            user.delete()
+
+        report = {
+            'meta': environment_metadata(
+                requests=options['requests'], concurrency=options['concurrency'],
+                modes={mode: {'conn_max_age': max_age, 'pool': pool} for mode, (max_age, pool) in modes.items()},
+                conn_health_checks=settings_dict.get('CONN_HEALTH_CHECKS', False),
+            ),
+            'modes': summary,
+            'results': results,
+        }
+        self.print_report(report)
+        if options['output']:
+            write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options['baseline']:
+            regressions = compare_to_baseline(report['results'], options['baseline'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def pool_available(self):
+        if connection.vendor != 'postgresql':
+            return False
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def close_pool(self):
+        if getattr(connection, 'pool', None) is not None:
+            connection.close_pool()
+
+    def split(self, total, workers):
+        workers = max(1, min(workers, total))
+        return [total // workers + (i < total % workers) for i in range(workers)]
+
+    def count_connection(self, sender, connection, **kwargs):
+        with self.lock:
+            self.opened += 1
+
+    def worker(self, recorder, mode, user, count):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        year = timezone.now().year
+        try:
+            for _ in range(count):
+                for endpoint, path in ENDPOINTS.items():
+                    started = time.perf_counter()
+                    response = client.get(path.format(year=year))
+                    # The test client disconnects Django's request_finished handler; apply it here
+                    connection.close_if_unusable_or_obsolete()
+                    recorder.record(f'{mode}:{endpoint}', time.perf_counter() - started,
+                                    error=response.status_code != 200)
+        finally:
+            connection.close()
+
+    def print_report(self, report):
+        header = f"{'endpoint':<36}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint, row in report['results'].items():
+            self.stdout.write(
+                f"{endpoint:<36}{row['requests']:>6}{row['errors']:>6}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+            )
+        for mode, row in report['modes'].items():
+            self.stdout.write(f"{mode}: {row['connects']} connects (pool checkouts when pooled) in {row['wall_time_s']}s")
@@ -0,0 +1,102 @@
+# core/management/commands/benchmark_imports.py
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmarking import compare_to_baseline, environment_metadata, write_report
+from core.instrumentation import percentile
+
+# What a fresh gunicorn worker does before its first request: build the WSGI app and load the URLconf
+# (which imports every view module)
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+import psutil
+print(json.dumps({"seconds": elapsed, "rss": psutil.Process().memory_info().rss, "modules": sorted(sys.modules)}))
+'''
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+class Command(BaseCommand):
+    help = ('Measure worker startup (WSGI app + URLconf) import time and RSS in fresh interpreters, list the '
+            'heaviest packages from -X importtime, and fail if heavy optional dependencies load at startup.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreter runs to time')
+        parser.add_argument('--top', type=int, default=15, help='Heaviest top-level packages to list')
+        parser.add_argument('--forbid', default='reportlab,pandas,sklearn,scipy',
+                            help='Comma-separated packages that must not be imported at startup ("" to disable)')
+        parser.add_argument('--output', help='Write the JSON report to this path')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed startup time / RSS growth against the baseline')
+
+    def run_startup(self, *flags):
+        completed = subprocess.run(
+            [sys.executable, *flags, '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if completed.returncode:
+            raise CommandError(f'Worker startup failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+    def handle(self, *args, **options):
+        samples = [self.run_startup()[0] for _ in range(options['runs'])]
+        seconds = sorted(sample['seconds'] for sample in samples)
+        rss_mb = statistics.median(sample['rss'] for sample in samples) / 2 ** 20
+        modules = samples[-1]['modules']
+
+        # One more run under -X importtime for the per-package breakdown (it slows imports, so it is not timed)
+        _, importtime = self.run_startup('-X', 'importtime')
+        by_package = defaultdict(int)
+        for line in importtime.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                by_package[match.group(4).split('.')[0]] += int(match.group(1))
+        heaviest = sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]
+
+        forbidden = [name for name in options['forbid'].split(',') if name]
+        loaded = sorted(name for name in forbidden if name in modules)
+
+        report = {
+            'meta': environment_metadata(runs=options['runs']),
+            'results': {
+                'worker_startup': {
+                    'p50_ms': round(percentile(seconds, 50) * 1000, 1),
+                    'p95_ms': round(percentile(seconds, 95) * 1000, 1),
+                    'rss_mb': round(rss_mb, 1),
+                    'modules': len(modules),
+                },
+            },
+            'heaviest_packages_ms': {name: round(us / 1000, 1) for name, us in heaviest},
+            'forbidden_loaded': loaded,
+        }
+        row = report['results']['worker_startup']
+        self.stdout.write(
+            f"Worker startup: p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms, RSS {row['rss_mb']} MB, "
+            f"{row['modules']} modules ({options['runs']} runs)"
+        )
+        self.stdout.write('Heaviest packages (self import time, -X importtime):')
+        for name, ms in report['heaviest_packages_ms'].items():
+            self.stdout.write(f'  {name:<24}{ms:>10.1f} ms')
+
+        if options['output']:
+            write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        problems = [f'{name} is imported at startup' for name in loaded]
+        if options['baseline']:
+            for metric in ('p95_ms', 'rss_mb'):
+                problems += compare_to_baseline(report['results'], options['baseline'], options['tolerance'], metric)
+        if problems:
+            raise CommandError('Startup regressions:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No heavy optional dependencies at startup.'
+                                             + (' No regressions against baseline.' if options['baseline'] else '')))
@@ -0,0 +1,174 @@
+# core/management/commands/benchmark_lifecycle.py
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from core.benchmarking import LatencyRecorder, compare_to_baseline, environment_metadata, write_report
+from core.instrumentation import RequestTimings
+from core.models import User, Product, Availability, Order
+
+BENCH_PREFIX = 'bench_customer_'
+BENCH_YEAR = 2030
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the full order lifecycle (request -> approve -> verify down -> verify full -> ship) '
+            'through the web views and the REST API with concurrent clients. Run against a disposable database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=20, help='Benchmark customers to seed')
+        parser.add_argument('--weeks', type=int, default=10, help='Availability weeks to seed per product')
+        parser.add_argument('--orders', type=int, default=50, help='Lifecycles to run per interface')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--interface', choices=['web', 'api', 'both'], default='both')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this path (e.g. a new baseline)')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline')
+        parser.add_argument('--keep-data', action='store_true', help='Do not delete the seeded benchmark data')
+
+    def handle(self, *args, **options):
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            MEDIA_ROOT=tempfile.mkdtemp(prefix='troutlodge-bench-'),
+        ):
+            customers, sales, availabilities = self.seed(options)
+            try:
+                report = self.run(customers, sales, availabilities, options)
+            finally:
+                if not options['keep_data']:
+                    self.cleanup()
+
+        self.print_report(report['results'])
+        if options['output']:
+            write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options['baseline']:
+            regressions = compare_to_baseline(report['results'], options['baseline'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def seed(self, options):
+        call_command('populate_test_data', stdout=self.stdout)
+        sales = User.objects.get(username='sales1')
+
+        password = make_password('testpass123')  # hash once, not per customer
+        User.objects.bulk_create([
+            User(username=f'{BENCH_PREFIX}{i}', email=f'{BENCH_PREFIX}{i}@test.com', role='customer', password=password)
+            for i in range(options['customers'])
+        ], ignore_conflicts=True)
+        customers = list(User.objects.filter(username__startswith=BENCH_PREFIX)[:options['customers']])
+
+        Availability.objects.bulk_create([
+            Availability(product=product, year=BENCH_YEAR, week_number=week, available_quantity=10 ** 9)
+            for product in Product.objects.all()
+            for week in range(1, options['weeks'] + 1)
+        ], ignore_conflicts=True)
+        availabilities = list(
+            Availability.objects.filter(year=BENCH_YEAR, week_number__lte=options['weeks']).select_related('product')
+        )
+        self.stdout.write(f'Seeded {len(customers)} customers and {len(availabilities)} availability weeks.')
+        return customers, sales, availabilities
+
+    def cleanup(self):
+        Order.objects.filter(customer__username__startswith=BENCH_PREFIX).delete()
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        Availability.objects.filter(year=BENCH_YEAR, order__isnull=True).delete()
+
+    def run(self, customers, sales, availabilities, options):
+        recorder = LatencyRecorder()
+        interfaces = ['web', 'api'] if options['interface'] == 'both' else [options['interface']]
+        rng = random.Random(options['seed'])
+        plan = [
+            (interface, rng.choice(customers), rng.choice(availabilities))
+            for interface in interfaces
+            for _ in range(options['orders'])
+        ]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = [executor.submit(self.lifecycle, recorder, sales, *step) for step in plan]
+            completed = sum(1 for future in futures if future.result())
+        wall_time = time.perf_counter() - start
+
+        return {
+            'meta': environment_metadata(
+                customers=len(customers), availability_weeks=len(availabilities), orders=options['orders'],
+                concurrency=options['concurrency'], interfaces=interfaces, seed=options['seed'],
+            ),
+            'wall_time_s': round(wall_time, 3),
+            'lifecycles_completed': completed,
+            'lifecycles_per_s': round(completed / wall_time, 2) if wall_time else 0.0,
+            'results': recorder.summarize(wall_time),
+        }
+
+    def lifecycle(self, recorder, sales, interface, customer, availability):
+        try:
+            customer_client = self.client_for(customer)
+            sales_client = self.client_for(sales)
+
+            def call(endpoint, client, method, path, data=None, expected=(200, 201, 302)):
+                timings = RequestTimings()
+                started = time.perf_counter()
+                with connection.execute_wrapper(timings.db_wrapper):
+                    response = getattr(client, method)(path, data or {})
+                failed = response.status_code not in expected
+                recorder.record(f'{interface}:{endpoint}', time.perf_counter() - started, timings.db_queries, failed)
+                if failed:
+                    raise RuntimeError(f'{endpoint} returned {response.status_code}')
+                return response
+
+            if interface == 'web':
+                response = call('request_order', customer_client, 'post', '/request_order/', {
+                    'strain': availability.product.type, 'ploidy': availability.product.ploidy,
+                    'year': availability.year, 'week_number': availability.week_number, 'quantity': 20000,
+                }, expected=(302,))
+                order_id = int(response.url.rstrip('/').rsplit('/', 1)[1])
+                call('customer_dashboard', customer_client, 'get', '/customer/')
+                call('sales_dashboard', sales_client, 'get', '/sales/')
+                call('approve_order', sales_client, 'post', f'/approve_order/{order_id}/', {
+                    'commission_rate': '5.00', 'transport_cost': '100.00',
+                    'downpayment_deadline': '2030-01-01T00:00', 'notes': '',
+                }, expected=(302,))
+                call('verify_down_payment', sales_client, 'post', f'/verify_down_payment/{order_id}/', expected=(302,))
+                call('verify_full_payment', sales_client, 'post', f'/verify_full_payment/{order_id}/', expected=(302,))
+                call('ship_order', sales_client, 'post', f'/ship_order/{order_id}/', expected=(302,))
+                call('availability_view', customer_client, 'get', f'/availability/?year={availability.year}')
+            else:
+                response = call('order_create', customer_client, 'post', '/api/orders/', {
+                    'availability_id': availability.id, 'quantity': 20000,
+                }, expected=(201,))
+                order_id = response.json()['id']
+                call('order_list', sales_client, 'get', '/api/orders/')
+                for step in ['approve', 'verify-down-payment', 'verify-full-payment', 'ship']:
+                    call(f'order_{step}', sales_client, 'post', f'/api/orders/{order_id}/{step}/', expected=(200,))
+                call('availability_list', customer_client, 'get', f'/api/availabilities/?year={availability.year}')
+            return True
+        except RuntimeError:
+            return False
+        finally:
+            connection.close()
+
+    def client_for(self, user):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        return client
+
+    def print_report(self, results):
+        header = f"{'endpoint':<32}{'reqs':>6}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint, row in results.items():
+            self.stdout.write(
+                f"{endpoint:<32}{row['requests']:>6}{row['errors']:>6}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['mean_queries']:>9}"
+            )
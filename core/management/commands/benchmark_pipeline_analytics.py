@@ -0,0 +1,102 @@
+# core/management/commands/benchmark_pipeline_analytics.py
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from core import pipeline_rollups
+from core.benchmarking import LatencyRecorder, compare_to_baseline, environment_metadata, write_report
+from core.instrumentation import RequestTimings
+from core.models import User, Availability, CustomerEvent, RollupWatermark
+
+BENCH_USERNAME = 'bench_analytics_sales'
+
+
+class Command(BaseCommand):
+    help = ('Benchmark pipeline rollups: full rebuild, incremental refresh after N new events, and the '
+            'analytics API latency. Use --scale to generate data first (disposable database only).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, help='Run generate_data with this scale first (~30k events per unit)')
+        parser.add_argument('--new-events', type=int, default=1000,
+                            help='Events replayed for the incremental refresh measurement')
+        parser.add_argument('--requests', type=int, default=200, help='API requests per year in the data')
+        parser.add_argument('--output', help='Write the JSON report to this path')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline')
+
+    def handle(self, *args, **options):
+        if options['scale']:
+            call_command('generate_data', scale=options['scale'], stdout=self.stdout)
+        events = CustomerEvent.objects.count()
+        last_event_id = CustomerEvent.objects.aggregate(last=Max('id'))['last']
+        if not last_event_id:
+            raise CommandError('No customer events; run generate_data or pass --scale.')
+
+        started = time.perf_counter()
+        buckets = pipeline_rollups.refresh(full=True)
+        full_s = time.perf_counter() - started
+        self.stdout.write(f'Full rebuild: {buckets} buckets from {events} events in {full_s:.3f}s')
+
+        # Rewind the watermark so the last N order events look new
+        replay_from = (
+            CustomerEvent.objects.filter(order__isnull=False).order_by('-id')
+            .values_list('id', flat=True)[options['new_events'] - 1:options['new_events']].first()
+        )
+        RollupWatermark.objects.filter(name=pipeline_rollups.WATERMARK).update(
+            last_event_id=(replay_from or 1) - 1
+        )
+        started = time.perf_counter()
+        incremental_buckets = pipeline_rollups.refresh()
+        incremental_s = time.perf_counter() - started
+        self.stdout.write(
+            f"Incremental refresh: {options['new_events']} order events -> {incremental_buckets} buckets "
+            f'in {incremental_s:.3f}s'
+        )
+
+        recorder, wall_time = self.benchmark_api(options['requests'])
+        report = {
+            'meta': environment_metadata(events=events, new_events=options['new_events'], requests=options['requests']),
+            'refresh': {
+                'full_s': round(full_s, 3), 'full_buckets': buckets,
+                'incremental_s': round(incremental_s, 3), 'incremental_buckets': incremental_buckets,
+            },
+            'results': recorder.summarize(wall_time),
+        }
+        for endpoint, row in report['results'].items():
+            self.stdout.write(
+                f"{endpoint}: {row['requests']} requests, p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms, "
+                f"p99 {row['p99_ms']} ms, {row['mean_queries']} queries/request, {row['errors']} errors"
+            )
+        if options['output']:
+            write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options['baseline']:
+            regressions = compare_to_baseline(report['results'], options['baseline'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def benchmark_api(self, requests):
+        years = sorted(set(Availability.objects.filter(order__isnull=False).values_list('year', flat=True)))
+        sales, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'role': 'sales'})
+        recorder = LatencyRecorder()
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                client = Client(raise_request_exception=False)
+                client.force_login(sales)
+                start = time.perf_counter()
+                for _ in range(requests):
+                    for year in years:
+                        timings = RequestTimings()
+                        started = time.perf_counter()
+                        with connection.execute_wrapper(timings.db_wrapper):
+                            response = client.get(f'/api/analytics/pipeline/?year={year}')
+                        recorder.record('api:pipeline_analytics', time.perf_counter() - started,
+                                        timings.db_queries, response.status_code != 200)
+                wall_time = time.perf_counter() - start
+        finally:
+            sales.delete()
+        return recorder, wall_time
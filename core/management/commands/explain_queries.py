@@ -0,0 +1,107 @@
+# core/management/commands/explain_queries.py
+import re
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from core.models import User, Product, Availability, Order, CustomerEvent
+
+# Scan nodes that read a whole table: PostgreSQL "Seq Scan on t", SQLite "SCAN t" (without an index)
+SEQ_SCAN_PATTERNS = [
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)'),
+]
+
+
+def query_catalog(customer, order, year, now):
+    """The app's hot querysets, as issued by the views, API, commands and reliability model."""
+    return {
+        'sales_dashboard.pending': Order.objects.filter(status='pending'),
+        'sales_dashboard.confirmed': Order.objects.filter(status='confirmed').order_by('-confirmed_at')[:10],
+        'sales_dashboard.shipped': Order.objects.filter(status='shipped')[:5],
+        'customer_dashboard.reservations': Order.objects.filter(customer=customer, status__in=['approved', 'down_paid']),
+        'customer_dashboard.confirmed': Order.objects.filter(customer=customer, status='confirmed'),
+        'customer_dashboard.shipped': Order.objects.filter(customer=customer, status='shipped'),
+        'availability_view': Availability.objects.filter(year=year).order_by('week_number'),
+        'api.order_list.customer': Order.objects.filter(customer=customer),
+        'api.user_list': User.objects.filter(role='customer'),
+        'reconcile_payments.down': Order.objects.filter(
+            status='approved', downpayment_transaction_id__gt='').order_by('pk')[:200],
+        'sweep_expired_orders.down': Order.objects.filter(status='approved', downpayment_deadline__lt=now),
+        'sweep_expired_orders.full': Order.objects.filter(status='down_paid', fullpayment_deadline__lt=now),
+        'reliability.logins': CustomerEvent.objects.filter(user=customer, event_type='LOGIN'),
+        'reliability.down_payment_event': CustomerEvent.objects.filter(
+            event_type='DOWN_PAYMENT_UPLOADED', order=order)[:1],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN (ANALYZE on PostgreSQL) over the app\'s hot querysets and flag sequential scans '
+            'on large tables. Use --scale to generate data first (disposable database only).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, help='Run generate_data with this scale before explaining')
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Only flag sequential scans on tables with at least this many rows')
+        parser.add_argument('--only', help='Comma-separated catalog names to explain')
+        parser.add_argument('--show-plans', action='store_true', help='Print the full plans')
+        parser.add_argument('--fail-on-seq-scan', action='store_true',
+                            help='Exit non-zero when any sequential scan is flagged')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if options['scale']:
+            call_command('generate_data', scale=options['scale'], stdout=self.stdout)
+        postgres = connection.vendor == 'postgresql'
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')  # fresh planner statistics after bulk loads
+
+        top_customer = (
+            Order.objects.using(using).values('customer').annotate(orders=Count('id')).order_by('-orders').first()
+        )
+        if top_customer is None:
+            raise CommandError('No orders to explain against; run generate_data or pass --scale.')
+        customer = User.objects.using(using).get(pk=top_customer['customer'])
+        order = Order.objects.using(using).filter(customer=customer).first()
+        now = timezone.now()
+        catalog = query_catalog(customer, order, now.year, now - timedelta(days=1))
+        if options['only']:
+            names = options['only'].split(',')
+            unknown = set(names) - set(catalog)
+            if unknown:
+                raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+            catalog = {name: catalog[name] for name in names}
+
+        table_rows = {
+            model._meta.db_table: model._default_manager.using(using).count()
+            for model in (User, Product, Availability, Order, CustomerEvent)
+        }
+        flagged = {}
+        for name, queryset in catalog.items():
+            plan = queryset.using(using).explain(analyze=True) if postgres else queryset.using(using).explain()
+            scans = sorted({
+                table for pattern in SEQ_SCAN_PATTERNS for table in pattern.findall(plan)
+                if table_rows.get(table, 0) >= options['min_rows']
+            })
+            execution = re.search(r'Execution Time: ([\d.]+) ms', plan)
+            timing = f'{float(execution.group(1)):>10.3f} ms' if execution else ''
+            if scans:
+                flagged[name] = scans
+                self.stdout.write(self.style.WARNING(f"{name:<36}{timing}  SEQ SCAN: {', '.join(scans)}"))
+            else:
+                self.stdout.write(f'{name:<36}{timing}  ok')
+            if options['show_plans']:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        sizes = ', '.join(f'{table}={rows}' for table, rows in table_rows.items())
+        self.stdout.write(f'Table rows: {sizes}')
+        if flagged and options['fail_on_seq_scan']:
+            raise CommandError(f'{len(flagged)} queries use sequential scans: {", ".join(flagged)}')
+        summary = f'{len(catalog) - len(flagged)}/{len(catalog)} queries avoid sequential scans on large tables.'
+        self.stdout.write(self.style.SUCCESS(summary) if not flagged else self.style.WARNING(summary))
@@ -0,0 +1,43 @@
+# core/management/commands/export_csv.py
+import sys
+
+from django.core.management.base import BaseCommand
+from core.bulk_io import export_csv
+from core.models import Availability, Order, CustomerEvent
+
+DATASETS = {
+    'orders': (Order.objects.order_by('id'), (
+        'id', 'customer__username', 'availability__product__type', 'availability__product__ploidy',
+        'availability__product__diameter', 'availability__year', 'availability__week_number', 'quantity', 'status',
+        'created_at', 'confirmed_at', 'downpayment_amount', 'fullpayment_amount', 'transport_cost',
+    )),
+    'events': (CustomerEvent.objects.order_by('id'), (
+        'id', 'user__username', 'event_type', 'timestamp', 'order_id', 'metadata',
+    )),
+    'availability': (Availability.objects.order_by('year', 'week_number', 'product_id'), (
+        'product__type', 'product__ploidy', 'product__diameter', 'year', 'week_number', 'available_quantity',
+    )),
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream a dataset to CSV (COPY TO STDOUT on PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--output', help='File to write; defaults to stdout')
+        parser.add_argument('--year', type=int, help='Only rows for this availability year')
+
+    def handle(self, *args, **options):
+        queryset, fields = DATASETS[options['dataset']]
+        if options['year']:
+            year_lookup = {
+                'orders': 'availability__year', 'events': 'timestamp__year', 'availability': 'year',
+            }[options['dataset']]
+            queryset = queryset.filter(**{year_lookup: options['year']})
+        if options['output']:
+            with open(options['output'], 'w', newline='') as out:
+                export_csv(queryset, fields, out)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['output']}"))
+        else:
+            export_csv(queryset, fields, sys.stdout)
@@ -0,0 +1,35 @@
+# core/management/commands/export_reliability_model.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from core import model_store
+from core.linear_scorer import LinearScorer
+
+
+class Command(BaseCommand):
+    help = ('Export reliability models to the pickle-free params.npz format read by core.linear_scorer. '
+            'By default, every stored version without one (and the legacy joblib pair) is exported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-version', help="Version to export ('legacy' for the joblib files in the working directory)")
+        parser.add_argument('--output', help='Write to this path instead of next to the model')
+
+    def handle(self, *args, **options):
+        if options['output'] and not options['model_version']:
+            raise CommandError('--output needs --model-version.')
+        if options['model_version']:
+            versions = [options['model_version']]
+        else:
+            versions = [meta['version'] for meta in model_store.list_versions()]
+            if all(os.path.exists(path) for path in model_store.LEGACY_PATHS):
+                versions.append(model_store.LEGACY)
+            versions = [version for version in versions if not os.path.exists(model_store.params_path(version))]
+
+        for version in versions:
+            try:
+                path = model_store.export_params(version, options['output'])
+            except FileNotFoundError as exc:
+                raise CommandError(f'{version}: {exc}')
+            scorer = LinearScorer.load(path)
+            self.stdout.write(f'{version}: {path} ({os.path.getsize(path)} bytes, features {", ".join(scorer.features)})')
+        self.stdout.write(self.style.SUCCESS(f'Exported {len(versions)} model(s).'))
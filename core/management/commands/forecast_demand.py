@@ -0,0 +1,56 @@
+# core/management/commands/forecast_demand.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import forecasting
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Train the weekly demand forecast (warming the cache used by the API and hatchery dashboard) '
+            'and print forecast totals per product for a year')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, default=timezone.now().year + 1, help='Year to forecast')
+        parser.add_argument('--compare-loop', action='store_true',
+                            help='Also time fitting one model per product, for comparison with the batched fit')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        fitted = forecasting.get_model(refresh=True)
+        batched_s = time.perf_counter() - start
+        if fitted is None:
+            raise CommandError('Not enough order history to train a demand forecast.')
+        history = fitted['history']
+        self.stdout.write(
+            f"Trained on {history['weeks']} ship weeks x {len(fitted['product_ids'])} products "
+            f"({history['from'][0]}-W{history['from'][1]} to {history['until'][0]}-W{history['until'][1]}) "
+            f'in {batched_s:.3f}s'
+        )
+
+        if options['compare_loop']:
+            periods, product_ids, Y = forecasting.demand_matrix(fitted['history']['until'])
+            years, weeks = np.array(periods).T
+            X = forecasting.period_features(years, weeks, fitted['base_year'])
+            start = time.perf_counter()
+            batched, _ = forecasting.fit_ridge(X, Y)
+            batched_fit_s = time.perf_counter() - start
+            start = time.perf_counter()
+            looped = np.vstack([forecasting.fit_ridge(X, Y[:, [column]])[0] for column in range(len(product_ids))])
+            loop_s = time.perf_counter() - start
+            self.stdout.write(
+                f'Fits alone: batched {batched_fit_s * 1000:.1f} ms, per-product loop {loop_s * 1000:.1f} ms '
+                f'(max coefficient difference {np.abs(looped - batched).max():.2e})'
+            )
+
+        year = options['year']
+        _, point, low, high = forecasting.forecast_weeks(year, fitted)
+        products = Product.objects.in_bulk(fitted['product_ids'])
+        for column, product_id in enumerate(fitted['product_ids']):
+            self.stdout.write(
+                f"{str(products[product_id]):<28}{point[:, column].sum():>14,} "
+                f"({low[:, column].sum():,} - {high[:, column].sum():,})"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Forecast {year}: {int(point.sum()):,} units in total.'))
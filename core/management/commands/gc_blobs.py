@@ -0,0 +1,138 @@
+# core/management/commands/gc_blobs.py
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.models import Order, StoredBlob
+from core.storage import BLOB_PREFIX, blob_digest, blob_fields, document_storage
+
+
+class Command(BaseCommand):
+    help = ('Garbage-collect the content-addressed document store: recount references from the orders, delete '
+            'blobs unreferenced for longer than --grace-hours, and optionally move documents saved before the '
+            'store existed into it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Only delete blobs (and stray files) unreferenced for at least this long')
+        parser.add_argument('--adopt', action='store_true',
+                            help='Store legacy order documents (e.g. payment_proofs/<name>) by content, rewrite the '
+                                 'order fields and delete the old files')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        self.storage = document_storage()
+        self.fields = blob_fields(Order)
+        self.dry_run = options['dry_run']
+        if options['adopt']:
+            self.adopt()
+        references = self.recount()
+        deleted, freed = self.collect(references, timezone.now() - timedelta(hours=options['grace_hours']))
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(references)} blob(s) referenced. {verb} {deleted} unreferenced file(s), {freed / 2 ** 20:.1f} MB.'
+        ))
+
+    def referenced(self, name):
+        query = Q()
+        for field in self.fields:
+            query |= Q(**{field.name: name})
+        return Order.objects.filter(query).exists()
+
+    def adopt(self):
+        adopted, old_names = 0, set()
+        for order in Order.objects.only('id', *[field.name for field in self.fields]).iterator():
+            changed = []
+            for field in self.fields:
+                fieldfile = getattr(order, field.attname)
+                if not fieldfile.name or blob_digest(fieldfile.name) or not self.storage.exists(fieldfile.name):
+                    continue
+                old_names.add(fieldfile.name)
+                if not self.dry_run:
+                    with self.storage.open(fieldfile.name, 'rb') as fh:
+                        fieldfile.name = self.storage.save(fieldfile.name, File(fh))
+                changed.append(field.attname)
+            if changed and not self.dry_run:
+                order.save(update_fields=changed)
+            adopted += len(changed)
+        if not self.dry_run:
+            # Every reference was rewritten above
+            for name in old_names:
+                os.remove(self.storage.path(name))
+        self.stdout.write(f'Adopted {adopted} legacy document reference(s) from {len(old_names)} file(s).')
+
+    def recount(self):
+        """Set every StoredBlob's count to the references the orders hold (repairs bulk writes and rollbacks)."""
+        references = Counter()
+        for field in self.fields:
+            references.update(
+                Order.objects.filter(**{f'{field.name}__startswith': BLOB_PREFIX}).values_list(field.name, flat=True)
+            )
+        if self.dry_run:
+            return references
+        rows = {blob.name: blob for blob in StoredBlob.objects.all()}
+        fixed = 0
+        for name, count in references.items():
+            row = rows.get(name)
+            if row is None and self.storage.exists(name):
+                StoredBlob.objects.create(name=name, size=self.storage.size(name), refcount=count)
+                fixed += 1
+            elif row is not None and row.refcount != count:
+                StoredBlob.objects.filter(pk=row.pk).update(refcount=count, updated_at=timezone.now())
+                fixed += 1
+        for name, row in rows.items():
+            if name not in references and row.refcount:
+                StoredBlob.objects.filter(pk=row.pk).update(refcount=0, updated_at=timezone.now())
+                fixed += 1
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'Corrected the reference count of {fixed} blob(s).'))
+        return references
+
+    def collect(self, references, cutoff):
+        deleted, freed = 0, 0
+        # Released blobs: re-checked under lock, a save may have referenced them again meanwhile
+        for row in StoredBlob.objects.filter(refcount=0, updated_at__lt=cutoff).exclude(name__in=list(references)):
+            with transaction.atomic():
+                locked = StoredBlob.objects.select_for_update().filter(pk=row.pk, refcount=0).first()
+                if locked is None or self.referenced(row.name):
+                    continue
+                size = self.remove(row.name, cutoff)
+                if size is None:
+                    continue
+                if not self.dry_run:
+                    locked.delete()
+                freed += size
+                deleted += 1
+
+        # Files without a row: saves whose transaction rolled back, and leftovers in blobs/tmp
+        known = set(StoredBlob.objects.values_list('name', flat=True)) | set(references)
+        root = self.storage.path(BLOB_PREFIX)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(directory, filename), self.storage.location).replace(os.sep, '/')
+                if name not in known and not self.referenced(name):
+                    size = self.remove(name, cutoff)
+                    if size is not None:
+                        freed += size
+                        deleted += 1
+        return deleted, freed
+
+    def remove(self, name, cutoff):
+        """Delete a blob file unless it was written or reused after cutoff; returns its size, or None if kept."""
+        path = self.storage.path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_mtime >= cutoff.timestamp():
+            return None
+        if self.dry_run:
+            self.stdout.write(f'Would delete {name}')
+        else:
+            os.remove(path)
+        return stat.st_size
@@ -0,0 +1,236 @@
+# core/management/commands/generate_data.py
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.bulk_io import chunked, explicit_timestamps, ingest_events
+from core.dashboard_cache import bump_all
+from core.models import User, Product, Availability, Order
+from core.storage import acquire, document_storage
+
+# Per unit of --scale
+CUSTOMERS_PER_SCALE = 200
+ORDERS_PER_SCALE = 2000
+LOGINS_PER_CUSTOMER = 40
+
+# Status mix for orders whose ship week is already in the past / still ahead
+PAST_STATUS_WEIGHTS = {'shipped': 0.72, 'cancelled': 0.2, 'confirmed': 0.08}
+FUTURE_STATUS_WEIGHTS = {'pending': 0.2, 'approved': 0.2, 'down_paid': 0.25, 'confirmed': 0.2, 'cancelled': 0.15}
+# Statuses holding stock: confirm_downpayment reserves it and only cancelling a down_paid order releases it
+RESERVING_STATUSES = ('down_paid', 'confirmed', 'shipped')
+
+# Lifecycle events emitted for an order that reached each status
+LIFECYCLE_EVENTS = {
+    'pending': ['ORDER_CREATED'],
+    'approved': ['ORDER_CREATED', 'ORDER_APPROVED'],
+    'down_paid': ['ORDER_CREATED', 'ORDER_APPROVED', 'DOWN_PAYMENT_UPLOADED', 'DOWN_PAYMENT_VERIFIED'],
+    'confirmed': ['ORDER_CREATED', 'ORDER_APPROVED', 'DOWN_PAYMENT_UPLOADED', 'DOWN_PAYMENT_VERIFIED',
+                  'FULL_PAYMENT_UPLOADED', 'FULL_PAYMENT_VERIFIED'],
+    'shipped': ['ORDER_CREATED', 'ORDER_APPROVED', 'DOWN_PAYMENT_UPLOADED', 'DOWN_PAYMENT_VERIFIED',
+                'FULL_PAYMENT_UPLOADED', 'FULL_PAYMENT_VERIFIED', 'ORDER_SHIPPED'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Generate realistic synthetic customers, availability, orders and events for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'1.0 = {CUSTOMERS_PER_SCALE} customers, {ORDERS_PER_SCALE} orders, ~30k events')
+        parser.add_argument('--start-year', type=int, default=timezone.now().year - 3)
+        parser.add_argument('--end-year', type=int, default=timezone.now().year + 1)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--prefix', default='gen_customer_', help='Username prefix for generated customers')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.proof = None
+        self.proof_references = 0
+        scale = options['scale']
+
+        products = self.ensure_catalog()
+        availabilities = self.generate_availability(products, options['start_year'], options['end_year'])
+        customers = self.generate_customers(max(1, int(CUSTOMERS_PER_SCALE * scale)), options['prefix'])
+        with explicit_timestamps(Order._meta.get_field('created_at')):
+            order_count, event_count = self.generate_orders(max(1, int(ORDERS_PER_SCALE * scale)), customers, availabilities)
+            event_count += self.generate_sessions(customers, options['start_year'])
+        # Bulk inserts send no signals, so the placeholder proof's references are counted and cached dashboards
+        # invalidated here
+        acquire(self.proof, self.proof_references)
+        bump_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(customers)} customers, {len(availabilities)} availability weeks, '
+            f'{order_count} orders and {event_count} events.'
+        ))
+
+    def ensure_catalog(self):
+        prices = {'steelhead': Decimal('0.10'), 'jumper': Decimal('0.18'), 'kamloop': Decimal('0.20')}
+        existing = set(Product.objects.values_list('type', 'ploidy', 'diameter'))
+        Product.objects.bulk_create([
+            Product(type=type_, ploidy=ploidy, diameter=diameter,
+                    price=prices[type_] + Decimal('0.02') * (ploidy == 'triploid') + Decimal('0.01') * (diameter - 4))
+            for type_, _ in Product.TYPE_CHOICES
+            for ploidy, _ in Product.PLOIDY_CHOICES
+            for diameter, _ in Product.DIAMETER_CHOICES
+            if (type_, ploidy, diameter) not in existing
+        ])
+        return list(Product.objects.all())
+
+    def seasonal_factor(self, week):
+        # Egg production peaks in late autumn/winter and bottoms out in summer
+        return 0.55 + 0.45 * math.cos(2 * math.pi * (week - 48) / 52)
+
+    def generate_availability(self, products, start_year, end_year):
+        rows = (
+            Availability(
+                product=product, year=year, week_number=week,
+                available_quantity=int(self.rng.gauss(1_000_000, 150_000) * self.seasonal_factor(week)) // 1000 * 1000,
+            )
+            for product in products
+            for year in range(start_year, end_year + 1)
+            for week in range(1, 53)
+        )
+        for chunk in chunked(rows, self.chunk_size):
+            Availability.objects.bulk_create(chunk, ignore_conflicts=True)
+        return list(
+            Availability.objects.filter(year__gte=start_year, year__lte=end_year).select_related('product')
+        )
+
+    def generate_customers(self, count, prefix):
+        password = make_password('testpass123')  # hash once, not per customer
+        rows = (
+            User(
+                username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', role='customer', password=password,
+                company=f'Hatchery {i}', reliability_score=round(min(1.0, self.rng.betavariate(5, 2) + 0.1), 3),
+            )
+            for i in range(count)
+        )
+        for chunk in chunked(rows, self.chunk_size):
+            User.objects.bulk_create(chunk, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=prefix, role='customer').only('id', 'reliability_score'))
+
+    def ship_datetime(self, availability):
+        ship_date = availability.expected_ship_date
+        return timezone.make_aware(datetime.combine(ship_date, time(8)))
+
+    def generate_orders(self, count, customers, availabilities):
+        # Heavy-tailed order volume per customer and seasonal demand per week
+        customer_weights = [self.rng.paretovariate(1.5) for _ in customers]
+        availability_weights = [self.seasonal_factor(a.week_number) ** 2 for a in availabilities]
+        order_count = event_count = 0
+        for chunk_start in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - chunk_start)
+            orders = [
+                self.build_order(customer, availability)
+                for customer, availability in zip(
+                    self.rng.choices(customers, customer_weights, k=size),
+                    self.rng.choices(availabilities, availability_weights, k=size),
+                )
+            ]
+            Order.objects.bulk_create(orders)
+            # Stock reserved by the generated down payments, written once per chunk
+            Availability.objects.bulk_update(
+                {order.availability_id: order.availability for order in orders if order.status in RESERVING_STATUSES}
+                .values(),
+                ['available_quantity'],
+            )
+            order_count += len(orders)
+            # Events go through COPY on PostgreSQL (chunked bulk_create elsewhere)
+            event_count += ingest_events(self.lifecycle_events(orders))
+        return order_count, event_count
+
+    def build_order(self, customer, availability):
+        ship_at = self.ship_datetime(availability)
+        weights = PAST_STATUS_WEIGHTS if ship_at < self.now else FUTURE_STATUS_WEIGHTS
+        status = self.rng.choices(list(weights), list(weights.values()))[0]
+        created_at = min(ship_at - timedelta(days=self.rng.randint(30, 180)), self.now - timedelta(days=1))
+        quantity = max(Product.MIN_ORDER_QUANTITY, int(self.rng.lognormvariate(10.6, 0.5)) // 5000 * 5000)
+        reached = self.rng.choice(['approved', 'down_paid']) if status == 'cancelled' else status
+        if status in RESERVING_STATUSES:
+            if availability.available_quantity < quantity:
+                # Sold out: like confirm_downpayment, refuse the down payment and let the order lapse
+                status, reached = 'cancelled', 'approved'
+            else:
+                availability.available_quantity -= quantity
+        order = Order(
+            customer=customer, availability=availability, quantity=quantity, status=status, created_at=created_at,
+            transport_cost=Decimal(self.rng.choice([100, 150, 250, 400])),
+            commission_rate=Decimal(self.rng.choice([0, 2.5, 5])),
+        )
+        # bulk_create skips save(), so take the shipment snapshot here
+        order.snapshot_shipment()
+        # Reliable customers pay on time more often
+        order._on_time = self.rng.random() < customer.reliability_score
+        order._reached = reached
+        if order._reached != 'pending':
+            approved_at = created_at + timedelta(days=self.rng.randint(0, 3))
+            order._approved_at = approved_at
+            order.downpayment_amount = order.calculate_downpayment()
+            order.downpayment_deadline = approved_at + timedelta(days=3)
+            order.downpayment_transaction_id = f'DP-GEN-{self.rng.getrandbits(48):x}'
+            order.snapshot_totals()
+        if order._reached in ('down_paid', 'confirmed', 'shipped'):
+            order.downpayment_proof = self.placeholder_proof()
+            order.fullpayment_amount = order.balance
+            order.fullpayment_deadline = ship_at - timedelta(days=14)
+            order.fullpayment_transaction_id = f'FP-GEN-{self.rng.getrandbits(48):x}'
+        if order._reached in ('confirmed', 'shipped'):
+            order.fullpayment_proof = self.placeholder_proof()
+            order.confirmed_at = min(order.fullpayment_deadline + timedelta(days=self.rng.randint(-10, 2)), self.now)
+        return order
+
+    def placeholder_proof(self):
+        """One stored PDF that every generated proof points at, so "View Proof" links work."""
+        from reportlab.pdfgen import canvas
+
+        if self.proof is None:
+            buffer = BytesIO()
+            # invariant: the same bytes, and so the same blob, on every run
+            pdf = canvas.Canvas(buffer, invariant=True)
+            pdf.drawString(72, 720, 'Generated payment proof (synthetic data)')
+            pdf.save()
+            self.proof = document_storage().save('payment_proofs/generated.pdf', ContentFile(buffer.getvalue()))
+        self.proof_references += 1
+        return self.proof
+
+    def lifecycle_events(self, orders):
+        for order in orders:
+            event_types = list(LIFECYCLE_EVENTS[order._reached])
+            if order.status == 'cancelled':
+                event_types.append('ORDER_CANCELLED')
+            timestamp = order.created_at
+            for event_type in event_types:
+                if event_type == 'ORDER_APPROVED':
+                    timestamp = order._approved_at
+                elif event_type == 'DOWN_PAYMENT_UPLOADED':
+                    offset = self.rng.uniform(0.1, 2.9) if order._on_time else self.rng.uniform(3.1, 8)
+                    timestamp = order._approved_at + timedelta(days=offset)
+                elif event_type == 'ORDER_SHIPPED':
+                    timestamp = self.ship_datetime(order.availability)
+                else:
+                    timestamp = timestamp + timedelta(hours=self.rng.uniform(1, 48))
+                yield order.customer_id, event_type, min(timestamp, self.now), order.id, {'generated': True}
+
+    def generate_sessions(self, customers, start_year):
+        span_seconds = int((self.now - timezone.make_aware(datetime(start_year, 1, 1))).total_seconds())
+
+        def events():
+            for customer in customers:
+                for _ in range(self.rng.randint(LOGINS_PER_CUSTOMER // 2, LOGINS_PER_CUSTOMER * 3 // 2)):
+                    login_at = self.now - timedelta(seconds=self.rng.randrange(span_seconds))
+                    ip_address = f'10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}'
+                    logout_at = min(login_at + timedelta(minutes=self.rng.randint(2, 90)), self.now)
+                    yield customer.id, 'LOGIN', login_at, None, {'ip_address': ip_address}
+                    yield customer.id, 'LOGOUT', logout_at, None, {'ip_address': ip_address}
+
+        return ingest_events(events())
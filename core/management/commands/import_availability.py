@@ -0,0 +1,38 @@
+# core/management/commands/import_availability.py
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from core.bulk_io import import_availability
+from core.dashboard_cache import bump
+from core.models import Product
+from core.week_calendar import is_valid_week, weeks_in_year
+
+
+class Command(BaseCommand):
+    help = ('Upsert availability from a CSV with columns product__type, product__ploidy, product__diameter, '
+            'year, week_number, available_quantity (the format written by "export_csv availability")')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        products = {
+            (product.type, product.ploidy, int(product.diameter)): product.id
+            for product in Product.objects.all()
+        }
+
+        def rows(reader):
+            for line, record in enumerate(reader, start=2):
+                key = (record['product__type'], record['product__ploidy'], int(record['product__diameter']))
+                if key not in products:
+                    raise CommandError(f'Line {line}: unknown product {key}')
+                year, week_number = int(record['year']), int(record['week_number'])
+                if not is_valid_week(year, week_number):
+                    raise CommandError(f'Line {line}: {year} has only {weeks_in_year(year)} ISO weeks, not week {week_number}')
+                yield products[key], year, week_number, int(record['available_quantity'])
+
+        with open(options['path'], newline='') as fh:
+            count = import_availability(rows(csv.DictReader(fh)))
+        # The upsert bypasses model signals
+        bump('availability')
+        self.stdout.write(self.style.SUCCESS(f'Imported {count} availability rows.'))
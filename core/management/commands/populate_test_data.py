@@ -24,11 +24,8 @@ class Command(BaseCommand):
         )
 
         availability, _ = Availability.objects.get_or_create(
-            product=product, week_number=30,
-            defaults={
-                'available_quantity': 50000,
-                'expected_ship_date': '2025-07-30'
-            }
+            product=product, year=2025, week_number=30,
+            defaults={'available_quantity': 50000}
         )
 
         customer1 = User.objects.get(username='customer1')
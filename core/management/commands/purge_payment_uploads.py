@@ -0,0 +1,17 @@
+# core/management/commands/purge_payment_uploads.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.payment_uploads import purge_stale
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked payment proof uploads that were never completed, and their part files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help='Age after which an unfinished upload is abandoned')
+
+    def handle(self, *args, **options):
+        purged = purge_stale(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} abandoned upload(s).'))
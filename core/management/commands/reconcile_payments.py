@@ -0,0 +1,163 @@
+# core/management/commands/reconcile_payments.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Order, Availability, CustomerEvent
+from core.payment import PaymentAdapter
+from core.online_scoring import record_events
+from core.live_updates import publish_availability, publish_customer_events, publish_orders
+from core.metrics import count_customer_events
+from core.storage import acquire
+from core.views import generate_invoice, send_fullpayment_request_email, send_order_confirmation_email
+
+
+class Command(BaseCommand):
+    help = 'Verify pending down and full payments in batches and advance the matching orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Orders verified and advanced per batch')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent verification calls against the payment adapter')
+        parser.add_argument('--dry-run', action='store_true', help='Only report which orders would be advanced')
+
+    def handle(self, *args, **options):
+        self.payment_adapter = PaymentAdapter()
+        self.workers = options['workers']
+        self.dry_run = options['dry_run']
+
+        # Transaction ids are assigned when the payment is requested; only orders whose customer has uploaded a proof
+        # are waiting for verification, as in the manual sales flow
+        pending_down = Order.objects.filter(
+            status='approved', downpayment_transaction_id__gt='', downpayment_proof__gt='',
+        )
+        pending_full = Order.objects.filter(
+            status='down_paid', fullpayment_transaction_id__gt='', fullpayment_proof__gt='',
+        )
+
+        down_count = self.reconcile(pending_down, 'downpayment_transaction_id', self.confirm_down_payments, options['batch_size'])
+        full_count = self.reconcile(pending_full, 'fullpayment_transaction_id', self.confirm_full_payments, options['batch_size'])
+
+        prefix = 'Would advance' if self.dry_run else 'Advanced'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {down_count} down payment(s) and {full_count} full payment(s).'
+        ))
+
+    def batches(self, queryset, batch_size):
+        # Keyset pagination so orders that fail verification are not revisited
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk)
+                .select_related('customer', 'availability__product')
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+
+    def reconcile(self, queryset, transaction_field, confirm, batch_size):
+        advanced = 0
+        for batch in self.batches(queryset, batch_size):
+            results = self.payment_adapter.verify_payments(
+                [getattr(order, transaction_field) for order in batch],
+                max_workers=self.workers,
+            )
+            verified = []
+            for order in batch:
+                if results.get(getattr(order, transaction_field)):
+                    verified.append(order)
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        f'Order #{order.id}: verification failed for {getattr(order, transaction_field)}'
+                    ))
+            if not verified:
+                continue
+            if self.dry_run:
+                advanced += len(verified)
+                continue
+            advanced += confirm(verified)
+        return advanced
+
+    def lock_still_pending(self, orders, status):
+        """Re-read the batch under lock and drop orders someone advanced meanwhile."""
+        locked_ids = set(
+            Order.objects.select_for_update()
+            .filter(pk__in=[order.pk for order in orders], status=status)
+            .values_list('pk', flat=True)
+        )
+        return [order for order in orders if order.pk in locked_ids]
+
+    def confirm_down_payments(self, orders):
+        with transaction.atomic():
+            orders = self.lock_still_pending(orders, 'approved')
+            availabilities = Availability.objects.select_for_update().in_bulk(
+                {order.availability_id for order in orders}
+            )
+            confirmed = []
+            for order in orders:
+                availability = availabilities[order.availability_id]
+                if availability.available_quantity < order.quantity:
+                    self.stdout.write(self.style.WARNING(f'Order #{order.id}: insufficient available quantity'))
+                    continue
+                availability.available_quantity -= order.quantity
+                order.confirm_downpayment(reserve_stock=False)
+                payment_result = self.payment_adapter.request_full_payment(order)
+                if payment_result['success']:
+                    order.fullpayment_transaction_id = payment_result['transaction_id']
+                    order.fullpayment_amount = order.balance
+                else:
+                    self.stdout.write(self.style.WARNING(f'Order #{order.id}: full payment initiation failed'))
+                confirmed.append(order)
+
+            Availability.objects.bulk_update(availabilities.values(), ['available_quantity'])
+            Order.objects.bulk_update(
+                confirmed,
+                ['status', 'fullpayment_deadline', 'fullpayment_transaction_id', 'fullpayment_amount'],
+            )
+            events = CustomerEvent.objects.bulk_create([
+                CustomerEvent(
+                    user=order.customer,
+                    event_type='DOWN_PAYMENT_VERIFIED',
+                    order=order,
+                    metadata={'transaction_id': order.downpayment_transaction_id, 'source': 'reconciliation'}
+                ) for order in confirmed
+            ])
+            # bulk_create skips post_save, so feed the online reliability features, metrics and live updates directly
+            record_events(events)
+            count_customer_events(events)
+            publish_orders(confirmed, 'approved')
+            publish_availability(availabilities)
+            publish_customer_events(events)
+
+        # Invoices and emails only for orders that have a full payment request
+        requested = [order for order in confirmed if order.fullpayment_transaction_id]
+        for order in requested:
+            order.invoice.save(f"invoice_{order.id}.pdf", generate_invoice(order), save=False)
+        Order.objects.bulk_update(requested, ['invoice'])
+        # bulk_update sends no post_save, so count the new invoice references here
+        for order in requested:
+            acquire(order.invoice.name)
+        for order in requested:
+            send_fullpayment_request_email(order)
+        return len(confirmed)
+
+    def confirm_full_payments(self, orders):
+        with transaction.atomic():
+            orders = self.lock_still_pending(orders, 'down_paid')
+            for order in orders:
+                order.confirm_full_payment()
+            Order.objects.bulk_update(orders, ['status', 'confirmed_at'])
+            events = CustomerEvent.objects.bulk_create([
+                CustomerEvent(
+                    user=order.customer,
+                    event_type='FULL_PAYMENT_VERIFIED',
+                    order=order,
+                    metadata={'transaction_id': order.fullpayment_transaction_id, 'source': 'reconciliation'}
+                ) for order in orders
+            ])
+            count_customer_events(events)
+            publish_orders(orders, 'down_paid')
+            publish_customer_events(events)
+
+        for order in orders:
+            send_order_confirmation_email(order)
+        return len(orders)
@@ -0,0 +1,19 @@
+# core/management/commands/refresh_pipeline_rollups.py
+import time
+
+from django.core.management.base import BaseCommand
+from core import pipeline_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refresh the sales pipeline rollup tables from orders and customer events changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every bucket instead of only changed ones')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rebuilt = pipeline_rollups.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} week buckets in {time.perf_counter() - start:.2f}s.'
+        ))
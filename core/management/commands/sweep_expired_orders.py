@@ -0,0 +1,103 @@
+# core/management/commands/sweep_expired_orders.py
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from core.models import Order, Availability, CustomerEvent
+from core.live_updates import publish_availability, publish_customer_events, publish_orders
+from core.metrics import count_customer_events
+from core.online_scoring import record_events
+
+
+class Command(BaseCommand):
+    help = 'Cancel orders whose down-payment or full-payment deadline has passed and release their stock'
+
+    # status -> deadline field enforced for orders in that status
+    DEADLINES = {
+        'approved': 'downpayment_deadline',
+        'down_paid': 'fullpayment_deadline',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders cancelled per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report which orders would be cancelled')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cancelled = 0
+        released = 0
+        for status, deadline_field in self.DEADLINES.items():
+            # Served by the (status, deadline) indexes on Order
+            expired = Order.objects.filter(status=status, **{f'{deadline_field}__lt': now}).select_related('customer')
+            for batch in self.batches(expired, options['batch_size']):
+                if options['dry_run']:
+                    for order in batch:
+                        self.stdout.write(f'Would cancel order #{order.id} ({status}, {deadline_field} {getattr(order, deadline_field):%Y-%m-%d %H:%M})')
+                    cancelled += len(batch)
+                    if status == 'down_paid':
+                        released += sum(order.quantity for order in batch)
+                    continue
+                batch_cancelled, batch_released = self.cancel_batch(batch, status, deadline_field, now)
+                cancelled += batch_cancelled
+                released += batch_released
+
+        if options['dry_run']:
+            summary = f'Would cancel {cancelled} expired order(s) and release {released} eggs.'
+        else:
+            summary = f'Cancelled {cancelled} expired order(s); released {released} eggs back to availability.'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def batches(self, queryset, batch_size):
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+
+    def cancel_batch(self, orders, status, deadline_field, now):
+        with transaction.atomic():
+            # Re-check under lock: the customer may have paid since the batch was read
+            locked_ids = set(
+                Order.objects.select_for_update()
+                .filter(pk__in=[order.pk for order in orders], status=status, **{f'{deadline_field}__lt': now})
+                .values_list('pk', flat=True)
+            )
+            orders = [order for order in orders if order.pk in locked_ids]
+
+            release = defaultdict(int)
+            for order in orders:
+                if status == 'down_paid':
+                    release[order.availability_id] += order.quantity
+                order.cancel(release_stock=False)
+            Order.objects.bulk_update(orders, ['status'])
+
+            # One aggregated update per availability row instead of one per order
+            for availability_id, quantity in release.items():
+                Availability.objects.filter(pk=availability_id).update(
+                    available_quantity=F('available_quantity') + quantity
+                )
+
+            events = CustomerEvent.objects.bulk_create([
+                CustomerEvent(
+                    user_id=order.customer_id,
+                    event_type='ORDER_CANCELLED',
+                    order=order,
+                    metadata={
+                        'reason': f'{deadline_field}_expired',
+                        'deadline': getattr(order, deadline_field).isoformat(),
+                        'released_quantity': order.quantity if status == 'down_paid' else 0,
+                    }
+                ) for order in orders
+            ])
+            # Bulk writes send no post_save, so feed the online reliability features, count the events and
+            # publish the dashboard updates here
+            record_events(events)
+            count_customer_events(events)
+            publish_orders(orders, status)
+            publish_availability(release)
+            publish_customer_events(events)
+        return len(orders), sum(release.values())
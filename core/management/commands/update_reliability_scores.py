@@ -1,29 +1,132 @@
 # core/management/commands/update_reliability_scores.py
-from django.core.management.base import BaseCommand
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from core import model_store
 from core.ml_model import ReliabilityModel
+from core.models import CustomerFeatures
+from core.online_scoring import rebuild_features
 
 class Command(BaseCommand):
-    help = 'Update reliability scores for all customers using ML model'
+    help = ('Retrain the reliability model on all customers, rebuild their online scoring features from history '
+            'and rescore everyone. Run periodically; events keep scores current in between. The new version goes '
+            'to the candidate slot and is scored in shadow next to production in the same batch; it is only '
+            'promoted with --promote, or with --auto-promote when the comparison stays within the thresholds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shadow', action='store_true',
+                            help='Train a candidate version and score it in shadow (the default)')
+        parser.add_argument('--candidate', help='Shadow-score an existing version instead of training')
+        parser.add_argument('--promote', help='Promote an existing version (no training) and rescore with it')
+        parser.add_argument('--auto-promote', action='store_true',
+                            help='Promote the candidate when its scores stay within --max-mean-diff and '
+                                 '--min-correlation of production')
+        parser.add_argument('--max-mean-diff', type=float, default=0.05,
+                            help='Largest mean |score difference| --auto-promote accepts (default 0.05)')
+        parser.add_argument('--min-correlation', type=float, default=0.9,
+                            help='Smallest score correlation with production --auto-promote accepts (default 0.9)')
+        parser.add_argument('--list', action='store_true', help='List stored model versions and exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self.list_versions()
+        if sum(bool(options[name]) for name in ('shadow', 'candidate', 'promote')) > 1:
+            raise CommandError('Use only one of --shadow, --candidate and --promote.')
+        if options['promote'] and options['auto_promote']:
+            raise CommandError('--auto-promote applies to candidates; --promote promotes unconditionally.')
 
-    def handle(self, *args, **kwargs):
         User = get_user_model()
-        customers = User.objects.filter(role='customer')
-        model = ReliabilityModel()
-
-        # Train model on all customers
-        if customers.exists():
-            model.train(customers)
-            self.stdout.write(self.style.SUCCESS('Model trained successfully.'))
-
-        # Update scores
-        for customer in customers:
-            old_score = customer.reliability_score
-            new_score = model.predict(customer)
-            customer.reliability_score = new_score
-            customer.save()
+        customers = list(User.objects.filter(role='customer').order_by('pk'))
+        if not customers:
+            self.stdout.write('No customers to score.')
+            return
+
+        # Rebuilding the incrementally maintained features also picks up order changes made without an event
+        features = rebuild_features([customer.id for customer in customers])
+        X = np.array([features[customer.id].as_vector() for customer in customers], dtype=float)
+        y = [customer.reliability_score for customer in customers]  # Use current score as target (supervised)
+
+        previous = model_store.production_version()
+        if options['promote'] or options['candidate']:
+            version = options['promote'] or options['candidate']
+            if version not in {meta['version'] for meta in model_store.list_versions()}:
+                raise CommandError(f'Unknown model version: {version}')
+        else:
+            version = ReliabilityModel().fit(X, y)
+            self.stdout.write(self.style.SUCCESS(f'Model trained successfully: version {version}.'))
+
+        if options['promote'] or previous is None and not options['candidate']:
+            # Nothing to compare the first trained version against, and without a production model nobody is scored
+            model_store.promote(version)
+            production, shadow = version, previous
+            self.stdout.write(self.style.SUCCESS(f'Promoted {version}.'))
+        elif previous is None:
+            raise CommandError('No production model to compare against; promote a version first.')
+        else:
+            model_store.set_candidate(version)
+            production, shadow = previous, version
+            self.stdout.write(f'Stored {version} as the candidate; production stays {production}.')
+
+        # Production and shadow scores for every customer from one matrix product
+        shadowed = shadow is not None and shadow != production
+        scores = model_store.score_matrix(X, [production, shadow] if shadowed else [production])
+        production_scores = scores[:, 0]
+        if shadowed:
+            comparison = self.compare(scores[:, 0], scores[:, 1], production, shadow)
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'Updated {customer.username}: {old_score:.2f} -> {new_score:.2f}'
-                )
-            )
\ No newline at end of file
+                f"Shadow {shadow} vs production {production}: mean |diff| {comparison['mean_abs_diff']}, "
+                f"max |diff| {comparison['max_abs_diff']}, correlation {comparison['correlation']}, "
+                f"{comparison['moved_over_0_1']} customers differ by more than 0.1"
+            )
+            if options['auto_promote'] and shadow == version:
+                comparison['promoted'] = self.within_thresholds(comparison, options)
+                if comparison['promoted']:
+                    model_store.promote(version)
+                    production, production_scores = version, scores[:, 1]
+                    self.stdout.write(self.style.SUCCESS(f'Promoted {version}: within the comparison thresholds.'))
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        f'Kept {version} as the candidate: outside the comparison thresholds.'
+                    ))
+            # Kept on the newly trained or promoted version, one entry per comparison run
+            model_store.update_metadata(
+                version, comparisons=model_store.metadata(version).get('comparisons', []) + [comparison]
+            )
+
+        for customer, score in zip(customers, production_scores):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'Updated {customer.username}: {customer.reliability_score:.2f} -> {score:.2f}')
+            customer.reliability_score = float(score)
+        User.objects.bulk_update(customers, ['reliability_score'], batch_size=1000)
+        CustomerFeatures.objects.filter(pk__in=[customer.id for customer in customers]).update(scored_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(customers)} customers with model {production}.'))
+
+    def within_thresholds(self, comparison, options):
+        # A constant score column has no correlation; the mean difference alone decides then
+        correlation = comparison['correlation']
+        return (comparison['mean_abs_diff'] <= options['max_mean_diff']
+                and (correlation is None or correlation >= options['min_correlation']))
+
+    def compare(self, production_scores, shadow_scores, production, shadow):
+        diff = np.abs(shadow_scores - production_scores)
+        varies = production_scores.std() > 0 and shadow_scores.std() > 0
+        return {
+            'production': production,
+            'shadow': shadow,
+            'compared_at': timezone.now().isoformat(),
+            'customers': len(diff),
+            'mean_abs_diff': round(float(diff.mean()), 6),
+            'max_abs_diff': round(float(diff.max()), 6),
+            'correlation': round(float(np.corrcoef(production_scores, shadow_scores)[0, 1]), 6) if varies else None,
+            'moved_over_0_1': int((diff > 0.1).sum()),
+            'mean_production': round(float(production_scores.mean()), 6),
+            'mean_shadow': round(float(shadow_scores.mean()), 6),
+        }
+
+    def list_versions(self):
+        current, candidate = model_store.current_version(), model_store.candidate_version()
+        for meta in model_store.list_versions():
+            marker = ' (current)' if meta['version'] == current else ' (candidate)' if meta['version'] == candidate else ''
+            metrics = ', '.join(f'{name}={value}' for name, value in meta['metrics'].items())
+            self.stdout.write(f"{meta['version']}{marker}  trained {meta['trained_at']}  {metrics}")
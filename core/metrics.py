@@ -0,0 +1,219 @@
+# core/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as EventCounts
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django_fsm.signals import pre_transition, post_transition
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts + the +Inf bucket, sum, count
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            labels = _format_labels(self.labelnames + ('le',), key + (le,))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {total}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'troutlodge_http_request_duration_seconds', 'Request latency by resolved view.', ['view', 'method']))
+ORDER_TRANSITIONS = registry.register(Counter(
+    'troutlodge_order_transitions_total', 'Order status transitions.', ['transition', 'source', 'target']))
+ORDER_TRANSITION_DURATION = registry.register(Histogram(
+    'troutlodge_order_transition_duration_seconds', 'Time spent inside an Order FSM transition.', ['transition']))
+OPERATION_DURATION = registry.register(Histogram(
+    'troutlodge_operation_duration_seconds',
+    'Duration of instrumented operations (invoice_render, email_send, payment_call, model_load, reliability_scoring).',
+    ['operation']))
+OPERATIONS_IN_PROGRESS = registry.register(Gauge(
+    'troutlodge_operations_in_progress', 'Instrumented operations currently running, e.g. queued email sends.',
+    ['operation']))
+CUSTOMER_EVENTS = registry.register(Counter(
+    'troutlodge_customer_events_total', 'CustomerEvent rows inserted.', ['event_type']))
+
+
+class MetricsMiddleware:
+    """Observes per-view request latency into REQUEST_DURATION. Runs natively under WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, start)
+        return response
+
+    def observe(self, request, start):
+        match = request.resolver_match
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            view=match.view_name if match else 'unresolved',
+            method=request.method,
+        )
+
+
+@receiver(pre_transition)
+def _transition_started(sender, instance, name, **kwargs):
+    if sender._meta.label == 'core.Order':
+        instance._transition_started = time.perf_counter()
+
+
+@receiver(post_transition)
+def _transition_finished(sender, instance, name, source, target, **kwargs):
+    if sender._meta.label != 'core.Order':
+        return
+    ORDER_TRANSITIONS.inc(transition=name, source=source, target=target)
+    started = instance.__dict__.pop('_transition_started', None)
+    if started is not None:
+        ORDER_TRANSITION_DURATION.observe(time.perf_counter() - started, transition=name)
+
+
+def count_customer_events(events):
+    """Count CustomerEvent rows inserted without post_save (bulk_create); see also bulk_io.ingest_events()."""
+    for event_type, count in EventCounts(event.event_type for event in events).items():
+        CUSTOMER_EVENTS.inc(count, event_type=event_type)
+
+
+@receiver(post_save, sender='core.CustomerEvent')
+def _customer_event_saved(sender, instance, created, **kwargs):
+    if created:
+        CUSTOMER_EVENTS.inc(event_type=instance.event_type)
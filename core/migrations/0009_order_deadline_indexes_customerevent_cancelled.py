@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_remove_user_country'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customerevent',
+            name='event_type',
+            field=models.CharField(choices=[('LOGIN', 'Login'), ('LOGOUT', 'Logout'), ('ORDER_CREATED', 'Order Created'), ('DOWN_PAYMENT_UPLOADED', 'Down Payment Uploaded'), ('FULL_PAYMENT_UPLOADED', 'Full Payment Uploaded'), ('ORDER_APPROVED', 'Order Approved'), ('DOWN_PAYMENT_VERIFIED', 'Down Payment Verified'), ('FULL_PAYMENT_VERIFIED', 'Full Payment Verified'), ('ORDER_SHIPPED', 'Order Shipped'), ('ORDER_CANCELLED', 'Order Cancelled')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'downpayment_deadline'], name='order_status_dp_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'fullpayment_deadline'], name='order_status_fp_deadline_idx'),
+        ),
+    ]
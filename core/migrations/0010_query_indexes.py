@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_order_deadline_indexes_customerevent_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['year', 'week_number'], name='availability_year_week_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerevent',
+            index=models.Index(fields=['user', 'event_type'], name='event_user_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerevent',
+            index=models.Index(fields=['order', 'event_type'], name='event_order_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'status'], name='order_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-confirmed_at'], name='order_status_confirmed_at_idx'),
+        ),
+    ]
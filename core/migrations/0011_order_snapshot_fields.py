@@ -0,0 +1,81 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:14
+
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+SNAPSHOT_FIELDS = ['unit_price', 'subtotal_amount', 'total_amount', 'balance_amount', 'product_label',
+                   'ship_week', 'ship_date']
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Every order gets its product and ship week/date; approved ones also get their totals from
+    # current product prices (the best record available)
+    Order = apps.get_model('core', 'Order')
+    orders = Order.objects.filter(ship_week__isnull=True).select_related('availability__product')
+    batch = []
+    for order in orders.iterator(chunk_size=2000):
+        availability = order.availability
+        product = availability.product
+        if order.downpayment_amount is not None:
+            order.unit_price = product.price
+            order.subtotal_amount = order.quantity * product.price
+            order.total_amount = order.subtotal_amount + Decimal(order.transport_cost or 0).quantize(Decimal('0.01'))
+            order.balance_amount = order.total_amount - order.downpayment_amount
+        order.product_label = f"{product.type} {product.ploidy} {product.diameter}mm"
+        order.ship_week = availability.week_number
+        # ISO week, as week_calendar.week_start
+        order.ship_date = date.fromisocalendar(availability.year, availability.week_number, 1)
+        batch.append(order)
+        if len(batch) == 2000:
+            Order.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+            batch = []
+    Order.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='balance_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='product_label',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='ship_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='ship_week',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
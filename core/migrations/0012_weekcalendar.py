@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:16
+
+from django.db import migrations, models
+
+from core.week_calendar import calendar_rows
+
+
+def populate_calendar(apps, schema_editor):
+    WeekCalendar = apps.get_model('core', 'WeekCalendar')
+    WeekCalendar.objects.bulk_create(
+        [WeekCalendar(year=y, week_number=w, week_start=s, week_end=e) for y, w, s, e in calendar_rows()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_order_snapshot_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeekCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('week_number', models.IntegerField()),
+                ('week_start', models.DateField(db_index=True)),
+                ('week_end', models.DateField()),
+            ],
+            options={
+                'unique_together': {('year', 'week_number')},
+            },
+        ),
+        migrations.RunPython(populate_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_weekcalendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConversionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('week_number', models.IntegerField()),
+                ('strain', models.CharField(max_length=20)),
+                ('from_event', models.CharField(max_length=30)),
+                ('to_event', models.CharField(max_length=30)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('year', 'week_number', 'strain', 'from_event', 'to_event')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('week_number', models.IntegerField()),
+                ('strain', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved for Down Payment'), ('down_paid', 'Down Payment Received'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('shipped', 'Shipped')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('year', 'week_number', 'strain', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_pipeline_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerFeatures',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reliability_features', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('login_count', models.IntegerField(default=0)),
+                ('order_count', models.IntegerField(default=0)),
+                ('timely_payments', models.IntegerField(default=0)),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('scored_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
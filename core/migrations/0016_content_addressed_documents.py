@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:58
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_payment_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='downpayment_invoice',
+            field=models.FileField(blank=True, null=True, storage=core.storage.document_storage, upload_to='downpayment_invoices/'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='downpayment_proof',
+            field=models.FileField(blank=True, null=True, storage=core.storage.document_storage, upload_to='payment_proofs/'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='fullpayment_proof',
+            field=models.FileField(blank=True, null=True, storage=core.storage.document_storage, upload_to='payment_proofs/'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='invoice',
+            field=models.FileField(blank=True, null=True, storage=core.storage.document_storage, upload_to='invoices/'),
+        ),
+    ]
@@ -1,53 +1,62 @@
 # core/ml_model.py
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-import joblib
+from django.db.models import Count, F, Min, Q
 from django.utils import timezone
 from .models import CustomerEvent, Order
+from .db_routers import replica_reads
+from .instrumentation import timed
+from . import model_store
+from .model_store import FEATURES
+
+PAID_STATUSES = ('down_paid', 'confirmed', 'shipped')
+
+
+def order_features(user_ids):
+    """
+    {user_id: {'order_count', 'timely_payments', 'completed_orders'}} from the customers' orders, in two
+    queries. An order is a timely payment once its down payment is verified (it is in PAID_STATUSES) and the
+    customer's first DOWN_PAYMENT_UPLOADED event for it came before the down payment deadline.
+    """
+    features = {user_id: {'order_count': 0, 'timely_payments': 0, 'completed_orders': 0} for user_id in user_ids}
+    counts = Order.objects.filter(customer_id__in=user_ids).values('customer_id').annotate(
+        order_count=Count('id'), completed_orders=Count('id', filter=Q(status='shipped')),
+    )
+    for row in counts:
+        features[row.pop('customer_id')].update(row)
+    timely = Order.objects.filter(
+        customer_id__in=user_ids, status__in=PAID_STATUSES,
+        downpayment_deadline__isnull=False, downpayment_proof__gt='',
+    ).annotate(
+        first_upload=Min('customerevent__timestamp', filter=Q(
+            customerevent__event_type='DOWN_PAYMENT_UPLOADED', customerevent__user_id=F('customer_id'),
+        ))
+    ).filter(first_upload__lte=F('downpayment_deadline'))
+    for customer_id in timely.values_list('customer_id', flat=True):
+        features[customer_id]['timely_payments'] += 1
+    return features
+
 
 class ReliabilityModel:
     def __init__(self):
+        # scikit-learn is only needed to train or to score through the estimators; core.model_store scores without it
+        from sklearn.linear_model import LinearRegression
+        from sklearn.preprocessing import StandardScaler
+
         self.model = LinearRegression()
         self.scaler = StandardScaler()
-        self.model_path = 'reliability_model.joblib'
-        self.scaler_path = 'scaler.joblib'
 
+    @replica_reads()
     def extract_features(self, user):
         """Extract features from CustomerEvent and Order data for a user."""
-        events = CustomerEvent.objects.filter(user=user)
-        orders = Order.objects.filter(customer=user)
+        user_id = getattr(user, 'pk', user)
 
         # Feature 1: Number of logins
-        login_count = events.filter(event_type='LOGIN').count()
-
-        # Feature 2: Number of orders
-        order_count = orders.count()
-
-        # Feature 3: Timely payments (down payments made before deadline)
-        timely_payments = 0
-        for order in orders.filter(status__in=['down_paid', 'confirmed', 'shipped']):
-            if order.downpayment_deadline and order.downpayment_proof:
-                # Check if down payment was uploaded before deadline
-                down_payment_event = events.filter(
-                    event_type='DOWN_PAYMENT_UPLOADED',
-                    order=order
-                ).first()
-                if down_payment_event and down_payment_event.timestamp <= order.downpayment_deadline:
-                    timely_payments += 1
-
-        # Feature 4: Completed orders
-        completed_orders = orders.filter(status='shipped').count()
-
-        return {
-            'login_count': login_count,
-            'order_count': order_count,
-            'timely_payments': timely_payments,
-            'completed_orders': completed_orders
-        }
+        login_count = CustomerEvent.objects.filter(user_id=user_id, event_type='LOGIN').count()
+
+        # Features 2-4: orders, timely payments, completed orders
+        return {'login_count': login_count, **order_features([user_id])[user_id]}
 
     def train(self, users):
-        """Train the model using data from all customers."""
+        """Train the model using data from all customers. Returns the new (unpromoted) version."""
         X = []
         y = []
         for user in users:
@@ -60,22 +69,33 @@ class ReliabilityModel:
             ])
             y.append(user.reliability_score)  # Use current score as target (supervised)
 
+        return self.fit(X, y)
+
+    def fit(self, X, y):
+        """Fit on prepared feature rows (FEATURES order) and store them as a new model version."""
+        from sklearn.metrics import mean_absolute_error, r2_score
+
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
         self.model.fit(X_scaled, y)
 
-        # Save model and scaler
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        # Save model and scaler as a new version; model_store.promote() puts it in production
+        fitted = self.model.predict(X_scaled)
+        metrics = {
+            'samples': len(y),
+            'r2': round(float(r2_score(y, fitted)), 6) if len(y) > 1 else None,
+            'mae': round(float(mean_absolute_error(y, fitted)), 6),
+        }
+        return model_store.save_version(self.model, self.scaler, FEATURES, metrics)
 
+    @timed('reliability_scoring')
     def predict(self, user):
         """Predict reliability score for a user."""
-        try:
-            self.model = joblib.load(self.model_path)
-            self.scaler = joblib.load(self.scaler_path)
-        except FileNotFoundError:
+        version = model_store.production_version()
+        if version is None:
             # If model not trained, return default score
             return 0.8
+        self.model, self.scaler = model_store.load(version)
 
         features = self.extract_features(user)
         X = [[
@@ -0,0 +1,219 @@
+# core/model_store.py
+"""
+Versioned artifact store for the reliability model.
+
+Each training run writes a new immutable version directory under
+RELIABILITY_MODEL_DIR (model.joblib, scaler.joblib, the pickle-free params.npz
+read by scoring, and metadata.json). Versions are
+staged in a temporary directory and renamed into place, and the `current` and
+`candidate` pointers are small JSON files swapped with os.replace(), so
+readers never see a half-written model and promotion or rollback is a single
+atomic rename. Without a promoted version, the legacy reliability_model.joblib /
+scaler.joblib pair in the working directory is used.
+
+Scoring only needs params.npz (core.linear_scorer), so this module imports
+joblib and scikit-learn lazily, for training, export and old versions only.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .instrumentation import span
+from .linear_scorer import LinearScorer
+
+CURRENT = 'current'
+CANDIDATE = 'candidate'
+LEGACY = 'legacy'
+LEGACY_PATHS = ('reliability_model.joblib', 'scaler.joblib')
+LEGACY_PARAMS = 'reliability_model.npz'
+PARAMS = 'params.npz'
+# Model inputs, in column order; also the CustomerFeatures counter fields
+FEATURES = ['login_count', 'order_count', 'timely_payments', 'completed_orders']
+
+_scorers_lock = threading.Lock()
+_scorers = {}
+
+
+def store_dir():
+    return getattr(settings, 'RELIABILITY_MODEL_DIR', os.path.join(settings.BASE_DIR, 'model_store'))
+
+
+def _versions_dir():
+    return os.path.join(store_dir(), 'versions')
+
+
+def _write_json_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(data, fh, indent=2, sort_keys=True, default=str)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_version(model, scaler, features, metrics, **extra):
+    """Write a new immutable version and return its id. Nothing is promoted."""
+    trained_at = timezone.now()
+    version = trained_at.strftime('%Y%m%dT%H%M%S%f')
+    import joblib
+    import sklearn
+
+    os.makedirs(_versions_dir(), exist_ok=True)
+    staging = tempfile.mkdtemp(dir=_versions_dir(), prefix='.staging-')
+    try:
+        joblib.dump(model, os.path.join(staging, 'model.joblib'))
+        joblib.dump(scaler, os.path.join(staging, 'scaler.joblib'))
+        LinearScorer.from_estimators(model, scaler, features).save(os.path.join(staging, PARAMS))
+        _write_json_atomic(os.path.join(staging, 'metadata.json'), {
+            'version': version,
+            'trained_at': trained_at.isoformat(),
+            'features': list(features),
+            'metrics': metrics,
+            'sklearn': sklearn.__version__,
+            'parent': current_version(),
+            **extra,
+        })
+        os.rename(staging, os.path.join(_versions_dir(), version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return version
+
+
+def list_versions():
+    """Metadata of every stored version, oldest first."""
+    if not os.path.isdir(_versions_dir()):
+        return []
+    return [metadata(name) for name in sorted(os.listdir(_versions_dir())) if not name.startswith('.')]
+
+
+def metadata(version):
+    with open(os.path.join(_versions_dir(), version, 'metadata.json')) as fh:
+        return json.load(fh)
+
+
+def update_metadata(version, **values):
+    """Merge values (e.g. a shadow comparison) into a version's metadata."""
+    data = metadata(version)
+    data.update(values)
+    _write_json_atomic(os.path.join(_versions_dir(), version, 'metadata.json'), data)
+
+
+def _pointer_path(name):
+    return os.path.join(store_dir(), f'{name}.json')
+
+
+def _read_pointer(name):
+    try:
+        with open(_pointer_path(name)) as fh:
+            return json.load(fh)['version']
+    except FileNotFoundError:
+        return None
+
+
+def current_version():
+    return _read_pointer(CURRENT)
+
+
+def candidate_version():
+    return _read_pointer(CANDIDATE)
+
+
+def _set_pointer(name, version):
+    if not os.path.isdir(os.path.join(_versions_dir(), version)):
+        raise ValueError(f'Unknown model version: {version}')
+    _write_json_atomic(_pointer_path(name), {'version': version, 'updated_at': timezone.now().isoformat()})
+
+
+def promote(version):
+    """Atomically make `version` the production model; a matching candidate pointer is cleared."""
+    _set_pointer(CURRENT, version)
+    if candidate_version() == version:
+        clear_candidate()
+
+
+def set_candidate(version):
+    _set_pointer(CANDIDATE, version)
+
+
+def clear_candidate():
+    try:
+        os.remove(_pointer_path(CANDIDATE))
+    except FileNotFoundError:
+        pass
+
+
+def _artifact_paths(version):
+    if version == LEGACY:
+        return LEGACY_PATHS
+    directory = os.path.join(_versions_dir(), version)
+    return os.path.join(directory, 'model.joblib'), os.path.join(directory, 'scaler.joblib')
+
+
+def params_path(version):
+    return LEGACY_PARAMS if version == LEGACY else os.path.join(_versions_dir(), version, PARAMS)
+
+
+def load(version):
+    """(model, scaler) estimators for a stored version, or the legacy pair; raises FileNotFoundError if missing."""
+    import joblib
+
+    model_path, scaler_path = _artifact_paths(version)
+    with span('model_load'):
+        return joblib.load(model_path), joblib.load(scaler_path)
+
+
+def export_params(version, path=None):
+    """Write the pickle-free params.npz for a version (by default into it) from its joblib artifacts."""
+    model, scaler = load(version)
+    path = path or params_path(version)
+    LinearScorer.from_estimators(model, scaler, FEATURES).save(path)
+    return path
+
+
+def load_scorer(version):
+    """
+    LinearScorer for a version, read from params.npz without scikit-learn; versions
+    saved before that file existed fall back to unpickling the estimators. Versions are
+    immutable, so scorers are cached per process. Raises ValueError for a version trained on
+    other features than FEATURES.
+    """
+    with _scorers_lock:
+        if version not in _scorers:
+            try:
+                with span('model_load'):
+                    scorer = LinearScorer.load(params_path(version))
+            except FileNotFoundError:
+                scorer = LinearScorer.from_estimators(*load(version), FEATURES)
+            # Scoring multiplies CustomerFeatures vectors (FEATURES order) by the weights positionally
+            if scorer.features != FEATURES:
+                raise ValueError(f'Model version {version} was trained on {scorer.features}, not {FEATURES}')
+            _scorers[version] = scorer
+        return _scorers[version]
+
+
+def production_version():
+    """The promoted version, or LEGACY when nothing has been promoted but the legacy files exist."""
+    version = current_version()
+    if version is None and (os.path.exists(LEGACY_PARAMS) or all(os.path.exists(path) for path in LEGACY_PATHS)):
+        return LEGACY
+    return version
+
+
+def score_matrix(X, versions):
+    """
+    Scores for every row of X (FEATURES order) under each version, as one matrix product
+    over the shared feature matrix: an array of shape (len(X), len(versions)), clipped to [0, 1].
+    """
+    scorers = [load_scorer(version) for version in versions]
+    weights = np.column_stack([scorer.weights for scorer in scorers])
+    bias = np.array([scorer.bias for scorer in scorers])
+    return np.clip(np.atleast_2d(np.asarray(X, dtype=float)) @ weights + bias, 0.0, 1.0)
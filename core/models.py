@@ -1,5 +1,6 @@
 # core/models.py
-from datetime import datetime
+import uuid
+from datetime import datetime, time
 
 from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
@@ -8,6 +9,8 @@ from django_fsm import FSMField, transition
 from decimal import Decimal
 from django.conf import settings
 from django.utils import timezone
+from . import week_calendar
+from .storage import document_storage
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -59,8 +62,31 @@ class Availability(models.Model):
     def __str__(self):
         return f"{self.product} - {self.year} Week {self.week_number}"
 
+    @property
+    def expected_ship_date(self):
+        # Monday of the ISO week; replaces the dropped expected_ship_date column
+        return week_calendar.week_start(self.year, self.week_number)
+
     class Meta:
         unique_together = ('product', 'year', 'week_number')  # Ensure unique availability per product, year, week
+        indexes = [
+            # Availability listings filter by year and order by week
+            models.Index(fields=['year', 'week_number'], name='availability_year_week_idx'),
+        ]
+
+
+class WeekCalendar(models.Model):
+    # ISO week -> dates for joining in SQL, see core/week_calendar.py
+    year = models.IntegerField()
+    week_number = models.IntegerField()
+    week_start = models.DateField(db_index=True)
+    week_end = models.DateField()
+
+    def __str__(self):
+        return f"{self.year} Week {self.week_number}"
+
+    class Meta:
+        unique_together = ('year', 'week_number')
 
 
 class Order(models.Model):
@@ -88,35 +114,99 @@ class Order(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
-    invoice = models.FileField(upload_to='invoices/', null=True, blank=True)
-    downpayment_invoice = models.FileField(upload_to='downpayment_invoices/', null=True, blank=True)
+    # Documents are stored by content hash (core/storage.py); upload_to only contributes the extension
+    invoice = models.FileField(upload_to='invoices/', null=True, blank=True, storage=document_storage)
+    downpayment_invoice = models.FileField(upload_to='downpayment_invoices/', null=True, blank=True, storage=document_storage)
     notes = models.TextField(blank=True, null=True)
     downpayment_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     fullpayment_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     downpayment_deadline = models.DateTimeField(null=True, blank=True)
     fullpayment_deadline = models.DateTimeField(null=True, blank=True)
-    downpayment_proof = models.FileField(upload_to='payment_proofs/', null=True, blank=True)
-    fullpayment_proof = models.FileField(upload_to='payment_proofs/', null=True, blank=True)
+    downpayment_proof = models.FileField(upload_to='payment_proofs/', null=True, blank=True, storage=document_storage)
+    fullpayment_proof = models.FileField(upload_to='payment_proofs/', null=True, blank=True, storage=document_storage)
     commission_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
     transport_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     downpayment_transaction_id = models.CharField(max_length=50, blank=True, null=True)
     fullpayment_transaction_id = models.CharField(max_length=50, blank=True, null=True)
+    # Snapshot taken at approval (product, ship week and date already when the order is created):
+    # invoices, emails and dashboards render from these without joining availability/product,
+    # and issued documents keep the prices they were approved at
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    subtotal_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    balance_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    product_label = models.CharField(max_length=100, blank=True, default='')
+    ship_week = models.PositiveSmallIntegerField(null=True, blank=True)
+    ship_date = models.DateField(null=True, blank=True)
+
+    DOWNPAYMENT_RATE = Decimal('0.15')
 
     def calculate_ship_date(self):
         # Calculate Monday of the given week
-        return datetime.strptime(f"{self.availability.year}-W{self.availability.week_number}-1", "%Y-W%W-%w").date()
+        return self.availability.expected_ship_date
+
+    def calculate_subtotal(self):
+        return self.quantity * self.availability.product.price
+
+    def calculate_total(self):
+        return self.calculate_subtotal() + Decimal(self.transport_cost or 0).quantize(Decimal('0.01'))
+
+    def calculate_downpayment(self):
+        return (self.calculate_subtotal() * self.DOWNPAYMENT_RATE).quantize(Decimal('0.01'))
+
+    def snapshot_shipment(self):
+        # Fixed by the availability the order was placed for, so taken when the order is created
+        self.product_label = str(self.availability.product)
+        self.ship_week = self.availability.week_number
+        self.ship_date = self.calculate_ship_date()
+
+    def snapshot_totals(self):
+        product = self.availability.product
+        self.unit_price = product.price
+        self.subtotal_amount = self.calculate_subtotal()
+        self.total_amount = self.calculate_total()
+        self.balance_amount = self.total_amount - self.downpayment_amount
+        self.snapshot_shipment()
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.ship_week is None and self.availability_id:
+            self.snapshot_shipment()
+        super().save(*args, **kwargs)
+
+    # Snapshot values once approved, live prices while the order is still pending
+    @property
+    def subtotal(self):
+        return self.subtotal_amount if self.subtotal_amount is not None else self.calculate_subtotal()
+
+    @property
+    def total(self):
+        return self.total_amount if self.total_amount is not None else self.calculate_total()
+
+    @property
+    def balance(self):
+        if self.balance_amount is not None:
+            return self.balance_amount
+        return self.calculate_total() - (self.downpayment_amount or self.calculate_downpayment())
+
+    @property
+    def product_display(self):
+        return self.product_label or str(self.availability.product)
 
     @transition(field=status, source='pending', target='approved')
     def approve(self):
         self.downpayment_amount = self.calculate_downpayment()
         self.downpayment_deadline = timezone.now() + timezone.timedelta(days=3)
+        self.snapshot_totals()
 
     @transition(field=status, source='approved', target='down_paid')
-    def confirm_downpayment(self):
-        ship_date = self.calculate_ship_date()
+    def confirm_downpayment(self, reserve_stock=True):
+        ship_date = timezone.make_aware(datetime.combine(self.calculate_ship_date(), time.min))
         self.fullpayment_deadline = ship_date - timezone.timedelta(days=14)
         if self.fullpayment_deadline < timezone.now():
             self.fullpayment_deadline = timezone.now() + timezone.timedelta(days=1)
+        if not reserve_stock:
+            # Caller has already locked and decremented the availability row (bulk reconciliation)
+            return
         with transaction.atomic():
             availability = Availability.objects.select_for_update().get(pk=self.availability.pk)
             if availability.available_quantity < self.quantity:
@@ -133,11 +223,22 @@ class Order(models.Model):
         self.save(update_fields=['status'])
 
     @transition(field=status, source=['approved', 'down_paid'], target='cancelled')
-    def cancel(self):
-        if self.status == 'down_paid':
-            availability = self.availability
-            availability.available_quantity += self.quantity
-            availability.save(update_fields=['available_quantity'])
+    def cancel(self, release_stock=True):
+        if self.status == 'down_paid' and release_stock:
+            Availability.objects.filter(pk=self.availability_id).update(
+                available_quantity=F('available_quantity') + self.quantity
+            )
+
+    class Meta:
+        indexes = [
+            # Deadline sweeps filter on status and the matching deadline column
+            models.Index(fields=['status', 'downpayment_deadline'], name='order_status_dp_deadline_idx'),
+            models.Index(fields=['status', 'fullpayment_deadline'], name='order_status_fp_deadline_idx'),
+            # Customer dashboards and the API list a customer's orders by status
+            models.Index(fields=['customer', 'status'], name='order_customer_status_idx'),
+            # Sales dashboard: latest confirmed orders; also serves plain status filters
+            models.Index(fields=['status', '-confirmed_at'], name='order_status_confirmed_at_idx'),
+        ]
 
 class CustomerEvent(models.Model):
     EVENT_TYPES = [
@@ -150,6 +251,7 @@ class CustomerEvent(models.Model):
         ('DOWN_PAYMENT_VERIFIED', 'Down Payment Verified'),
         ('FULL_PAYMENT_VERIFIED', 'Full Payment Verified'),
         ('ORDER_SHIPPED', 'Order Shipped'),
+        ('ORDER_CANCELLED', 'Order Cancelled'),
     ]
 
     user = models.ForeignKey(
@@ -168,4 +270,98 @@ class CustomerEvent(models.Model):
     metadata = models.JSONField(blank=True, null=True)
 
     def __str__(self):
-        return f"{self.user.username} - {self.event_type} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.user.username} - {self.event_type} at {self.timestamp}"
+
+    class Meta:
+        indexes = [
+            # Reliability features count a user's events by type and look up an order's payment events
+            models.Index(fields=['user', 'event_type'], name='event_user_type_idx'),
+            models.Index(fields=['order', 'event_type'], name='event_order_type_idx'),
+        ]
+
+class PipelineRollup(models.Model):
+    # Orders per (ship week, strain, status); maintained by core/pipeline_rollups.py
+    year = models.IntegerField()
+    week_number = models.IntegerField()
+    strain = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('year', 'week_number', 'strain', 'status')
+
+
+class ConversionRollup(models.Model):
+    # Time between consecutive lifecycle events per (ship week, strain)
+    year = models.IntegerField()
+    week_number = models.IntegerField()
+    strain = models.CharField(max_length=20)
+    from_event = models.CharField(max_length=30)
+    to_event = models.CharField(max_length=30)
+    order_count = models.IntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('year', 'week_number', 'strain', 'from_event', 'to_event')
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+class CustomerFeatures(models.Model):
+    # Reliability model inputs kept current as events arrive; see core/online_scoring.py
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='reliability_features')
+    login_count = models.IntegerField(default=0)
+    order_count = models.IntegerField(default=0)
+    timely_payments = models.IntegerField(default=0)
+    completed_orders = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    scored_at = models.DateTimeField(null=True, blank=True)
+
+    def as_vector(self):
+        return [self.login_count, self.order_count, self.timely_payments, self.completed_orders]
+
+    def __str__(self):
+        return f"Features for {self.user_id}"
+
+
+class PaymentUpload(models.Model):
+    # A payment proof arriving in chunks; see core/payment_uploads.py
+    KIND_CHOICES = [
+        ('downpayment', 'Down payment'),
+        ('fullpayment', 'Full payment'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_uploads')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} proof for order #{self.order_id} ({self.received}/{self.size})"
+
+
+class StoredBlob(models.Model):
+    # How many Order file fields reference a content-addressed blob; see core/storage.py
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
@@ -0,0 +1,140 @@
+# core/online_scoring.py
+"""
+Online reliability scoring.
+
+CustomerFeatures holds the reliability model's four inputs per customer. A
+LOGIN event bumps login_count with one UPDATE in the event's own transaction;
+an event that comes with an order change (ORDER_EVENTS) recomputes the
+customer's order features from their orders, with the queries
+ReliabilityModel.extract_features uses (ml_model.order_features), so a
+cancelled order drops out of timely_payments and order_count counts orders
+rather than events. Once the transaction commits the customer is rescored off
+the request thread, from the feature row and the production model's
+parameters (cached per process; core.model_store versions are immutable).
+update_reliability_scores stays the periodic full retrain: it rebuilds every
+feature row from history (covering order changes made without an event),
+refits the model and rescores everyone.
+"""
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .db_routers import pin_to_primary
+from . import model_store
+from .model_store import FEATURES
+from .instrumentation import timed
+from .ml_model import order_features
+from .models import CustomerEvent, CustomerFeatures, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCORE = 0.8
+# Events that come with a change to what ml_model.order_features counts
+ORDER_EVENTS = {'ORDER_CREATED', 'DOWN_PAYMENT_VERIFIED', 'ORDER_CANCELLED', 'ORDER_SHIPPED'}
+
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def score_vector(vector):
+    """Same result as ReliabilityModel.predict, computed with NumPy from the cached production parameters."""
+    version = model_store.production_version()
+    if version is None:
+        return DEFAULT_SCORE
+    return float(model_store.score_matrix([vector], [version])[0, 0])
+
+
+def rebuild_features(user_ids):
+    """Recompute feature rows from full history (ReliabilityModel.extract_features). Returns {user_id: row}."""
+    # Imported here: ReliabilityModel pulls in scikit-learn, which scoring alone does not need
+    from .ml_model import ReliabilityModel
+
+    model = ReliabilityModel()
+    # Inside atomic() reads go to the primary, so events committed a moment ago are counted
+    with transaction.atomic():
+        rows = [CustomerFeatures(user_id=user_id, **model.extract_features(user_id)) for user_id in user_ids]
+        CustomerFeatures.objects.bulk_create(
+            rows, batch_size=500, update_conflicts=True, unique_fields=['user'],
+            update_fields=[*FEATURES, 'updated_at'],
+        )
+    return {row.user_id: row for row in rows}
+
+
+def record_events(events):
+    """Fold new events into CustomerFeatures and schedule a rescore; call after bulk_create, which skips signals."""
+    logins = Counter(event.user_id for event in events if event.event_type == 'LOGIN')
+    changed_orders = {event.user_id for event in events if event.event_type in ORDER_EVENTS}
+    missing = []
+    # Inside atomic() reads go to the primary, so the order change that came with the event is seen
+    with transaction.atomic():
+        recomputed = order_features(list(changed_orders))
+        for user_id in logins.keys() | changed_orders:
+            fields = dict(recomputed.get(user_id, {}))
+            if user_id in logins:
+                fields['login_count'] = F('login_count') + logins[user_id]
+            if not CustomerFeatures.objects.filter(pk=user_id).update(updated_at=timezone.now(), **fields):
+                missing.append(user_id)
+    if missing:
+        # First event since the table was introduced: the history already includes it
+        rebuild_features(missing)
+    schedule_rescore(list(logins.keys() | changed_orders))
+
+
+@timed('reliability_scoring')
+def rescore(user_ids):
+    """Score customers from their feature rows and store the result on User.reliability_score."""
+    now = timezone.now()
+    rows = CustomerFeatures.objects.filter(pk__in=user_ids, user__role='customer')
+    scores = {row.user_id: score_vector(row.as_vector()) for row in rows}
+    for user_id, score in scores.items():
+        User.objects.filter(pk=user_id).update(reliability_score=score)
+    CustomerFeatures.objects.filter(pk__in=list(scores)).update(scored_at=now)
+    return scores
+
+
+def _rescore_in_background(user_ids):
+    # Fresh routing state per worker thread: read the rows the request just committed from the primary
+    pin_to_primary()
+    close_old_connections()
+    try:
+        rescore(user_ids)
+    except Exception:
+        logger.exception('Reliability rescoring failed for users %s', user_ids)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RELIABILITY_SCORING_WORKERS', 2),
+                thread_name_prefix='reliability-scoring',
+            )
+        return _executor
+
+
+def schedule_rescore(user_ids):
+    """Rescore after the current transaction commits: on the worker pool, inline, or not at all (RELIABILITY_SCORING)."""
+    mode = getattr(settings, 'RELIABILITY_SCORING', 'background')
+    if not user_ids or mode == 'off':
+        return
+    if mode == 'inline':
+        transaction.on_commit(lambda: rescore(user_ids))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_rescore_in_background, user_ids))
+
+
+@receiver(post_save, sender=CustomerEvent)
+def _customer_event_saved(sender, instance, created, **kwargs):
+    if created and (instance.event_type == 'LOGIN' or instance.event_type in ORDER_EVENTS):
+        record_events([instance])
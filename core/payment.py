@@ -1,6 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrumentation import timed
+
+
 # core/payment.py
 class PaymentAdapter:
     """Payment adapter to handle payment processing (simulated for MVP)"""
+    @timed('payment_call')
     def request_downpayment(self, order):
         """
         Simulate requesting a down payment for an order.
@@ -12,6 +18,7 @@ class PaymentAdapter:
             "transaction_id": f"DP-{order.id}-{int(order.created_at.timestamp())}"
         }
 
+    @timed('payment_call')
     def request_full_payment(self, order):
         """
         Simulate requesting full payment for an order.
@@ -23,10 +30,23 @@ class PaymentAdapter:
             "transaction_id": f"FP-{order.id}-{int(order.created_at.timestamp())}"
         }
 
+    @timed('payment_call')
     def verify_payment(self, transaction_id):
         """
         Simulate verifying a payment by transaction ID.
         Returns True if valid, False otherwise.
         """
         # For MVP, assume all transaction IDs are valid
-        return transaction_id.startswith(("DP-", "FP-"))
\ No newline at end of file
+        return transaction_id.startswith(("DP-", "FP-"))
+
+    def verify_payments(self, transaction_ids, max_workers=8):
+        """
+        Verify a batch of transaction IDs concurrently.
+        Returns a dict mapping each transaction ID to its verification result.
+        """
+        transaction_ids = list(dict.fromkeys(transaction_ids))
+        if not transaction_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(transaction_ids)))) as executor:
+            results = executor.map(self.verify_payment, transaction_ids)
+            return dict(zip(transaction_ids, results))
@@ -0,0 +1,174 @@
+# core/payment_uploads.py
+"""
+Chunked, resumable payment proof uploads.
+
+A client declares the file (name, size, SHA-256), then sends it in chunks of at
+most PAYMENT_UPLOAD_CHUNK_SIZE bytes, each at the offset the server reports. A
+chunk is copied from the request stream to a part file under
+PAYMENT_UPLOAD_DIR a block at a time, so no request ever holds more than one
+block of the file, and an interrupted upload resumes from the last stored
+byte. Finalizing re-hashes the part file from disk and copies it into the
+order's proof field; the part file is only deleted once the order save has
+committed, so a finalize that fails can simply be retried.
+"""
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, PaymentUpload
+from .storage import file_sha256
+
+# Same limit as DownPaymentForm/FullPaymentForm
+MAX_PROOF_SIZE = 5 * 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# kind -> (order status that accepts it, proof field, event type, payment type shown to sales, transaction field)
+KINDS = {
+    'downpayment': ('approved', 'downpayment_proof', 'DOWN_PAYMENT_UPLOADED', 'down payment', 'downpayment_transaction_id'),
+    'fullpayment': ('down_paid', 'fullpayment_proof', 'FULL_PAYMENT_UPLOADED', 'full payment', 'fullpayment_transaction_id'),
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_size():
+    return getattr(settings, 'PAYMENT_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+
+def part_path(upload):
+    return os.path.join(settings.PAYMENT_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def start_upload(order, kind, filename, size, sha256):
+    if kind not in KINDS:
+        raise UploadError(f'Unknown upload kind {kind!r}.')
+    if order.status != KINDS[kind][0]:
+        raise UploadError(f'Order #{order.id} does not accept a {KINDS[kind][3]} proof.', status=409)
+    if not 0 < size <= MAX_PROOF_SIZE:
+        raise UploadError(f'File size must be between 1 byte and {MAX_PROOF_SIZE} bytes.')
+    if not re.fullmatch(r'[0-9a-f]{64}', sha256 or ''):
+        raise UploadError('sha256 must be a hex SHA-256 digest.')
+    upload = PaymentUpload.objects.create(
+        order=order, kind=kind, filename=os.path.basename(filename)[:255] or 'proof', size=size, sha256=sha256,
+    )
+    os.makedirs(settings.PAYMENT_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def parse_content_range(header):
+    """(start, end inclusive, total) from a 'bytes start-end/total' Content-Range header."""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('A "Content-Range: bytes start-end/total" header is required.')
+    start, end, total = map(int, match.groups())
+    if end < start:
+        raise UploadError('Invalid Content-Range.')
+    return start, end, total
+
+
+def append_chunk(upload, stream, start, end, total, chunk_sha256=None):
+    """
+    Copy bytes start..end (inclusive) from stream into the part file. Chunks must arrive at
+    upload.received; anything else is answered with the current offset so the client can resume.
+    Returns the new offset.
+    """
+    length = end - start + 1
+    if upload.completed_at:
+        raise UploadError('Upload already completed.', status=409)
+    if total != upload.size or end >= upload.size:
+        raise UploadError(f'Content-Range does not match the declared size of {upload.size} bytes.')
+    if length > chunk_size():
+        raise UploadError(f'Chunks may be at most {chunk_size()} bytes.', status=413)
+    if start != upload.received:
+        raise UploadError(f'Expected a chunk at offset {upload.received}.', status=409)
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(part_path(upload), 'r+b') as part:
+        # Drop the tail of an attempt that failed after writing but before it was recorded
+        part.truncate(start)
+        part.seek(start)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            digest.update(block)
+            written += len(block)
+        if written != length or chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            part.truncate(start)
+            raise UploadError('Chunk incomplete or corrupted; resend it.')
+
+    # Another request for the same offset may have been recorded first
+    updated = PaymentUpload.objects.filter(pk=upload.pk, received=start).update(received=start + length)
+    if not updated:
+        upload.refresh_from_db(fields=['received'])
+        raise UploadError(f'Expected a chunk at offset {upload.received}.', status=409)
+    upload.received = start + length
+    return upload.received
+
+
+def _remove_part(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def finalize(upload):
+    """Verify the assembled file and attach it to the order. Returns the order."""
+    if upload.completed_at:
+        raise UploadError('Upload already completed.', status=409)
+    if upload.received != upload.size:
+        raise UploadError(f'Upload incomplete: {upload.received} of {upload.size} bytes received.', status=409)
+    path = part_path(upload)
+    try:
+        digest = file_sha256(path)
+    except FileNotFoundError:
+        # A concurrent /complete/ finished first, or the part was purged
+        upload.refresh_from_db(fields=['completed_at'])
+        if upload.completed_at:
+            raise UploadError('Upload already completed.', status=409)
+        raise UploadError('The uploaded data is no longer available; start a new upload.', status=409)
+    if digest != upload.sha256:
+        # The stored bytes are unusable; the client must start over
+        os.remove(path)
+        upload.delete()
+        raise UploadError('SHA-256 mismatch; upload discarded.', status=422)
+
+    status, field, _, payment_type, _ = KINDS[upload.kind]
+    with transaction.atomic():
+        order = Order.objects.select_for_update(of=('self',)).select_related('customer').get(pk=upload.order_id)
+        if order.status != status:
+            raise UploadError(f'Order #{order.id} no longer accepts a {payment_type} proof.', status=409)
+        # Under the order lock: a concurrent /complete/ for the same upload has committed by now
+        if PaymentUpload.objects.filter(pk=upload.pk, completed_at__isnull=False).exists():
+            raise UploadError('Upload already completed.', status=409)
+        # Copied, not moved: if a save below fails, the part file is still there for a retry
+        with open(path, 'rb') as fh:
+            getattr(order, field).save(upload.filename, File(fh), save=False)
+        order.save(update_fields=[field])
+        upload.completed_at = timezone.now()
+        upload.save(update_fields=['completed_at'])
+        transaction.on_commit(lambda: _remove_part(path))
+    return order
+
+
+def purge_stale(older_than):
+    """Delete unfinished uploads (and their part files) started before older_than. Returns the count."""
+    stale = list(PaymentUpload.objects.filter(completed_at__isnull=True, created_at__lt=older_than))
+    for upload in stale:
+        _remove_part(part_path(upload))
+    PaymentUpload.objects.filter(pk__in=[upload.pk for upload in stale]).delete()
+    return len(stale)
@@ -1,7 +1,7 @@
 # core/permissions.py
 from rest_framework import permissions
 
-from core.models import Order
+from core.models import Order, User
 
 
 class IsSales(permissions.BasePermission):
@@ -16,6 +16,10 @@ class IsCustomer(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == 'customer'
 
+class IsHatcheryOrSales(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['hatchery', 'sales']
+
 class IsCustomerOrSales(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role in ['customer', 'sales']
@@ -25,4 +29,6 @@ class IsCustomerOrSales(permissions.BasePermission):
             return True
         if isinstance(obj, Order):
             return obj.customer == request.user
+        if isinstance(obj, User):
+            return obj == request.user
         return False
\ No newline at end of file
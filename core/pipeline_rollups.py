@@ -0,0 +1,162 @@
+# core/pipeline_rollups.py
+"""
+Sales pipeline rollups.
+
+PipelineRollup and ConversionRollup hold funnel counts and transition times per
+(ship year, week, strain), so the analytics API never scans Order or
+CustomerEvent. Refreshes are incremental: every order change emits a
+CustomerEvent, so events past the watermark name the (year, week) buckets to
+rebuild; those buckets are recomputed from Order and their events and swapped
+in within one transaction.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .bulk_io import chunked
+from .models import Availability, Order, CustomerEvent, PipelineRollup, ConversionRollup, RollupWatermark
+
+WATERMARK = 'pipeline'
+FUNNEL_EVENTS = [
+    'ORDER_CREATED', 'ORDER_APPROVED', 'DOWN_PAYMENT_UPLOADED', 'DOWN_PAYMENT_VERIFIED',
+    'FULL_PAYMENT_UPLOADED', 'FULL_PAYMENT_VERIFIED', 'ORDER_SHIPPED',
+]
+TRANSITIONS = list(zip(FUNNEL_EVENTS, FUNNEL_EVENTS[1:]))
+REVENUE_STATUSES = ('confirmed', 'shipped')
+BUCKETS_PER_QUERY = 100
+# Events newer than this are re-read on the next run too, in case a slower transaction
+# commits an older event id after this refresh has looked
+SETTLE_SECONDS = 60
+
+
+def _buckets_q(buckets, prefix=''):
+    q = Q()
+    for year, week_number in buckets:
+        q |= Q(**{f'{prefix}year': year, f'{prefix}week_number': week_number})
+    return q
+
+
+def refresh(full=False):
+    """Rebuild changed (or, with full=True, all) buckets. Returns the number of (year, week) buckets rebuilt."""
+    now = timezone.now()
+    with transaction.atomic():
+        # The row lock serializes concurrent refreshes
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+        if full:
+            buckets = set(Availability.objects.filter(order__isnull=False).values_list('year', 'week_number'))
+            PipelineRollup.objects.all().delete()
+            ConversionRollup.objects.all().delete()
+        else:
+            buckets = set(
+                CustomerEvent.objects.filter(id__gt=watermark.last_event_id, order__isnull=False)
+                .values_list('order__availability__year', 'order__availability__week_number')
+            )
+        for chunk in chunked(sorted(buckets), BUCKETS_PER_QUERY):
+            _rebuild(chunk)
+        settled = CustomerEvent.objects.filter(
+            id__gt=watermark.last_event_id, timestamp__lt=now - timedelta(seconds=SETTLE_SECONDS)
+        ).aggregate(last=Max('id'))['last']
+        watermark.last_event_id = max(watermark.last_event_id, settled or 0)
+        watermark.refreshed_at = now
+        watermark.save()
+    return len(buckets)
+
+
+def _rebuild(buckets):
+    funnel = (
+        Order.objects.filter(_buckets_q(buckets, 'availability__'))
+        .values('status', year=F('availability__year'), week_number=F('availability__week_number'),
+                strain=F('availability__product__type'))
+        .annotate(
+            order_count=Count('id'),
+            quantity=Sum('quantity'),
+            amount=Coalesce(Sum('total_amount'), Value(Decimal('0')),
+                            output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+    )
+    pipeline_rows = [PipelineRollup(**row) for row in funnel]
+
+    # First occurrence of each funnel event per order
+    first_seen = (
+        CustomerEvent.objects.filter(_buckets_q(buckets, 'order__availability__'), event_type__in=FUNNEL_EVENTS)
+        .values('order_id', 'event_type', year=F('order__availability__year'),
+                week_number=F('order__availability__week_number'), strain=F('order__availability__product__type'))
+        .annotate(at=Min('timestamp'))
+    )
+    orders = defaultdict(dict)
+    for row in first_seen:
+        orders[(row['year'], row['week_number'], row['strain'], row['order_id'])][row['event_type']] = row['at']
+    conversions = defaultdict(lambda: [0, 0.0])
+    for (year, week_number, strain, _), seen in orders.items():
+        for from_event, to_event in TRANSITIONS:
+            if from_event in seen and to_event in seen and seen[to_event] >= seen[from_event]:
+                totals = conversions[(year, week_number, strain, from_event, to_event)]
+                totals[0] += 1
+                totals[1] += (seen[to_event] - seen[from_event]).total_seconds()
+    conversion_rows = [
+        ConversionRollup(year=year, week_number=week_number, strain=strain, from_event=from_event,
+                         to_event=to_event, order_count=count, total_seconds=seconds)
+        for (year, week_number, strain, from_event, to_event), (count, seconds) in conversions.items()
+    ]
+
+    PipelineRollup.objects.filter(_buckets_q(buckets)).delete()
+    ConversionRollup.objects.filter(_buckets_q(buckets)).delete()
+    PipelineRollup.objects.bulk_create(pipeline_rows, batch_size=1000)
+    ConversionRollup.objects.bulk_create(conversion_rows, batch_size=1000)
+
+
+def pipeline_report(year, strain=None, week_from=None, week_to=None):
+    """Funnel per week and strain for one year, read from the rollup tables only."""
+    filters = {'year': year}
+    if strain:
+        filters['strain'] = strain
+    if week_from:
+        filters['week_number__gte'] = week_from
+    if week_to:
+        filters['week_number__lte'] = week_to
+
+    weeks = {}
+
+    def week_entry(row):
+        key = (row['week_number'], row['strain'])
+        if key not in weeks:
+            weeks[key] = {
+                'year': year, 'week_number': row['week_number'], 'strain': row['strain'],
+                'statuses': {}, 'revenue': Decimal('0'), 'conversions': {},
+            }
+        return weeks[key]
+
+    totals = defaultdict(lambda: {'orders': 0, 'quantity': 0, 'amount': Decimal('0')})
+    for row in PipelineRollup.objects.filter(**filters).values(
+            'week_number', 'strain', 'status', 'order_count', 'quantity', 'amount'):
+        entry = week_entry(row)
+        entry['statuses'][row['status']] = {
+            'orders': row['order_count'], 'quantity': row['quantity'], 'amount': row['amount'],
+        }
+        if row['status'] in REVENUE_STATUSES:
+            entry['revenue'] += row['amount']
+        total = totals[row['status']]
+        total['orders'] += row['order_count']
+        total['quantity'] += row['quantity']
+        total['amount'] += row['amount']
+
+    for row in ConversionRollup.objects.filter(**filters).values(
+            'week_number', 'strain', 'from_event', 'to_event', 'order_count', 'total_seconds'):
+        week_entry(row)['conversions'][f"{row['from_event']}->{row['to_event']}"] = {
+            'orders': row['order_count'],
+            'avg_hours': round(row['total_seconds'] / row['order_count'] / 3600, 2),
+        }
+
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    return {
+        'year': year,
+        'refreshed_at': watermark.refreshed_at if watermark else None,
+        'totals': dict(totals),
+        'revenue': sum((totals[status]['amount'] for status in REVENUE_STATUSES if status in totals), Decimal('0')),
+        'weeks': [weeks[key] for key in sorted(weeks)],
+    }
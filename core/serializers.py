@@ -1,6 +1,7 @@
 # core/serializers.py
 from rest_framework import serializers
 from .models import User, Product, Availability, Order, CustomerEvent
+from .week_calendar import is_valid_week, weeks_in_year
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,6 +23,15 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         model = Availability
         fields = ['id', 'product', 'product_id', 'year', 'week_number', 'available_quantity', 'expected_ship_date']
 
+    def validate(self, attrs):
+        year = attrs.get('year', getattr(self.instance, 'year', None))
+        week_number = attrs.get('week_number', getattr(self.instance, 'week_number', None))
+        if year is not None and week_number is not None and not is_valid_week(year, week_number):
+            raise serializers.ValidationError(
+                {'week_number': f"{year} has only {weeks_in_year(year)} ISO weeks."}
+            )
+        return attrs
+
 class OrderSerializer(serializers.ModelSerializer):
     customer = UserSerializer(read_only=True)
     availability = AvailabilitySerializer(read_only=True)
@@ -35,8 +45,10 @@ class OrderSerializer(serializers.ModelSerializer):
             'id', 'customer', 'availability', 'availability_id', 'quantity', 'status',
             'created_at', 'confirmed_at', 'downpayment_amount', 'fullpayment_amount',
             'downpayment_deadline', 'fullpayment_deadline', 'downpayment_transaction_id',
-            'fullpayment_transaction_id', 'commission_rate', 'transport_cost'
+            'fullpayment_transaction_id', 'commission_rate', 'transport_cost',
+            'subtotal_amount', 'total_amount', 'balance_amount', 'product_label', 'ship_week', 'ship_date'
         ]
+        read_only_fields = ['subtotal_amount', 'total_amount', 'balance_amount', 'product_label', 'ship_week', 'ship_date']
 
 class CustomerEventSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -0,0 +1,160 @@
+# core/storage.py
+"""
+Content-addressed storage for invoices and payment proofs.
+
+ContentAddressedStorage (STORAGES['documents']) files everything under
+blobs/<aa>/<bb>/<sha256><ext>, so identical bytes are written once however
+often they are uploaded or rendered, and a blob name never changes content
+(its digest doubles as a strong ETag). StoredBlob counts the Order file
+fields that point at each blob: the receivers below adjust the counts in the
+same transaction as the order save or delete. Nothing is unlinked on release;
+gc_blobs deletes blobs that stayed unreferenced for a grace period (and files
+whose saving transaction rolled back), so a blob being referenced again while
+it is released is never lost.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F, FileField
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs/'
+BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]{1,10})?$')
+TMP_DIR = 'blobs/tmp'
+BLOCK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def blob_digest(name):
+    """The SHA-256 of a blob's content, read from its name; None for other names."""
+    match = BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content."""
+
+    def get_available_name(self, name, max_length=None):
+        # _save picks the name; equal content is meant to share it
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        if not re.fullmatch(r'(\.[a-z0-9]{1,10})?', ext):
+            ext = ''
+        os.makedirs(self.path(TMP_DIR), exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large uploads, finished chunked uploads): hash it there and move it
+            source, owned = content.temporary_file_path(), False
+            digest = file_sha256(source)
+        else:
+            digest = hashlib.sha256()
+            fd, source = tempfile.mkstemp(dir=self.path(TMP_DIR))
+            owned = True
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    fh.write(chunk)
+            digest = digest.hexdigest()
+
+        blob = f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+        full_path = self.path(blob)
+        if os.path.exists(full_path):
+            # Refresh the mtime so gc_blobs treats the blob as recently used
+            os.utime(full_path)
+            if owned:
+                os.remove(source)
+            return blob
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Another process may place the same blob concurrently; both copies hold the same bytes
+        file_move_safe(source, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return blob
+
+    def delete(self, name):
+        # Blobs may be shared; unreferenced ones are removed by gc_blobs
+        if not blob_digest(name):
+            super().delete(name)
+
+
+def document_storage():
+    return storages['documents']
+
+
+@lru_cache(maxsize=None)
+def blob_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def acquire(name, count=1):
+    from .models import StoredBlob
+
+    if not blob_digest(name) or count < 1:
+        return
+    if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + count, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(name=name, size=document_storage().size(name), refcount=count)
+    except IntegrityError:
+        StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + count, updated_at=timezone.now())
+
+
+def release(name):
+    from .models import StoredBlob
+
+    if blob_digest(name):
+        StoredBlob.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F('refcount') - 1, updated_at=timezone.now(),
+        )
+
+
+def _stored_names(instance):
+    # Read from __dict__ so deferred fields are not loaded
+    return {field.attname: str(instance.__dict__.get(field.attname) or '') for field in blob_fields(type(instance))}
+
+
+@receiver(post_init, sender='core.Order')
+def _remember_blobs(sender, instance, **kwargs):
+    instance._stored_blobs = _stored_names(instance)
+
+
+@receiver(post_save, sender='core.Order')
+def _count_blobs(sender, instance, created, update_fields=None, **kwargs):
+    previous = {} if created else getattr(instance, '_stored_blobs', {})
+    current = _stored_names(instance)
+    for attname, name in current.items():
+        if update_fields is not None and attname not in update_fields:
+            current[attname] = previous.get(attname, '')
+            continue
+        if name != previous.get(attname, ''):
+            acquire(name)
+            release(previous.get(attname, ''))
+    instance._stored_blobs = current
+
+
+@receiver(post_delete, sender='core.Order')
+def _release_blobs(sender, instance, **kwargs):
+    for name in getattr(instance, '_stored_blobs', {}).values():
+        release(name)
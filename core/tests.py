@@ -1,3 +1,984 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.bulk_io import import_availability, ingest_events
+from core.customer_summary import get_customer_summary
+from core.dashboard_cache import ALL, CACHE_KEY
+from core.file_serving import parse_range
+from core import forecasting, live_updates, model_store, payment_uploads, pipeline_rollups
+from core.db_routers import PIN_COOKIE, _RoutingState, _state
+from core.instrumentation import PerformanceMiddleware, _install_query_timer, timed
+from core.linear_scorer import LinearScorer
+from core.live_updates import Subscription, audience, broker
+from core.metrics import CUSTOMER_EVENTS, OPERATION_DURATION
+from core.ml_model import ReliabilityModel
+from core.model_store import FEATURES
+from core.models import (
+    Availability, CustomerEvent, CustomerFeatures, Order, PaymentUpload, PipelineRollup, Product, StoredBlob, User,
+)
+from core.week_calendar import is_valid_week, week_start
+
+
+class TempMediaMixin:
+    """Stores documents under a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class IsoWeekTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hatchery = User.objects.create_user('hatchery', password='pw', role='hatchery')
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer')
+        cls.product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+
+    def test_weeks_per_year(self):
+        self.assertTrue(is_valid_week(2026, 53))
+        self.assertFalse(is_valid_week(2025, 53))
+        self.assertFalse(is_valid_week(2025, 0))
+        self.assertEqual(str(week_start(2025, 1)), '2024-12-30')
+
+    def test_api_rejects_week_outside_year(self):
+        client = APIClient()
+        client.force_authenticate(self.hatchery)
+        url = reverse('api_availability_list_create')
+        for week in (0, 53):
+            response = client.post(url, {
+                'product_id': self.product.id, 'year': 2025, 'week_number': week, 'available_quantity': 100,
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('week_number', response.json())
+        self.assertFalse(Availability.objects.exists())
+        response = client.post(url, {
+            'product_id': self.product.id, 'year': 2026, 'week_number': 53, 'available_quantity': 100,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['expected_ship_date'], '2026-12-28')
+
+    def test_invoice_shows_iso_year(self):
+        availability = Availability.objects.create(product=self.product, year=2025, week_number=1, available_quantity=1)
+        order = Order.objects.create(
+            customer=self.customer, availability=availability, quantity=20000,
+            ship_week=1, ship_date=availability.expected_ship_date,
+        )
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('view_downpayment_invoice', args=[order.id]))
+        self.assertContains(response, '1 of 2025')
+
+
+class OrderSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer')
+        cls.product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=Decimal('0.50'))
+        cls.availability = Availability.objects.create(
+            product=cls.product, year=2026, week_number=1, available_quantity=100000,
+        )
+
+    def test_snapshot_totals(self):
+        order = Order.objects.create(
+            customer=self.customer, availability=self.availability, quantity=20000, transport_cost=150,
+        )
+        order.approve()
+        order.save()
+        # Later price changes don't reach an approved order
+        Product.objects.filter(pk=self.product.pk).update(price=2)
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.unit_price, Decimal('0.50'))
+        self.assertEqual(order.subtotal_amount, Decimal('10000.00'))
+        self.assertEqual(order.total_amount, Decimal('10150.00'))
+        self.assertEqual(order.balance_amount, order.total_amount - order.downpayment_amount)
+        self.assertEqual(order.product_label, 'steelhead diploid 4mm')
+        self.assertEqual(order.ship_week, 1)
+        self.assertEqual(str(order.ship_date), '2025-12-29')
+
+    def test_pending_orders_carry_their_ship_week(self):
+        order = Order.objects.create(customer=self.customer, availability=self.availability, quantity=20000)
+        self.assertEqual((order.ship_week, order.product_label), (1, 'steelhead diploid 4mm'))
+        self.assertIsNone(order.total_amount)
+
+        sales = User.objects.create_user('sales', password='pw', role='sales')
+        cache.clear()
+        self.client.force_login(sales)
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('sales_dashboard'))
+        self.assertContains(response, '<td>1</td>', html=True)
+        self.assertFalse([q for q in queries.captured_queries if 'core_availability' in q['sql']])
+
+
+class SnapshotBackfillTests(TransactionTestCase):
+    before = [('core', '0010_query_indexes')]
+    after = [('core', '0011_order_snapshot_fields')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connections['default'])
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_backfill(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('core', 'User')
+        customer = User.objects.create(username='customer', role='customer')
+        product = apps.get_model('core', 'Product').objects.create(
+            type='steelhead', ploidy='diploid', diameter=4, price=Decimal('0.50'),
+        )
+        availability = apps.get_model('core', 'Availability').objects.create(
+            product=product, year=2026, week_number=1, available_quantity=100000,
+        )
+        OldOrder = apps.get_model('core', 'Order')
+        pending = OldOrder.objects.create(customer=customer, availability=availability, quantity=20000)
+        approved = OldOrder.objects.create(
+            customer=customer, availability=availability, quantity=20000, status='approved',
+            transport_cost=150, downpayment_amount=3000,
+        )
+
+        Order = self.migrate(self.after).get_model('core', 'Order')
+        pending, approved = Order.objects.get(pk=pending.pk), Order.objects.get(pk=approved.pk)
+        for order in (pending, approved):
+            self.assertEqual(order.product_label, 'steelhead diploid 4mm')
+            self.assertEqual(order.ship_week, 1)
+            # ISO week 1 of 2026 starts in December 2025
+            self.assertEqual(str(order.ship_date), '2025-12-29')
+        self.assertIsNone(pending.total_amount)
+        self.assertEqual(approved.unit_price, Decimal('0.50'))
+        self.assertEqual(approved.total_amount, Decimal('10150.00'))
+        self.assertEqual(approved.balance_amount, Decimal('7150.00'))
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer)
+        # The first view sets the CSRF cookie, which is part of the ETag
+        self.client.get(reverse('customer_dashboard'))
+
+    def revalidate(self, etag):
+        return self.client.get(reverse('customer_dashboard'), headers={'If-None-Match': etag})
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        etag = self.client.get(reverse('customer_dashboard'))['ETag']
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+
+    def test_versions_expire(self):
+        # Bumps made by other processes never reach a per-process cache; expiry bounds the staleness
+        etag = self.client.get(reverse('customer_dashboard'))['ETag']
+        later = time.time() + settings.DASHBOARD_FRAGMENT_SECONDS + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.revalidate(etag).status_code, 200)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica database (DB_REPLICA_NAME or DB_REPLICA_HOST)')
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not TestCase: its per-test atomic block would pin every read to the primary. The runner sets up
+    # every alias a test class names, skipped or not, so only name the replica when it is configured.
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        self.hatchery = User.objects.create_user('hatchery', password='pw', role='hatchery')
+        self.product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        self.client.force_login(self.hatchery)
+        # Start each test unpinned (the writes above pinned this context), as a fresh command would
+        self.token = _state.set(_RoutingState())
+
+    def tearDown(self):
+        _state.reset(self.token)
+
+    def queries(self, method, path, **kwargs):
+        """Queries (default, replica) that serving one request ran."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(Availability.objects.all().db, 'replica')
+        response, primary, replica = self.queries('get', reverse('api_availability_list_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+
+    def test_writes_and_atomic_blocks_use_the_primary(self):
+        with transaction.atomic():
+            self.assertEqual(Availability.objects.all().db, 'default')
+        self.assertEqual(Availability.objects.all().db, 'replica')
+        Availability.objects.create(product=self.product, year=2026, week_number=10, available_quantity=1)
+        # The rest of this command reads its own write
+        self.assertEqual(Availability.objects.all().db, 'default')
+
+    def test_pin_cookie_after_write(self):
+        response, _, replica = self.queries('post', reverse('api_availability_list_create'), data={
+            'product_id': self.product.id, 'year': 2026, 'week_number': 10, 'available_quantity': 100,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica, 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        # The test client sends the cookie back: the next read stays on the primary
+        response, primary, replica = self.queries('get', reverse('api_availability_list_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        # Once the cookie has expired, reads go back to the replica
+        self.client.cookies.pop(PIN_COOKIE)
+        _, primary, replica = self.queries('get', reverse('api_availability_list_create'))
+        self.assertGreater(replica, 0)
+
+    def order_queries(self, path, alias):
+        with CaptureQueriesContext(connections[alias]) as captured:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return [query for query in captured if 'core_order' in query['sql']]
+
+    def test_rebuilds_after_a_change_read_the_primary(self):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        availability = Availability.objects.create(product=self.product, year=2026, week_number=10, available_quantity=1)
+        sales = User.objects.create_user('sales', password='pw', role='sales')
+        cache.clear()
+        self.client.force_login(sales)
+        cache.clear()
+        old = time.time() - 60
+        cache.set_many({CACHE_KEY.format('orders'): old, CACHE_KEY.format(ALL): old}, None)
+        self.assertTrue(self.order_queries(reverse('sales_dashboard'), 'replica'))
+
+        # The bump makes the next view rebuild its fragments, which are then cached under the new version
+        Order.objects.create(customer=customer, availability=availability, quantity=20000)
+        self.assertFalse(self.order_queries(reverse('sales_dashboard'), 'replica'))
+
+        cache.clear()
+        with CaptureQueriesContext(connections['replica']) as replica:
+            get_customer_summary(customer.id)
+        self.assertEqual(len(replica), 0)
+
+
+class MetricsTests(TestCase):
+    def test_bulk_event_inserts_are_counted(self):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        before = CUSTOMER_EVENTS.values.get(('LOGIN',), 0)
+        ingest_events([(customer.id, 'LOGIN', timezone.now(), None, {})] * 3)
+        self.assertEqual(CUSTOMER_EVENTS.values[('LOGIN',)], before + 3)
+
+    def test_spans_are_not_exported_when_disabled(self):
+        operation = timed('test_operation')(lambda: 'done')
+        with override_settings(OPERATION_METRICS=False):
+            self.assertEqual(operation(), 'done')
+        self.assertNotIn(('test_operation',), OPERATION_DURATION.values)
+        operation()
+        self.assertEqual(OPERATION_DURATION.values[('test_operation',)][2], 1)
+
+
+class GenerateDataTests(TempMediaMixin, TestCase):
+    def test_reserves_stock_and_stores_placeholder_proofs(self):
+        year = timezone.now().year
+        call_command('generate_data', scale=0.02, start_year=year, end_year=year, stdout=StringIO())
+        stock = dict(Availability.objects.values_list('id', 'available_quantity'))
+        call_command('generate_data', scale=0.02, start_year=year, end_year=year, prefix='more_', seed=2,
+                     stdout=StringIO())
+        reserved = dict(
+            Order.objects.filter(customer__username__startswith='more_', status__in=['down_paid', 'confirmed', 'shipped'])
+            .values_list('availability_id').annotate(Sum('quantity'))
+        )
+        self.assertTrue(reserved)
+        for availability_id, quantity in Availability.objects.values_list('id', 'available_quantity'):
+            self.assertEqual(quantity, stock[availability_id] - reserved.get(availability_id, 0))
+
+        order = Order.objects.exclude(downpayment_proof='').exclude(downpayment_proof__isnull=True).first()
+        self.assertTrue(order.downpayment_proof.storage.exists(order.downpayment_proof.name))
+        references = sum(
+            Order.objects.filter(**{field: order.downpayment_proof.name}).count()
+            for field in ('downpayment_proof', 'fullpayment_proof')
+        )
+        self.assertEqual(StoredBlob.objects.get(name=order.downpayment_proof.name).refcount, references)
+        sales = User.objects.create_user('sales', password='pw', role='sales')
+        cache.clear()
+        self.client.force_login(sales)
+        response = self.client.get(reverse('order_document', args=[order.id, 'downpayment_proof']))
+        self.assertEqual(response.status_code, 200)
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_requests_serve_the_last_fit_and_refit_in_the_background(self):
+        fit = {'product_ids': []}
+        with mock.patch.object(forecasting, 'train', return_value=fit) as train, \
+                mock.patch.object(forecasting, '_get_executor') as executor:
+            self.assertIsNone(forecasting.get_model())
+            self.assertEqual(executor.return_value.submit.call_count, 1)
+            # Only one refit is queued until it finishes
+            forecasting.get_model()
+            self.assertEqual(executor.return_value.submit.call_count, 1)
+            train.assert_not_called()
+
+            # Run on the test thread, close_old_connections() would close the connection holding the test's
+            # transaction (an in-memory SQLite test database ignores it, PostgreSQL does not)
+            with mock.patch.object(forecasting, 'close_old_connections'):
+                forecasting._refit_in_background()
+            self.assertEqual(forecasting.get_model(), fit)
+            self.assertEqual(executor.return_value.submit.call_count, 1)
+
+            # A new order makes the fit stale: it is still served while the next refit is queued
+            customer = User.objects.create_user('customer', password='pw', role='customer')
+            product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+            availability = Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=1)
+            Order.objects.create(customer=customer, availability=availability, quantity=20000)
+            self.assertEqual(forecasting.get_model(), fit)
+            self.assertEqual(executor.return_value.submit.call_count, 2)
+            self.assertEqual(train.call_count, 1)
+
+    def order_weeks(self, products, weeks):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        # Only the products created here: migrations seed the catalogue
+        Product.objects.all().delete()
+        for number in range(products):
+            product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4 + number, price=1)
+            for week in range(1, weeks + 1):
+                availability = Availability.objects.create(
+                    product=product, year=2025, week_number=week, available_quantity=10 ** 6,
+                )
+                Order.objects.create(customer=customer, availability=availability, quantity=1000 + 37 * week % 500)
+
+    def test_single_product(self):
+        self.order_weeks(1, 30)
+        fitted = forecasting.train((2025, 30))
+        self.assertEqual(fitted['coef'].shape, (1, 2 * forecasting.HARMONICS + 1))
+        self.assertEqual(fitted['residual_std'].shape, (1,))
+        with mock.patch.object(forecasting, 'get_model', return_value=fitted):
+            lookup = forecasting.forecast_lookup(2026)
+            payload = forecasting.demand_forecast(2026)
+        self.assertEqual(len(lookup), 53)
+        [product] = payload['products']
+        for week in product['weeks']:
+            self.assertLessEqual(0, week['low'])
+            self.assertLessEqual(week['low'], week['forecast'])
+            self.assertLessEqual(week['forecast'], week['high'])
+
+    def test_closed_form_fit_matches_scikit_learn(self):
+        from sklearn.linear_model import Ridge
+
+        self.order_weeks(3, 20)
+        periods, _, Y = forecasting.demand_matrix((2025, 20))
+        years, weeks = np.array(periods).T
+        X = forecasting.period_features(years, weeks, 2025)
+        coef, intercept = forecasting.fit_ridge(X, Y)
+        model = Ridge(alpha=forecasting.RIDGE_ALPHA).fit(X, Y)
+        np.testing.assert_allclose(coef, model.coef_, rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(intercept, model.intercept_, rtol=1e-6)
+
+    def test_needs_a_residual_degree_of_freedom(self):
+        features = 2 * forecasting.HARMONICS + 1
+        self.order_weeks(1, features + 2)
+        self.assertIsNone(forecasting.train((2025, features + 1)))
+        self.assertTrue(np.isfinite(forecasting.train((2025, features + 2))['residual_std']).all())
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class OnlineFeatureTests(TestCase):
+    def test_features_follow_the_history(self):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=1)
+        order = Order.objects.create(customer=customer, availability=availability, quantity=20000)
+        orders = Order.objects.filter(pk=order.pk)
+
+        def event(event_type):
+            CustomerEvent.objects.create(user=customer, event_type=event_type, order=order)
+            features = CustomerFeatures.objects.get(pk=customer.pk)
+            self.assertEqual({field: getattr(features, field) for field in FEATURES},
+                             ReliabilityModel().extract_features(customer))
+            return features
+
+        event('ORDER_CREATED')
+        # A repeated event is not a second order
+        self.assertEqual(event('ORDER_CREATED').order_count, 1)
+        CustomerEvent.objects.create(user=customer, event_type='DOWN_PAYMENT_UPLOADED', order=order)
+        orders.update(status='down_paid', downpayment_proof='proofs/proof.pdf',
+                      downpayment_deadline=timezone.now() + timedelta(days=1))
+        self.assertEqual(event('DOWN_PAYMENT_VERIFIED').timely_payments, 1)
+        orders.update(status='cancelled')
+        self.assertEqual(event('ORDER_CANCELLED').timely_payments, 0)
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class ModelPromotionTests(TestCase):
+    def setUp(self):
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store, ignore_errors=True)
+        settings_override = override_settings(RELIABILITY_MODEL_DIR=store)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Ignore any legacy model in the working directory
+        for name, value in (('LEGACY_PARAMS', f'{store}/legacy.npz'), ('LEGACY_PATHS', (f'{store}/legacy.joblib',) * 2)):
+            patcher = mock.patch.object(model_store, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for number, score in enumerate((0.2, 0.5, 0.9)):
+            customer = User.objects.create_user(f'customer{number}', password='pw', role='customer')
+            User.objects.filter(pk=customer.pk).update(reliability_score=score)
+            CustomerEvent.objects.bulk_create(
+                [CustomerEvent(user=customer, event_type='LOGIN') for _ in range(number + 1)]
+            )
+
+    def update(self, *args):
+        call_command('update_reliability_scores', *args, stdout=StringIO())
+
+    def test_retrains_go_to_the_candidate_slot(self):
+        # The first version has nothing to be compared with
+        self.update()
+        first = model_store.current_version()
+        self.assertIsNotNone(first)
+
+        self.update()
+        candidate = model_store.candidate_version()
+        self.assertNotEqual(candidate, first)
+        self.assertEqual(model_store.current_version(), first)
+
+        self.update('--auto-promote', '--min-correlation', '2')
+        self.assertEqual(model_store.current_version(), first)
+        rejected = model_store.candidate_version()
+        self.assertFalse(model_store.metadata(rejected)['comparisons'][-1]['promoted'])
+
+        self.update('--auto-promote', '--max-mean-diff', '1', '--min-correlation', '-1')
+        promoted = model_store.current_version()
+        self.assertNotIn(promoted, (first, candidate, rejected))
+        self.assertIsNone(model_store.candidate_version())
+
+    def test_scorers_must_match_the_feature_schema(self):
+        directory = os.path.join(model_store.store_dir(), 'versions', 'reordered')
+        os.makedirs(directory)
+        LinearScorer(FEATURES[::-1], [0] * 4, [1] * 4, [1, 2, 3, 4], 0).save(os.path.join(directory, model_store.PARAMS))
+        with self.assertRaises(ValueError):
+            model_store.load_scorer('reordered')
+
+
+class PaymentUploadTests(TempMediaMixin, TestCase):
+    data = b'%PDF-1.4 proof of payment\n' * 3
+
+    def setUp(self):
+        super().setUp()
+        parts = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parts, ignore_errors=True)
+        upload_settings = override_settings(PAYMENT_UPLOAD_DIR=parts, PAYMENT_UPLOAD_CHUNK_SIZE=32)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=1)
+        self.order = Order.objects.create(customer=customer, availability=availability, quantity=20000)
+        Order.objects.filter(pk=self.order.pk).update(status='approved')
+        self.client = APIClient()
+        self.client.force_authenticate(customer)
+
+    def start(self):
+        response = self.client.post(reverse('api_payment_upload_create', args=[self.order.id]), {
+            'kind': 'downpayment', 'filename': 'proof.pdf', 'size': len(self.data),
+            'sha256': hashlib.sha256(self.data).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return PaymentUpload.objects.get(pk=response.json()['id'])
+
+    def put(self, upload, start, end):
+        return self.client.put(
+            reverse('api_payment_upload', args=[upload.id]), self.data[start:end + 1],
+            content_type='application/octet-stream', headers={'Content-Range': f'bytes {start}-{end}/{len(self.data)}'},
+        )
+
+    def send(self, upload):
+        for start in range(0, len(self.data), 32):
+            self.assertEqual(self.put(upload, start, min(start + 31, len(self.data) - 1)).status_code, 200)
+
+    def complete(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('api_payment_upload_complete', args=[upload.id]))
+
+    def test_chunks_resume_at_the_stored_offset(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload, 0, 31).status_code, 200)
+        response = self.put(upload, 64, 77)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 32)
+        self.assertEqual(self.put(upload, 0, 63).status_code, 413)
+        self.assertEqual(self.complete(upload).status_code, 409)
+        self.assertEqual(self.put(upload, 32, 63).status_code, 200)
+        self.assertEqual(self.put(upload, 64, len(self.data) - 1).status_code, 200)
+        self.assertEqual(self.complete(upload).status_code, 200)
+
+        order = Order.objects.get(pk=self.order.pk)
+        with order.downpayment_proof.open('rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertEqual(StoredBlob.objects.get(name=order.downpayment_proof.name).refcount, 1)
+        self.assertFalse(os.path.exists(payment_uploads.part_path(upload)))
+        self.assertEqual(self.complete(upload).status_code, 409)
+
+    def test_failed_finalize_can_be_retried(self):
+        upload = self.start()
+        self.send(upload)
+        upload.refresh_from_db()
+        with mock.patch.object(Order, 'save', side_effect=DatabaseError('connection lost')):
+            with self.assertRaises(DatabaseError):
+                payment_uploads.finalize(upload)
+        upload.refresh_from_db()
+        self.assertIsNone(upload.completed_at)
+        self.assertTrue(os.path.exists(payment_uploads.part_path(upload)))
+        self.assertEqual(self.complete(upload).status_code, 200)
+
+    def test_missing_part_asks_for_a_new_upload(self):
+        upload = self.start()
+        self.send(upload)
+        os.remove(payment_uploads.part_path(upload))
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('start a new upload', response.json()['detail'])
+
+    def test_corrupted_upload_is_discarded(self):
+        upload = self.start()
+        self.send(upload)
+        with open(payment_uploads.part_path(upload), 'r+b') as fh:
+            fh.write(b'X')
+        self.assertEqual(self.complete(upload).status_code, 422)
+        self.assertFalse(PaymentUpload.objects.filter(pk=upload.pk).exists())
+
+
+class BlobStoreTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=1)
+        self.orders = [
+            Order.objects.create(customer=customer, availability=availability, quantity=20000) for _ in range(2)
+        ]
+
+    def refcount(self, name):
+        return StoredBlob.objects.get(name=name).refcount
+
+    def test_identical_documents_share_a_counted_blob(self):
+        first, second = self.orders
+        first.downpayment_proof.save('proof.pdf', ContentFile(b'same bytes'))
+        second.downpayment_proof.save('other name.PDF', ContentFile(b'same bytes'))
+        shared = first.downpayment_proof.name
+        self.assertEqual(second.downpayment_proof.name, shared)
+        self.assertRegex(shared, r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        self.assertEqual(self.refcount(shared), 2)
+
+        second.downpayment_proof.save('proof.pdf', ContentFile(b'new bytes'))
+        self.assertEqual(self.refcount(shared), 1)
+        self.assertEqual(self.refcount(second.downpayment_proof.name), 1)
+        first.delete()
+        self.assertEqual(self.refcount(shared), 0)
+        # Released blobs stay on disk until gc_blobs collects them
+        self.assertTrue(first.downpayment_proof.storage.exists(shared))
+
+        call_command('gc_blobs', grace_hours=0, stdout=StringIO())
+        self.assertFalse(StoredBlob.objects.filter(name=shared).exists())
+        self.assertFalse(second.downpayment_proof.storage.exists(shared))
+        self.assertTrue(second.downpayment_proof.storage.exists(second.downpayment_proof.name))
+
+    def test_gc_recounts_references_from_the_orders(self):
+        first, second = self.orders
+        first.downpayment_proof.save('proof.pdf', ContentFile(b'bytes'))
+        name = first.downpayment_proof.name
+        # Queryset updates send no signals
+        Order.objects.filter(pk=second.pk).update(fullpayment_proof=name)
+        self.assertEqual(self.refcount(name), 1)
+        call_command('gc_blobs', grace_hours=0, stdout=StringIO())
+        self.assertEqual(self.refcount(name), 2)
+        self.assertTrue(first.downpayment_proof.storage.exists(name))
+
+
+class DocumentServingTests(TempMediaMixin, TestCase):
+    data = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=1)
+        order = Order.objects.create(customer=customer, availability=availability, quantity=20000)
+        order.downpayment_proof.save('proof.pdf', ContentFile(self.data))
+        self.url = reverse('order_document', args=[order.id, 'downpayment_proof'])
+        self.etag = f'"{hashlib.sha256(self.data).hexdigest()}"'
+        self.client.force_login(customer)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+        self.assertEqual(parse_range('bytes=100-', 100), 'invalid')
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('bytes=-', 100))
+
+    def test_whole_file_and_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': self.etag}).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=5000-'}).status_code, 416)
+        # A stale If-Range validator gets the whole, current file
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(FILE_SERVING_BACKEND='nginx', FILE_SERVING_ACCEL_PREFIX='/protected-media/')
+    def test_front_server_hand_off(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Accel-Redirect'].startswith('/protected-media/blobs/'))
+        self.assertEqual(response.content, b'')
+
+    def test_other_customers_are_refused(self):
+        self.client.force_login(User.objects.create_user('other', password='pw', role='customer'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+@override_settings(PERF_INSTRUMENTATION=True)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer')
+
+    def setUp(self):
+        # Under ASGI the ORM calls run on a fresh thread per request, whose connections open after the middleware
+        # loaded; here they run on the test thread, connected since the test database was set up
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+
+    def queries(self, response):
+        return int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+    def test_sync_requests(self):
+        self.client.force_login(self.customer)
+        self.assertGreater(self.queries(self.client.get(reverse('customer_dashboard'))), 0)
+
+    async def test_async_requests(self):
+        async def view(request):
+            pass
+        # An async chain stays async: no thread switch for this middleware under ASGI
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(view)))
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get(reverse('async_customer_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.queries(response), 0)
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class AsyncOrderApiTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sales = User.objects.create_user('sales', password='pw', role='sales', email='sales@example.com')
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer', email='c@example.com')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        cls.availability = Availability.objects.create(
+            product=product, year=2026, week_number=1, available_quantity=100000,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(customer=self.customer, availability=self.availability, quantity=20000)
+
+    def basic(self, username, password='pw'):
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        return {'Authorization': f'Basic {credentials}'}
+
+    def post(self, name, **kwargs):
+        return self.async_client.post(reverse(name, args=[self.order.id]), **kwargs)
+
+    async def test_basic_auth_and_roles(self):
+        response = await self.post('api_async_order_approve')
+        self.assertEqual(response.status_code, 403)
+        response = await self.post('api_async_order_approve', headers=self.basic('sales', 'wrong'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.post('api_async_order_approve', headers=self.basic('customer'))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual((await Order.objects.aget(pk=self.order.pk)).status, 'pending')
+
+        response = await self.post('api_async_order_approve', headers=self.basic('sales'))
+        self.assertEqual(response.status_code, 200)
+        order = await Order.objects.aget(pk=self.order.pk)
+        self.assertEqual(order.status, 'approved')
+        self.assertTrue(order.downpayment_transaction_id.startswith('DP-'))
+        self.assertTrue(order.downpayment_invoice)
+        self.assertTrue(await CustomerEvent.objects.filter(order=order, event_type='ORDER_APPROVED').aexists())
+        # Only pending orders can be approved
+        response = await self.post('api_async_order_approve', headers=self.basic('sales'))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_session_needs_csrf_token(self):
+        self.async_client = self.async_client_class(enforce_csrf_checks=True)
+        await self.async_client.aforce_login(self.sales)
+        response = await self.post('api_async_order_ship')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF Failed', response.json()['detail'])
+
+        await Order.objects.filter(pk=self.order.pk).aupdate(status='confirmed')
+        token = 'a' * 32
+        self.async_client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = await self.post('api_async_order_ship', headers={'X-CSRFToken': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Order.objects.aget(pk=self.order.pk)).status, 'shipped')
+        self.assertTrue(await CustomerEvent.objects.filter(order=self.order, event_type='ORDER_SHIPPED').aexists())
+
+
+@override_settings(RELIABILITY_SCORING='off', LIVE_UPDATES_BACKEND='local')
+class LiveUpdatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        cls.availability = Availability.objects.create(
+            product=product, year=2026, week_number=1, available_quantity=100000,
+        )
+
+    def test_audience(self):
+        own, other = self.customer.id, self.customer.id + 1
+        events = {
+            'own_order': {'kind': 'order', 'data': {'customer_id': own}},
+            'other_order': {'kind': 'order', 'data': {'customer_id': other}},
+            'availability': {'kind': 'availability', 'data': {}},
+            'own_event': {'kind': 'customer_event', 'data': {'user_id': own}},
+            'other_event': {'kind': 'customer_event', 'data': {'user_id': other}},
+        }
+
+        def received(user):
+            accepts = audience(user)
+            return {name for name, event in events.items() if accepts(event)}
+
+        self.assertEqual(received(User(role='sales')), set(events))
+        self.assertEqual(received(User(role='hatchery')), {'own_order', 'other_order', 'availability'})
+        self.assertEqual(received(self.customer), {'own_order', 'availability', 'own_event'})
+
+    async def test_overflow_asks_for_a_reload(self):
+        subscription = Subscription(asyncio.get_running_loop(), lambda event: True)
+        for i in range(live_updates.QUEUE_SIZE + 5):
+            subscription.put({'kind': 'order', 'data': {'id': i}})
+        self.assertTrue(subscription.overflowed)
+        events = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        self.assertEqual(len(events), live_updates.QUEUE_SIZE)
+        self.assertIsNone(events[-1])
+
+    def test_saves_publish_after_commit(self):
+        with mock.patch('core.live_updates._send') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                order = Order.objects.create(customer=self.customer, availability=self.availability, quantity=20000)
+            with self.captureOnCommitCallbacks(execute=True):
+                order.approve()
+                order.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                # No transition: nothing to publish
+                order.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                CustomerEvent.objects.create(user=self.customer, event_type='ORDER_APPROVED', order=order)
+                self.availability.available_quantity = 80000
+                self.availability.save()
+        events = [call.args[0] for call in send.call_args_list]
+        self.assertEqual(
+            [(event['kind'], event['data'].get('status'), event['data'].get('previous')) for event in events],
+            [('order', 'pending', None), ('order', 'approved', 'pending'),
+             ('customer_event', None, None), ('availability', None, None)],
+        )
+        self.assertEqual(events[1]['data']['week'], 1)
+        self.assertEqual(events[3]['data']['available_quantity'], 80000)
+
+    async def test_local_backend_delivers_to_matching_streams(self):
+        subscription = broker.subscribe(audience(self.customer))
+        self.addCleanup(broker.unsubscribe, subscription)
+        live_updates._send({'kind': 'order', 'data': {'customer_id': self.customer.id + 1}})
+        live_updates._send({'kind': 'order', 'data': {'customer_id': self.customer.id}})
+        event = await asyncio.wait_for(subscription.queue.get(), 1)
+        self.assertEqual(event['data']['customer_id'], self.customer.id)
+        self.assertTrue(subscription.queue.empty())
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class PipelineRollupTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        self.weeks = [
+            Availability.objects.create(product=product, year=2026, week_number=week, available_quantity=10 ** 6)
+            for week in (1, 2)
+        ]
+
+    def order(self, availability, status='pending'):
+        order = Order.objects.create(customer=self.customer, availability=availability, quantity=20000)
+        self.event(order, 'ORDER_CREATED')
+        if status != 'pending':
+            order.approve()
+            order.save()
+            self.event(order, 'ORDER_APPROVED')
+            Order.objects.filter(pk=order.pk).update(status=status)
+        return order
+
+    def event(self, order, event_type):
+        CustomerEvent.objects.create(user=self.customer, event_type=event_type, order=order)
+
+    def assertMatchesOrders(self):
+        fields = ('year', 'week_number', 'strain', 'status', 'order_count', 'quantity', 'amount')
+        direct = (
+            Order.objects.values('status', year=F('availability__year'), week_number=F('availability__week_number'),
+                                 strain=F('availability__product__type'))
+            .annotate(order_count=Count('id'), quantity=Sum('quantity'), amount=Sum('total_amount', default=0))
+        )
+        self.assertEqual(
+            sorted(PipelineRollup.objects.values_list(*fields)),
+            sorted(tuple(row[field] for field in fields) for row in direct),
+        )
+
+    def test_refresh_matches_orders(self):
+        self.order(self.weeks[0])
+        self.order(self.weeks[0], 'confirmed')
+        self.order(self.weeks[1], 'approved')
+        with mock.patch.object(pipeline_rollups, 'SETTLE_SECONDS', 0):
+            self.assertEqual(pipeline_rollups.refresh(), 2)
+        self.assertMatchesOrders()
+
+        # Only the bucket with new events is rebuilt once the watermark has passed the old ones
+        pending = Order.objects.get(status='pending')
+        Order.objects.filter(pk=pending.pk).update(status='cancelled')
+        self.event(pending, 'ORDER_CANCELLED')
+        self.assertEqual(pipeline_rollups.refresh(), 1)
+        self.assertMatchesOrders()
+        # Events inside the settle window are read again by the next refresh
+        self.assertEqual(pipeline_rollups.refresh(), 1)
+
+        report = pipeline_rollups.pipeline_report(2026)
+        self.assertEqual(report['totals']['confirmed']['orders'], 1)
+        self.assertEqual(report['revenue'], Order.objects.get(status='confirmed').total_amount)
+        self.assertEqual([week['week_number'] for week in report['weeks']], [1, 2])
+        self.assertEqual(report['weeks'][0]['conversions']['ORDER_CREATED->ORDER_APPROVED']['orders'], 1)
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class ReconcilePaymentsTests(TempMediaMixin, TestCase):
+    def test_only_orders_with_a_proof_are_verified(self):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(
+            product=product, year=2026, week_number=1, available_quantity=100000,
+        )
+        unpaid, paid = [
+            Order.objects.create(customer=customer, availability=availability, quantity=20000) for _ in range(2)
+        ]
+        for order in (unpaid, paid):
+            order.approve()
+            order.downpayment_transaction_id = f'DP-{order.id}'
+            order.save()
+        paid.downpayment_proof.save('proof.pdf', ContentFile(b'proof'))
+
+        call_command('reconcile_payments', stdout=StringIO())
+        self.assertEqual(Order.objects.get(pk=unpaid.pk).status, 'approved')
+        self.assertEqual(Order.objects.get(pk=paid.pk).status, 'down_paid')
+        self.assertEqual(Availability.objects.get(pk=availability.pk).available_quantity, 80000)
+
+
+@override_settings(RELIABILITY_SCORING='off')
+class SweepExpiredOrdersTests(TestCase):
+    def test_expired_orders_are_cancelled(self):
+        customer = User.objects.create_user('customer', password='pw', role='customer')
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        availability = Availability.objects.create(
+            product=product, year=2026, week_number=1, available_quantity=100000,
+        )
+        past, future = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        orders = {}
+        for name, status, deadlines in [
+            ('approved_expired', 'approved', {'downpayment_deadline': past}),
+            ('approved_open', 'approved', {'downpayment_deadline': future}),
+            ('down_paid_expired', 'down_paid', {'downpayment_deadline': past, 'fullpayment_deadline': past}),
+            ('down_paid_open', 'down_paid', {'downpayment_deadline': past, 'fullpayment_deadline': future}),
+        ]:
+            order = Order.objects.create(customer=customer, availability=availability, quantity=20000)
+            # The sweep releases what down payments reserved, so stock is taken for down_paid orders only
+            Order.objects.filter(pk=order.pk).update(status=status, downpayment_amount=3000, **deadlines)
+            orders[name] = order
+        Availability.objects.filter(pk=availability.pk).update(available_quantity=60000)
+
+        out = StringIO()
+        call_command('sweep_expired_orders', stdout=out)
+        self.assertIn('Cancelled 2 expired order(s); released 20000 eggs', out.getvalue())
+        statuses = {name: Order.objects.get(pk=order.pk).status for name, order in orders.items()}
+        self.assertEqual(statuses, {
+            'approved_expired': 'cancelled',
+            'approved_open': 'approved',
+            'down_paid_expired': 'cancelled',
+            'down_paid_open': 'down_paid',
+        })
+        self.assertEqual(Availability.objects.get(pk=availability.pk).available_quantity, 80000)
+        events = CustomerEvent.objects.filter(event_type='ORDER_CANCELLED').order_by('order_id')
+        self.assertEqual(
+            [(event.order_id, event.metadata['reason'], event.metadata['released_quantity']) for event in events],
+            [
+                (orders['approved_expired'].pk, 'downpayment_deadline_expired', 0),
+                (orders['down_paid_expired'].pk, 'fullpayment_deadline_expired', 20000),
+            ],
+        )
+
+
+class ImportAvailabilityTests(TestCase):
+    def test_a_bad_row_imports_nothing(self):
+        product = Product.objects.create(type='steelhead', ploidy='diploid', diameter=4, price=1)
+        Availability.objects.create(product=product, year=2026, week_number=1, available_quantity=5)
+
+        def rows():
+            # import_availability raises CommandError from inside the row generator, as here
+            for week in range(1, 4):
+                yield product.id, 2026, week, 100
+            raise CommandError('Line 5: 2025 has only 52 ISO weeks, not week 53')
+
+        # Small chunks: the first ones are written before the bad row is read
+        with self.assertRaises(CommandError):
+            import_availability(rows(), chunk_size=2)
+        self.assertEqual(list(Availability.objects.values_list('week_number', 'available_quantity')), [(1, 5)])
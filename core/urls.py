@@ -1,7 +1,7 @@
 # core/urls.py
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views, api_views
+from . import views, api_views, async_views
 
 urlpatterns = [
     # Authentication URLs
@@ -24,8 +24,13 @@ urlpatterns = [
 
     # Role-specific dashboards
     path('sales/', views.sales_dashboard, name='sales_dashboard'),
+    path('sales/customers/<int:customer_id>/', views.sales_customer_detail, name='sales_customer_detail'),
     path('hatchery/', views.hatchery_dashboard, name='hatchery_dashboard'),
     path('customer/', views.customer_dashboard, name='customer_dashboard'),
+    # ASGI-native dashboards, see core/async_views.py
+    path('async/sales/', async_views.sales_dashboard, name='async_sales_dashboard'),
+    path('async/customer/', async_views.customer_dashboard, name='async_customer_dashboard'),
+    path('live/', async_views.live_updates, name='live_updates'),
 
     # Order workflow URLs
     path('approve_order/<int:order_id>/', views.approve_order, name='approve_order'),
@@ -39,6 +44,7 @@ urlpatterns = [
     path('upload_full_payment/<int:order_id>/', views.upload_full_payment, name='upload_full_payment'),
     path('request_order/', views.request_order, name='request_order'),
     path('view_invoice/<int:order_id>/', views.view_invoice, name='view_invoice'),
+    path('order/<int:order_id>/documents/<str:document>/', views.view_order_document, name='order_document'),
 
     # Registration
     path('register/', views.register, name='register'),
@@ -46,6 +52,10 @@ urlpatterns = [
     # Hatchery management
     path('update_availability/', views.update_availability, name='update_availability'),
 
+    # Operations
+    path('metrics', views.prometheus_metrics, name='prometheus_metrics'),
+    path('metrics/performance/', views.performance_metrics, name='performance_metrics'),
+
     # API endpoints
     path('api/users/', api_views.UserListView.as_view(), name='api_user_list'),
     path('api/products/', api_views.ProductListCreateView.as_view(), name='api_product_list_create'),
@@ -59,5 +69,20 @@ urlpatterns = [
          api_views.OrderVerifyFullPaymentView.as_view(),
          name='api_order_verify_full_payment'),
     path('api/orders/<int:order_id>/ship/', api_views.OrderShipView.as_view(), name='api_order_ship'),
+    path('api/async/orders/<int:order_id>/approve/', async_views.order_approve, name='api_async_order_approve'),
+    path('api/async/orders/<int:order_id>/verify-down-payment/', async_views.order_verify_down_payment,
+         name='api_async_order_verify_down_payment'),
+    path('api/async/orders/<int:order_id>/verify-full-payment/', async_views.order_verify_full_payment,
+         name='api_async_order_verify_full_payment'),
+    path('api/async/orders/<int:order_id>/ship/', async_views.order_ship, name='api_async_order_ship'),
+    path('api/orders/<int:order_id>/payment-uploads/', api_views.PaymentUploadCreateView.as_view(),
+         name='api_payment_upload_create'),
+    path('api/payment-uploads/<uuid:upload_id>/', api_views.PaymentUploadView.as_view(), name='api_payment_upload'),
+    path('api/payment-uploads/<uuid:upload_id>/complete/', api_views.PaymentUploadCompleteView.as_view(),
+         name='api_payment_upload_complete'),
+    path('api/customers/<int:customer_id>/summary/', api_views.CustomerSummaryView.as_view(),
+         name='api_customer_summary'),
+    path('api/analytics/pipeline/', api_views.PipelineAnalyticsView.as_view(), name='api_pipeline_analytics'),
+    path('api/forecasts/demand/', api_views.DemandForecastView.as_view(), name='api_demand_forecast'),
     path('api/customer-events/', api_views.CustomerEventListView.as_view(), name='api_customer_event_list'),
 ]
\ No newline at end of file
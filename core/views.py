@@ -1,11 +1,13 @@
 # core/views.py
-from datetime import datetime
+import os
 from decimal import Decimal
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden, FileResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from collections import defaultdict
 from django.core.mail import send_mail
 from django.conf import settings
@@ -16,13 +18,18 @@ from .forms import OrderApprovalForm, DownPaymentForm, FullPaymentForm, OrderReq
     AvailabilityForm
 from .models import User, Product, Availability, Order, CustomerEvent
 from .payment import PaymentAdapter
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from .customer_summary import get_customer_summary
+from .forecasting import forecast_lookup
+from . import week_calendar
+from .instrumentation import timed, metrics_store
+from .metrics import registry
 from io import BytesIO
 from django.core.files import File
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from functools import partial
+from .dashboard_cache import conditional_dashboard, customer_scope, request_versions
+from .file_serving import serve_document
 
 def sales_required(view_func):
     return user_passes_test(lambda u: u.role == 'sales')(view_func)
@@ -62,15 +69,48 @@ def dashboard(request):
         return customer_dashboard(request)
     return HttpResponseForbidden()
 
+# Version scopes each dashboard renders from (see core/dashboard_cache.py)
+def sales_dashboard_scopes(request, *args, **kwargs):
+    return {'orders': 'orders'}
+
+def customer_dashboard_scopes(request, *args, **kwargs):
+    return {'availability': 'availability', 'mine': customer_scope(request.user.pk)}
+
+def hatchery_dashboard_scopes(request, *args, **kwargs):
+    return {'availability': 'availability', 'orders': 'orders'}
+
+def availability_view_scopes(request, *args, **kwargs):
+    return {'availability': 'availability'}
+
+def dashboard_cache_context(request, scopes):
+    return {
+        'versions': request_versions(request, **scopes(request)),
+        'fragment_seconds': getattr(settings, 'DASHBOARD_FRAGMENT_SECONDS', 600),
+    }
+
 @sales_required
+@conditional_dashboard(sales_dashboard_scopes)
 def sales_dashboard(request):
-    pending_orders = Order.objects.filter(status='pending')
-    confirmed_orders = Order.objects.filter(status='confirmed').order_by('-confirmed_at')[:10]
-    shipped_orders = Order.objects.filter(status='shipped')[:5]
+    # Querysets stay lazy: they only run when their {% cache %} fragment is rebuilt
+    # Orders carry product_label and ship_week from creation, so only the customer needs joining
+    pending_orders = Order.objects.filter(status='pending').select_related('customer')
+    confirmed_orders = Order.objects.filter(status='confirmed').select_related('customer').order_by('-confirmed_at')[:10]
+    shipped_orders = Order.objects.filter(status='shipped').select_related('customer')[:5]
     return render(request, 'sales_dashboard.html', {
         'pending_orders': pending_orders,
         'confirmed_orders': confirmed_orders,
         'shipped_orders': shipped_orders,
+        **dashboard_cache_context(request, sales_dashboard_scopes),
+    })
+
+@sales_required
+def sales_customer_detail(request, customer_id):
+    customer = get_object_or_404(User, id=customer_id, role='customer')
+    recent_orders = Order.objects.filter(customer=customer).select_related('availability__product').order_by('-created_at')[:20]
+    return render(request, 'sales_customer_detail.html', {
+        'customer': customer,
+        'summary': get_customer_summary(customer.id),
+        'recent_orders': recent_orders,
     })
 
 @sales_required
@@ -119,7 +159,7 @@ def verify_down_payment(request, order_id):
             payment_result = payment_adapter.request_full_payment(order)
             if payment_result['success']:
                 order.fullpayment_transaction_id = payment_result['transaction_id']
-                order.fullpayment_amount = order.calculate_total() - order.downpayment_amount
+                order.fullpayment_amount = order.balance
                 order.save()
                 full_invoice = generate_invoice(order)
                 order.invoice.save(f"invoice_{order.id}.pdf", full_invoice)
@@ -180,17 +220,11 @@ def ship_order(request, order_id):
         return redirect('sales_dashboard')
     return render(request, 'ship_order.html', {'order': order})
 
-@login_required
-def availability_view(request):
-    year = int(request.GET.get('year', 2025))
-    availabilities = Availability.objects.filter(year=year).order_by('week_number')
-    years = range(2020, 2031)  # List of years from 2020 to 2030
-
-    weeks = range(1, 53)
-    products = Product.objects.all().order_by('type', 'ploidy', 'diameter')
+def availability_table(year, products):
+    weeks = range(1, week_calendar.weeks_in_year(year) + 1)
     pivot_data = defaultdict(lambda: defaultdict(int))
-    for avail in availabilities:
-        pivot_data[avail.week_number][avail.product.id] = avail.available_quantity
+    for avail in Availability.objects.filter(year=year).order_by('week_number'):
+        pivot_data[avail.week_number][avail.product_id] = avail.available_quantity
 
     table_data = []
     for week in weeks:
@@ -199,31 +233,49 @@ def availability_view(request):
             quantity = pivot_data[week].get(product.id, 0)
             row.append(quantity)
         table_data.append(row)
+    return table_data
+
+@login_required
+@conditional_dashboard(availability_view_scopes)
+def availability_view(request):
+    year = int(request.GET.get('year', 2025))
+    years = range(2020, 2031)  # List of years from 2020 to 2030
+    products = SimpleLazyObject(lambda: list(Product.objects.all().order_by('type', 'ploidy', 'diameter')))
 
     return render(request, 'availability_view.html', {
         'year': year,
         'years': years,
-        'weeks': weeks,
         'products': products,
-        'table_data': table_data,
+        # Built only when the table fragment is not cached
+        'table_data': SimpleLazyObject(lambda: availability_table(year, products)),
+        **dashboard_cache_context(request, availability_view_scopes),
     })
 
 
+def hatchery_rows(year):
+    availabilities = list(Availability.objects.filter(year=year).select_related('product').order_by('week_number'))
+    forecasts = forecast_lookup(year)
+    for avail in availabilities:
+        avail.forecast = forecasts.get((avail.product_id, avail.week_number))
+    return availabilities
+
 @login_required
 @hatchery_required
+@conditional_dashboard(hatchery_dashboard_scopes)
 def hatchery_dashboard(request):
     year = int(request.GET.get('year', 2025))
-    availabilities = Availability.objects.filter(year=year).order_by('week_number')
     years = range(2020, 2031)  # List of years from 2020 to 2030
     form = AvailabilityForm(request.POST or None)
     if request.method == 'POST' and form.is_valid():
         availability = form.save()
         return redirect('hatchery_dashboard')
     return render(request, 'hatchery_dashboard.html', {
-        'availabilities': availabilities,
+        # Forecasts depend on orders, so the table is keyed on both versions
+        'availabilities': SimpleLazyObject(lambda: hatchery_rows(year)),
         'year': year,
         'years': years,
         'form': form,
+        **dashboard_cache_context(request, hatchery_dashboard_scopes),
     })
 
 @hatchery_required
@@ -236,12 +288,12 @@ def update_availability(request):
         else:
             products = Product.objects.all()
             year = request.POST.get('year', 2025)
-            availabilities = Availability.objects.filter(year=year).order_by('week_number')
+            availabilities = Availability.objects.filter(year=year).select_related('product').order_by('week_number')
             availability_data = [
                 {
                     'product': avail.product,
                     'week_number': avail.week_number,
-                    'week_start_date': datetime.datetime.strptime(f"{avail.year}-{avail.week_number}-1", "%Y-%W-%w").date(),
+                    'expected_ship_date': avail.expected_ship_date,
                     'available_quantity': avail.available_quantity,
                 } for avail in availabilities
             ]
@@ -254,16 +306,19 @@ def update_availability(request):
     return redirect('hatchery_dashboard')
 
 @customer_required
+@conditional_dashboard(customer_dashboard_scopes)
 def customer_dashboard(request):
     reservations = Order.objects.filter(customer=request.user, status__in=['approved', 'down_paid'])
     confirmed_orders = Order.objects.filter(customer=request.user, status='confirmed')
     shipped_orders = Order.objects.filter(customer=request.user, status='shipped')
-    available_batches = Availability.objects.filter(available_quantity__gt=0)
+    available_batches = Availability.objects.filter(available_quantity__gt=0).select_related('product')
     return render(request, 'customer_dashboard.html', {
         'available_batches': available_batches,
         'reservations': reservations,
         'confirmed_orders': confirmed_orders,
         'shipped_orders': shipped_orders,
+        'summary': SimpleLazyObject(partial(get_customer_summary, request.user.id)),
+        **dashboard_cache_context(request, customer_dashboard_scopes),
     })
 
 @customer_required
@@ -286,7 +341,8 @@ def upload_down_payment(request, order_id):
     return render(request, 'upload_payment.html', {
         'form': form,
         'order': order,
-        'payment_type': 'down payment'
+        'payment_type': 'down payment',
+        'upload_kind': 'downpayment',
     })
 
 @customer_required
@@ -309,7 +365,8 @@ def upload_full_payment(request, order_id):
     return render(request, 'upload_payment.html', {
         'form': form,
         'order': order,
-        'payment_type': 'full payment'
+        'payment_type': 'full payment',
+        'upload_kind': 'fullpayment',
     })
 
 @login_required
@@ -317,16 +374,53 @@ def view_invoice(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     if not (request.user.role == 'sales' or (request.user.role == 'customer' and request.user == order.customer)):
         return HttpResponseForbidden()
-    return FileResponse(
-        order.invoice,
-        as_attachment=False,
-        filename=f"invoice_{order.id}.pdf",
-        content_type='application/pdf'
-    )
+    return serve_document(request, order.invoice, f"invoice_{order.id}.pdf", 'application/pdf')
+
+# document -> download name; proofs keep the extension they were uploaded with
+ORDER_DOCUMENTS = {
+    'downpayment_invoice': 'downpayment_invoice_{id}.pdf',
+    'downpayment_proof': 'downpayment_proof_{id}{ext}',
+    'fullpayment_proof': 'fullpayment_proof_{id}{ext}',
+}
+
+@login_required
+def view_order_document(request, order_id, document):
+    if document not in ORDER_DOCUMENTS:
+        raise Http404
+    order = get_object_or_404(Order.objects.only('id', 'customer_id', document), id=order_id)
+    if not (request.user.role == 'sales' or (request.user.role == 'customer' and request.user.id == order.customer_id)):
+        return HttpResponseForbidden()
+    fieldfile = getattr(order, document)
+    filename = ORDER_DOCUMENTS[document].format(id=order.id, ext=os.path.splitext(fieldfile.name or '')[1])
+    return serve_document(request, fieldfile, filename)
+
+@staff_member_required
+def performance_metrics(request):
+    return JsonResponse({
+        'enabled': settings.PERF_INSTRUMENTATION,
+        'views': metrics_store.snapshot(),
+    })
 
+def prometheus_metrics(request):
+    # Scrapers authenticate with METRICS_TOKEN; without one, only staff sessions may read metrics
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@timed('invoice_render')
 def generate_provisional_downpayment_invoice(order):
+    # ReportLab is imported on first render so workers that never build a PDF don't load it
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=True)
     elements = []
     styles = getSampleStyleSheet()
     elements.append(Paragraph("Troutlodge Provisional Down Payment Invoice", styles['Title']))
@@ -384,7 +478,6 @@ def request_order(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.customer = request.user
-            order.status = 'pending'
             order.save()
             provisional_invoice = generate_provisional_downpayment_invoice(order)
             order.downpayment_invoice.save(f"provisional_downpayment_invoice_{order.id}.pdf", provisional_invoice)
@@ -402,7 +495,7 @@ def request_order(request):
 
 @login_required
 def view_downpayment_invoice(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
+    order = get_object_or_404(Order.objects.select_related('availability'), id=order_id, customer=request.user)
     return render(request, 'view_downpayment_invoice.html', {'order': order})
 
 def register(request):
@@ -416,9 +509,15 @@ def register(request):
         form = CustomUserCreationForm()
     return render(request, 'registration/register.html', {'form': form})
 
+@timed('invoice_render')
 def generate_downpayment_invoice(order):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=True)
     elements = []
     styles = getSampleStyleSheet()
     elements.append(Paragraph("Troutlodge Down Payment Invoice", styles['Title']))
@@ -435,20 +534,17 @@ def generate_downpayment_invoice(order):
         ['VAT Number:', order.customer.vat_number or 'N/A'],
         ['Address:', order.customer.address or 'N/A'],
     ]
-    product = order.availability.product
     order_details = [
-        ['Product Type:', product.type],
-        ['Ploidy:', product.ploidy],
-        ['Diameter:', f"{product.diameter}mm"],
-        ['Week Number:', str(order.availability.week_number)],
-        ['Ship Date:', order.availability.expected_ship_date.strftime("%Y-%m-%d")],
+        ['Product:', order.product_label],
+        ['Week Number:', str(order.ship_week)],
+        ['Ship Date:', order.ship_date.strftime("%Y-%m-%d")],
         ['Quantity:', f"{order.quantity:,}"],
-        ['Unit Price:', f"${product.price:.2f}"],
-        ['Subtotal:', f"${order.quantity * product.price:.2f}"],
+        ['Unit Price:', f"${order.unit_price:.2f}"],
+        ['Subtotal:', f"${order.subtotal_amount:.2f}"],
         ['Transport Cost:', f"${order.transport_cost:.2f}"],
-        ['Total Amount:', f"${order.calculate_total():.2f}"],
+        ['Total Amount:', f"${order.total_amount:.2f}"],
         ['Down Payment (15%):', f"${order.downpayment_amount:.2f}"],
-        ['Remaining Balance:', f"${order.calculate_total() - order.downpayment_amount:.2f}"],
+        ['Remaining Balance:', f"${order.balance_amount:.2f}"],
     ]
     invoice_table = Table(invoice_data, colWidths=[100, 300])
     customer_table = Table(customer_info, colWidths=[100, 300])
@@ -477,9 +573,15 @@ def generate_downpayment_invoice(order):
     buffer.seek(0)
     return File(buffer, name=f"downpayment_invoice_{order.id}.pdf")
 
+@timed('invoice_render')
 def generate_invoice(order):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=True)
     elements = []
     styles = getSampleStyleSheet()
     elements.append(Paragraph("Troutlodge Full Payment Invoice", styles['Title']))
@@ -496,20 +598,17 @@ def generate_invoice(order):
         ['VAT Number:', order.customer.vat_number or 'N/A'],
         ['Address:', order.customer.address or 'N/A'],
     ]
-    product = order.availability.product
     order_details = [
-        ['Product Type:', product.type],
-        ['Ploidy:', product.ploidy],
-        ['Diameter:', f"{product.diameter}mm"],
-        ['Week Number:', str(order.availability.week_number)],
-        ['Ship Date:', order.availability.expected_ship_date.strftime("%Y-%m-%d")],
+        ['Product:', order.product_label],
+        ['Week Number:', str(order.ship_week)],
+        ['Ship Date:', order.ship_date.strftime("%Y-%m-%d")],
         ['Quantity:', f"{order.quantity:,}"],
-        ['Unit Price:', f"${product.price:.2f}"],
-        ['Subtotal:', f"${order.quantity * product.price:.2f}"],
+        ['Unit Price:', f"${order.unit_price:.2f}"],
+        ['Subtotal:', f"${order.subtotal_amount:.2f}"],
         ['Transport Cost:', f"${order.transport_cost:.2f}"],
-        ['Total Amount:', f"${order.calculate_total():.2f}"],
+        ['Total Amount:', f"${order.total_amount:.2f}"],
         ['Down Payment Paid:', f"${order.downpayment_amount:.2f}"],
-        ['Remaining Balance:', f"${order.calculate_total() - order.downpayment_amount:.2f}"],
+        ['Remaining Balance:', f"${order.balance_amount:.2f}"],
     ]
     invoice_table = Table(invoice_data, colWidths=[120, 300])
     customer_table = Table(customer_info, colWidths=[120, 300])
@@ -536,6 +635,7 @@ def generate_invoice(order):
     buffer.seek(0)
     return File(buffer, name=f"invoice_{order.id}.pdf")
 
+@timed('email_send')
 def send_order_confirmation_email(order):
     subject = f"Order #{order.id} Confirmed"
     message = f"Dear {order.customer.username},\n\nYour order #{order.id} has been confirmed. Thank you for your purchase!\n\nTransaction ID: {order.fullpayment_transaction_id}"
@@ -548,6 +648,7 @@ def send_order_confirmation_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_downpayment_request_email(order):
     subject = f"Troutlodge Down Payment Request for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
@@ -563,10 +664,11 @@ def send_downpayment_request_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_fullpayment_request_email(order):
     subject = f"Troutlodge Full Payment Request for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
-    message += f"Thank you for your down payment. Your order #{order.id} is now ready for full payment of ${order.calculate_total() - order.downpayment_amount:.2f}.\n\n"
+    message += f"Thank you for your down payment. Your order #{order.id} is now ready for full payment of ${order.balance:.2f}.\n\n"
     message += f"Transaction ID: {order.fullpayment_transaction_id}\n\n"
     message += "Please complete the payment within 14 days to avoid cancellation.\n\n"
     message += "You can download the full invoice from your dashboard.\n\n"
@@ -579,10 +681,11 @@ def send_fullpayment_request_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def send_shipment_confirmation_email(order):
     subject = f"Troutlodge Shipment Confirmation for Order #{order.id}"
     message = f"Dear {order.customer.username},\n\n"
-    message += f"Your order #{order.id} has been shipped and is expected to arrive on {order.availability.expected_ship_date.strftime('%Y-%m-%d')}.\n\n"
+    message += f"Your order #{order.id} has been shipped and is expected to arrive on {order.ship_date.strftime('%Y-%m-%d')}.\n\n"
     message += "Thank you for your business!\nTroutlodge Team"
     send_mail(
         subject,
@@ -592,6 +695,7 @@ def send_shipment_confirmation_email(order):
         fail_silently=False,
     )
 
+@timed('email_send')
 def notify_sales_payment_uploaded(order, payment_type):
     subject = f"Payment Proof Uploaded for Order #{order.id}"
     message = f"A {payment_type} proof has been uploaded for order #{order.id} by {order.customer.username}.\n\n"
@@ -0,0 +1,61 @@
+# core/week_calendar.py
+"""
+ISO week arithmetic for availability weeks.
+
+Availability rows are keyed by (year, week_number); batches ship on the Monday
+of that ISO week. week_start() is pure date arithmetic behind an LRU cache, so
+listings and invoices never parse date strings per row. The WeekCalendar table
+holds the same mapping for SQL (annotations and ship date range filters); it
+is filled by migration for FIRST_YEAR..LAST_YEAR.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+
+from django.db.models import OuterRef, Subquery
+
+FIRST_YEAR = 2000
+LAST_YEAR = 2060
+
+
+@lru_cache(maxsize=8192)
+def week_start(year, week):
+    """Monday of ISO week `week` of `year`."""
+    return date.fromisocalendar(year, week, 1)
+
+
+@lru_cache(maxsize=256)
+def weeks_in_year(year):
+    # December 28th always falls in the last ISO week of its year
+    return date(year, 12, 28).isocalendar()[1]
+
+
+def is_valid_week(year, week):
+    return 1 <= week <= weeks_in_year(year)
+
+
+def calendar_rows(first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    """(year, week_number, week_start, week_end) for every ISO week in the range."""
+    for year in range(first_year, last_year + 1):
+        for week in range(1, weeks_in_year(year) + 1):
+            start = week_start(year, week)
+            yield year, week, start, start + timedelta(days=6)
+
+
+def with_week_start(queryset, prefix=''):
+    """Annotate `week_start` (the ship date) from the calendar table; `prefix` reaches availability via a relation."""
+    from .models import WeekCalendar
+    return queryset.annotate(week_start=Subquery(
+        WeekCalendar.objects.filter(
+            year=OuterRef(f'{prefix}year'), week_number=OuterRef(f'{prefix}week_number')
+        ).values('week_start')[:1]
+    ))
+
+
+def filter_ship_dates(queryset, start=None, end=None, prefix=''):
+    """Restrict to rows whose ship date falls in [start, end] (either bound optional)."""
+    queryset = with_week_start(queryset, prefix)
+    if start is not None:
+        queryset = queryset.filter(week_start__gte=start)
+    if end is not None:
+        queryset = queryset.filter(week_start__lte=end)
+    return queryset
@@ -1,11 +1,62 @@
+import threading
+from contextlib import contextmanager
+
 import psycopg2
-from db_config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from psycopg2 import pool
+from db_config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
 
-def get_connection():
-    return psycopg2.connect(
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connect_kwargs():
+    return dict(
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD
     )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, **_connect_kwargs())
+    return _pool
+
+
+def get_connection():
+    """New unpooled connection; the caller closes it."""
+    return psycopg2.connect(**_connect_kwargs())
+
+
+def borrow_connection():
+    """Pooled connection; hand it back with release_connection(), never close() it."""
+    return get_pool().getconn()
+
+
+def release_connection(conn):
+    # Roll back anything left open; connections in an error/unknown state are discarded
+    status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN if conn.closed else conn.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        conn.rollback()
+        status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    get_pool().putconn(conn, close=status != psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+
+@contextmanager
+def connection():
+    """Pooled connection for a block; commits on success, rolls back on error."""
+    conn = borrow_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        release_connection(conn)
@@ -25,6 +25,9 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,15 +59,89 @@ WSGI_APPLICATION = 'troutlodge.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Any Django backend; django.db.backends.sqlite3 (NAME is then the file) runs the test suite without Postgres
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'mydatabase'),
         'USER': os.getenv('POSTGRES_USER', 'myuser'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mypassword'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # Reuse connections across requests; health checks drop dead ones before use
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# Background threads (reliability rescoring, forecast refits) write too; SQLite transactions that start as readers
+# fail with "database is locked" when they later write, so take the write lock up front
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
+# Django's native connection pool (needs psycopg 3: pip install "psycopg[binary,pool]").
+# A pool replaces persistent connections, so CONN_MAX_AGE must be 0.
+if os.getenv('DB_POOL', 'False') == 'True':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+
+# Optional read replica: read-only queries are routed there, see core/db_routers.py. DB_REPLICA_NAME alone is
+# enough for a local replica (e.g. a second SQLite file with DB_REPLICA_ENGINE=django.db.backends.sqlite3)
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'ENGINE': os.getenv('DB_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_routers.PrimaryReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# How long a user's reads stay on the primary after they write (should exceed replication lag)
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+
+# Shared cache (customer summaries etc.); without CACHE_REDIS_URL each process keeps its own memory cache
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+CUSTOMER_SUMMARY_CACHE_SECONDS = int(os.getenv('CUSTOMER_SUMMARY_CACHE_SECONDS', '3600'))
+# Reliability rescoring after customer events: 'background' (worker threads), 'inline' (on commit) or 'off'
+RELIABILITY_SCORING = os.getenv('RELIABILITY_SCORING', 'background')
+RELIABILITY_SCORING_WORKERS = int(os.getenv('RELIABILITY_SCORING_WORKERS', '2'))
+# Versioned reliability model artifacts and the current/candidate pointers, see core/model_store.py
+RELIABILITY_MODEL_DIR = os.getenv('RELIABILITY_MODEL_DIR', str(BASE_DIR / 'model_store'))
+# How long the last demand forecast fit is kept. Requests serve it until a refit replaces it: 'background' refits
+# on a worker thread once new orders make it stale, 'off' leaves refitting to forecast_demand (cron)
+DEMAND_FORECAST_CACHE_SECONDS = int(os.getenv('DEMAND_FORECAST_CACHE_SECONDS', str(7 * 24 * 3600)))
+DEMAND_FORECAST_REFIT = os.getenv('DEMAND_FORECAST_REFIT', 'background')
+# Thread pools the async views (core/async_views.py) hand blocking side effects to, per ASGI worker
+ASYNC_PAYMENT_WORKERS = int(os.getenv('ASYNC_PAYMENT_WORKERS', '8'))
+ASYNC_PDF_WORKERS = int(os.getenv('ASYNC_PDF_WORKERS', '2'))
+ASYNC_EMAIL_WORKERS = int(os.getenv('ASYNC_EMAIL_WORKERS', '8'))
+# Server-sent dashboard updates (/live/): 'auto' uses PostgreSQL NOTIFY so all workers see every event, 'local'
+# only reaches streams in the publishing process
+LIVE_UPDATES_BACKEND = os.getenv('LIVE_UPDATES_BACKEND', 'auto')
+LIVE_UPDATES_HEARTBEAT_SECONDS = int(os.getenv('LIVE_UPDATES_HEARTBEAT_SECONDS', '15'))
+# Dashboard fragments and their version counters (core/dashboard_cache.py) expire after this, which bounds how long
+# a dashboard can lag writes another process made without a shared cache
+DASHBOARD_FRAGMENT_SECONDS = int(os.getenv('DASHBOARD_FRAGMENT_SECONDS', '600'))
+# Chunked payment proof uploads (core/payment_uploads.py). Parts are kept outside MEDIA_ROOT; on the same
+# filesystem, finishing an upload moves the file instead of copying it
+PAYMENT_UPLOAD_DIR = os.getenv('PAYMENT_UPLOAD_DIR', str(BASE_DIR / 'upload_parts'))
+PAYMENT_UPLOAD_CHUNK_SIZE = int(os.getenv('PAYMENT_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -103,6 +180,17 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Invoices and payment proofs, stored once per distinct content (core/storage.py)
+    'documents': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+}
+# How invoice and proof views send files (core/file_serving.py): 'python' streams them, 'nginx' hands off with
+# X-Accel-Redirect to an internal location serving MEDIA_ROOT under FILE_SERVING_ACCEL_PREFIX, 'sendfile' uses
+# X-Sendfile (Apache mod_xsendfile, lighttpd)
+FILE_SERVING_BACKEND = os.getenv('FILE_SERVING_BACKEND', 'python')
+FILE_SERVING_ACCEL_PREFIX = os.getenv('FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
 
 
 # REST Framework settings
@@ -114,4 +202,16 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Request performance instrumentation (Server-Timing headers + /metrics/performance/)
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'False') == 'True'
+PERF_INSTRUMENTATION_SAMPLE_SIZE = int(os.getenv('PERF_INSTRUMENTATION_SAMPLE_SIZE', '1000'))
+
+# Operation durations and in-flight gauges (core.instrumentation.span) in /metrics. A span then costs ~7µs (two
+# metric locks); with this and PERF_INSTRUMENTATION off, @timed functions only pay a setting lookup (<1µs)
+OPERATION_METRICS = os.getenv('OPERATION_METRICS', 'True') == 'True'
+
+# Prometheus text exposition at /metrics; scrapers send "Authorization: Bearer <token>".
+# When unset, only logged-in staff users can read the endpoint.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')